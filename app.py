@@ -3,16 +3,28 @@ import pandas as pd
 import json
 import re
 import time
+import uuid
 from datetime import datetime
 from io import BytesIO
 
 # Import utility modules
 from utils.ai_processor import extract_scope_smart_ai, classify_scope_hybrid
 from utils.file_reader import read_file_content, extract_sentences_from_tor
-from utils.product_matcher import analyze_tor_sentences_full_mode
-from utils.budget_engine import extract_budget_factors, calculate_budget_sheets, format_budget_report
+from utils.segmenter import segment_sentences, segmentation_quality
+from utils.llm_cache import llm_cache
+from utils.gemini_client import get_client_stats
+from utils.model_health import model_health
+from utils.quota_scheduler import set_quota_session
+from utils.label_memo import label_memo
+from utils.product_matcher import analyze_tor_sentences_full_mode, get_encoder
+from utils.budget_engine import extract_budget_factors, budget_view, initial_fee
+from utils.budget_scenarios import scenario_view, surface_view, FACTOR_LABELS
 from utils.google_sheet import load_master_data, save_to_product_spec, undo_last_update
 from utils.data_validator import validate_products, check_duplicates, prepare_save_data
+from utils.version_diff import (
+    save_analysis, list_saved_analyses, load_analysis,
+    diff_sentences, merge_incremental_results, products_from_results, sentence_hash
+)
 
 # ==========================================
 # PAGE CONFIG
@@ -536,6 +548,7 @@ if 'edited_df' not in st.session_state: st.session_state.edited_df = None
 if 'spec_df' not in st.session_state: st.session_state.spec_df = None
 if 'pricing_df' not in st.session_state: st.session_state.pricing_df = None
 if 'addon_df' not in st.session_state: st.session_state.addon_df = None
+if 'master_status' not in st.session_state: st.session_state.master_status = {}
 if 'file_uploaded' not in st.session_state: st.session_state.file_uploaded = False
 if 'analysis_done' not in st.session_state: st.session_state.analysis_done = False
 if 'budget_calculated' not in st.session_state: st.session_state.budget_calculated = False
@@ -546,10 +559,19 @@ if 'is_excel' not in st.session_state: st.session_state.is_excel = False
 # File Info
 if 'file_name' not in st.session_state: st.session_state.file_name = ""
 if 'file_size' not in st.session_state: st.session_state.file_size = 0
+if 'read_report' not in st.session_state: st.session_state.read_report = None
 # ✅ Adjusted factors for budget
 if 'adjusted_factors' not in st.session_state: st.session_state.adjusted_factors = None
 if 'show_adjusted_breakdown' not in st.session_state: st.session_state.show_adjusted_breakdown = False
 if 'cost_per_manday' not in st.session_state: st.session_state.cost_per_manday = 22000  # Default 22k THB/manday
+if 'budget_factor_report' not in st.session_state: st.session_state.budget_factor_report = {}
+# ✅ Incremental re-analysis summary (reused / processed sentence counts)
+if 'incremental_summary' not in st.session_state: st.session_state.incremental_summary = None
+# ✅ Sentence embeddings from product matching (sentence hash -> vector)
+if 'sentence_embeddings' not in st.session_state: st.session_state.sentence_embeddings = {}
+# ✅ Quota scheduler session (fair share of the Gemini rate across users)
+if 'quota_session' not in st.session_state: st.session_state.quota_session = uuid.uuid4().hex[:12]
+set_quota_session(st.session_state.quota_session)
 
 # ✅ Initialize API key from secrets
 if 'gemini_key' not in st.session_state:
@@ -581,6 +603,16 @@ with st.sidebar:
         </div>
         """, unsafe_allow_html=True)
         st.caption("🔒 Secured via Streamlit Secrets")
+        cache_stats = llm_cache.stats()
+        st.caption(f"💾 Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} stored)")
+        client_stats = get_client_stats()
+        if client_stats:
+            api_calls = sum(m['calls'] for m in client_stats.values())
+            api_tokens = sum(m['prompt_tokens'] + m['output_tokens'] for m in client_stats.values())
+            st.caption(f"📡 Gemini: {api_calls} calls / {api_tokens:,} tokens")
+        open_circuits = [m for m, h in model_health.snapshot().items() if h['state'] == 'open']
+        if open_circuits:
+            st.caption(f"🔌 Skipping unhealthy models: {', '.join(open_circuits)}")
     except Exception as e:
         st.markdown("""
         <div style='background: linear-gradient(135deg, rgba(239, 68, 68, 0.1) 0%, rgba(220, 38, 38, 0.1) 100%); 
@@ -606,22 +638,55 @@ with st.sidebar:
     if st.button("🔄 Sync Master Data"):
         with st.spinner("Syncing data..."):
             try:
-                pricing_df, addon_df, spec_df, def_dict = load_master_data(sheet_url)
+                pricing_df, addon_df, spec_df, def_dict, master_status = load_master_data(
+                    sheet_url, check_revision=True, return_status=True
+                )
                 st.session_state.pricing_df = pricing_df
                 st.session_state.addon_df = addon_df
                 st.session_state.spec_df = spec_df
                 st.session_state.def_dict = def_dict
-                st.success(f"✅ Loaded {len(spec_df)} products")
+                st.session_state.master_status = master_status
+                if st.session_state.master_status.get('read_only'):
+                    st.warning(f"⚠️ Could not check for updates - using the local snapshot ({len(spec_df)} products)")
+                elif st.session_state.master_status.get('source') == 'sheet':
+                    st.success(f"✅ Loaded {len(spec_df)} products")
+                else:
+                    st.success(f"✅ Up to date ({len(spec_df)} products)")
             except Exception as e:
                 st.error(f"❌ Sync Failed: {e}")
     
+    master_status = st.session_state.master_status
+    if master_status.get('read_only'):
+        st.warning("📴 Google Sheets unreachable - using the local snapshot (read-only)")
+    elif master_status:
+        st.caption(f"📦 Master data revision {master_status.get('revision')} "
+                   f"({'snapshot' if master_status.get('source') == 'snapshot' else 'fetched'})")
+    
     st.markdown("---")
     
     # ===== 3. ANALYSIS OPTIONS =====
     st.markdown("### 🛠️ Options")
-    enable_ai_formatting = st.checkbox("🤖 Enable AI Text Formatting", value=True)
+    ai_formatting_mode = st.selectbox(
+        "🤖 AI Text Formatting",
+        options=["Auto", "Always", "Off"],
+        help="Auto: local segmentation first, Gemini refinement only when segmentation looks poor"
+    )
     enable_fr_nfr = st.checkbox("📊 Enable FR/NFR Classification", value=True)
     
+    compare_previous = st.checkbox("🔁 Compare with previous version", value=False,
+                                   help="Reuse results of unchanged sentences from a stored analysis")
+    previous_analysis = None
+    if compare_previous:
+        saved_analyses = list_saved_analyses()
+        if saved_analyses:
+            previous_analysis = st.selectbox(
+                "Previous analysis",
+                options=[a['file_name'] for a in saved_analyses],
+                format_func=lambda n: next(f"{a['file_name']} ({a['saved_at']}, {a['rows']} rows)" for a in saved_analyses if a['file_name'] == n)
+            )
+        else:
+            st.caption("📭 No stored analysis yet")
+    
     st.markdown("---")
     
     # ===== 4. SAVE HISTORY =====
@@ -631,7 +696,7 @@ with st.sidebar:
             with st.expander(f"🕐 Update #{len(st.session_state.save_history)-idx} - {record['timestamp'].split(' ')[1]}", expanded=False):
                 st.caption(f"📅 {record['timestamp']}")
                 st.write(f"**Saved:** {record['count']} rows")
-                if st.button(f"⏮️ Undo this save", key=f"undo_{idx}"):
+                if st.button(f"⏮️ Undo this save", key=f"undo_{idx}", disabled=st.session_state.master_status.get('read_only', False)):
                     with st.spinner("Reverting..."):
                         try:
                             undo_last_update(record['data'], sheet_url)
@@ -671,7 +736,7 @@ with tab_verify:
     col1, col2 = st.columns([3, 1])
 
     with col1:
-        uploaded_file = st.file_uploader("Upload PDF, DOCX, Excel or Text file", type=['pdf', 'docx', 'txt', 'xlsx', 'xls'])
+        uploaded_file = st.file_uploader("Upload PDF, DOCX, Excel, CSV or Text file", type=['pdf', 'docx', 'txt', 'xlsx', 'xls', 'csv'])
 
     with col2:
         # File Info Card
@@ -684,6 +749,10 @@ with tab_verify:
         else:
             f_name = "No file selected"
             f_size = "-"
+        
+        read_report = st.session_state.read_report if st.session_state.file_uploaded else None
+        f_buffer = (f"{read_report.get('mode', '-')} from {read_report.get('buffer', '-')} "
+                    f"(limit {read_report['memory_budget_mb']:.0f} MB)") if read_report else "-"
             
         st.markdown(f"""
         <div class="file-info-card">
@@ -693,9 +762,12 @@ with tab_verify:
             <div style="font-size:0.9rem; color:var(--neutral-700); margin-bottom: 6px;">
                 <strong>Name:</strong> {f_name}
             </div>
-            <div style="font-size:0.9rem; color:var(--neutral-700);">
+            <div style="font-size:0.9rem; color:var(--neutral-700); margin-bottom: 6px;">
                 <strong>Size:</strong> {f_size}
             </div>
+            <div style="font-size:0.9rem; color:var(--neutral-700);">
+                <strong>Buffer:</strong> {f_buffer}
+            </div>
         </div>
         """, unsafe_allow_html=True)
 
@@ -703,25 +775,25 @@ with tab_verify:
     if uploaded_file and not st.session_state.file_uploaded:
         with st.spinner("📂 Processing document..."):
             try:
-                file_content = read_file_content(uploaded_file)
+                file_content, read_report = read_file_content(uploaded_file, return_report=True)
+                st.session_state.read_report = read_report
                 
                 if st.session_state.spec_df is None:
                     with st.spinner("🔄 Loading master data..."):
-                        pricing_df, addon_df, spec_df, def_dict = load_master_data(sheet_url)
+                        pricing_df, addon_df, spec_df, def_dict, master_status = load_master_data(sheet_url, return_status=True)
                         st.session_state.pricing_df = pricing_df
                         st.session_state.addon_df = addon_df
                         st.session_state.spec_df = spec_df
                         st.session_state.def_dict = def_dict
+                        st.session_state.master_status = master_status
                 
                 st.session_state.tor_raw_text = file_content
                 st.session_state.file_name = uploaded_file.name
                 st.session_state.file_size = uploaded_file.size
                 st.session_state.file_uploaded = True
                 
-                if uploaded_file.name.endswith(('.xlsx', '.xls')):
-                    st.session_state.is_excel = True
-                else:
-                    st.session_state.is_excel = False
+                # Tabular sources are already one requirement per row
+                st.session_state.is_excel = st.session_state.read_report.get('format') in ('xlsx', 'xls', 'csv')
                 
                 st.rerun()
             except Exception as e:
@@ -736,33 +808,79 @@ with tab_verify:
             
             progress_bar = st.progress(0)
             status_text = st.empty()
+            live_text = st.empty()
             
             try:
                 # 1. Formatting
-                status_text.markdown("**🤖 Step 1/4:** AI Structuring & Formatting...")
+                status_text.markdown("**🤖 Step 1/4:** Structuring & Formatting...")
                 progress_bar.progress(10)
-                if enable_ai_formatting and not st.session_state.is_excel:
-                    formatted_text = extract_scope_smart_ai(st.session_state.tor_raw_text, st.session_state.gemini_key)
+                if st.session_state.is_excel:
+                    # Tabular sources: one requirement per row already
+                    sentences = extract_sentences_from_tor(st.session_state.tor_raw_text)
                 else:
-                    formatted_text = st.session_state.tor_raw_text
+                    sentences = segment_sentences(st.session_state.tor_raw_text)
+                    quality = segmentation_quality(sentences)
+                    if ai_formatting_mode == "Always" or (ai_formatting_mode == "Auto" and quality['poor']):
+                        status_text.markdown("**🤖 Step 1/4:** AI Structuring & Formatting...")
+                        streamed = {}
+                        
+                        def show_requirement(chunk_idx, pos, item):
+                            streamed[(chunk_idx, pos)] = item
+                            if len(streamed) % 5 == 1:
+                                live_text.caption(f"✍️ {len(streamed)} requirements received · latest: {str(item)[:120]}")
+                        
+                        formatted_text = extract_scope_smart_ai(st.session_state.tor_raw_text, st.session_state.gemini_key, on_item=show_requirement)
+                        sentences = extract_sentences_from_tor(formatted_text)
+                        live_text.empty()
                 
                 # 2. Extract
                 progress_bar.progress(30)
                 status_text.markdown("**📝 Step 2/4:** Extracting requirements...")
-                sentences = extract_sentences_from_tor(formatted_text)
+                
+                # 2.1 Incremental mode: only added/changed sentences are processed
+                prior_df = load_analysis(previous_analysis) if previous_analysis else None
+                if prior_df is not None:
+                    reused, changed_indices = diff_sentences(sentences, prior_df)
+                    pending_sentences = [sentences[i] for i in changed_indices]
+                    st.session_state.incremental_summary = {
+                        'previous': previous_analysis, 'reused': len(reused), 'processed': len(pending_sentences)
+                    }
+                else:
+                    reused = {}
+                    pending_sentences = sentences
+                    st.session_state.incremental_summary = None
                 
                 # 3. Matching
                 progress_bar.progress(50)
                 status_text.markdown("**🎯 Step 3/4:** Matching products...")
-                matched_products, result_df = analyze_tor_sentences_full_mode(
-                    sentences, st.session_state.spec_df, st.session_state.gemini_key
-                )
+                if pending_sentences:
+                    matched_products, result_df, sentence_emb = analyze_tor_sentences_full_mode(
+                        pending_sentences, st.session_state.spec_df, st.session_state.gemini_key,
+                        return_embeddings=True
+                    )
+                else:
+                    matched_products, result_df, sentence_emb = [], pd.DataFrame(columns=['TOR_Sentence', 'Product_Match', 'Implementation', 'Matched_Keyword']), None
+                
+                # Keep embeddings so reviewer corrections can train the local classifier
+                if sentence_emb is not None:
+                    st.session_state.sentence_embeddings.update(
+                        {sentence_hash(sent): emb for sent, emb in zip(pending_sentences, sentence_emb)}
+                    )
                 
                 # 4. Classification
                 progress_bar.progress(80)
                 if enable_fr_nfr:
                     status_text.markdown("**📊 Step 4/4:** Classifying FR/NFR...")
-                    result_df['Requirement_Type'] = classify_scope_hybrid(sentences, st.session_state.gemini_key)
+                    labelled = {}
+                    
+                    def show_label(idx, label):
+                        labelled[idx] = label
+                        if len(labelled) % 10 == 0 or len(labelled) == len(pending_sentences):
+                            progress_bar.progress(80 + int(19 * len(labelled) / len(pending_sentences)))
+                            live_text.caption(f"🏷️ {len(labelled)}/{len(pending_sentences)} classified")
+                    
+                    result_df['Requirement_Type'] = classify_scope_hybrid(pending_sentences, st.session_state.gemini_key, embeddings=sentence_emb, on_item=show_label) if pending_sentences else []
+                    live_text.empty()
                 else:
                     result_df['Requirement_Type'] = 'Functional'
                 
@@ -770,10 +888,15 @@ with tab_verify:
                 
                 if '📝 Status' not in result_df.columns:
                     result_df['📝 Status'] = '🤖 Auto'
+                
+                if reused:
+                    result_df = merge_incremental_results(sentences, reused, result_df)
+                    matched_products = list(dict.fromkeys(matched_products + products_from_results(result_df)))
                     
                 st.session_state.processed_df = result_df
                 st.session_state.matched_products = matched_products
                 st.session_state.analysis_done = True
+                save_analysis(st.session_state.file_name, result_df)
                 
                 st.rerun()
                 
@@ -784,6 +907,10 @@ with tab_verify:
     if st.session_state.analysis_done:
         st.markdown("### 📊 Analysis Results")
         
+        if st.session_state.incremental_summary:
+            summary = st.session_state.incremental_summary
+            st.info(f"🔁 Compared with **{summary['previous']}**: reused {summary['reused']} unchanged sentences, processed {summary['processed']} added/changed")
+        
         # Use edited_df if available, else processed_df for stats
         df_stats = st.session_state.edited_df if st.session_state.edited_df is not None else st.session_state.processed_df.copy()
         
@@ -980,6 +1107,14 @@ with tab_verify:
                 
                 user_changed = prod_changed or impl_changed or req_changed
                 
+                # Reviewer corrections feed the sentence label memo
+                if req_changed and curr_req:
+                    sentence = working_df.loc[i, 'TOR_Sentence']
+                    label_memo.remember(
+                        [sentence], [curr_req], source='reviewer',
+                        embeddings=[st.session_state.sentence_embeddings.get(sentence_hash(sentence))]
+                    )
+                
                 # ===== STEP 4: APPLY AUTO-ENFORCEMENT LOGIC =====
                 # 4.1 Implementation Logic
                 if working_df.loc[i, '🔧 Non-Compliant']:
@@ -1016,6 +1151,7 @@ with tab_verify:
                 st.session_state.processed_df.loc[orig_idx, '📝 Status'] = new_status
 
             st.session_state.edited_df = working_df
+            save_analysis(st.session_state.file_name, st.session_state.processed_df)
             st.success("✅ Changes Saved!")
             time.sleep(0.5)
             st.rerun()
@@ -1055,7 +1191,9 @@ with tab_verify:
 
         c1, c2, c3 = st.columns(3)
         with c1:
-            if st.button("💾 Update product spec", type="primary", disabled=len(final_save_data)==0):
+            read_only = st.session_state.master_status.get('read_only', False)
+            if st.button("💾 Update product spec", type="primary", disabled=len(final_save_data)==0 or read_only,
+                         help="Google Sheets is unreachable - master data is read-only" if read_only else None):
                 with st.spinner("Saving to Google Sheet..."):
                     try:
                         save_to_product_spec(final_save_data, sheet_url)
@@ -1099,8 +1237,16 @@ with tab_budget:
             if st.button("🎯 Generate Budget Estimation", type="primary"):
                 with st.spinner("🤖 AI Calculating..."):
                     try:
-                        factors = extract_budget_factors(st.session_state.tor_raw_text, st.session_state.gemini_key)
+                        try:
+                            encoder = get_encoder()
+                        except Exception as e:
+                            print(f"⚠️ Encoder unavailable, keyword clause search only: {e}")
+                            encoder = None
+                        factors, factor_report = extract_budget_factors(
+                            st.session_state.tor_raw_text, st.session_state.gemini_key, encoder=encoder, return_report=True
+                        )
                         st.session_state.budget_factors = factors
+                        st.session_state.budget_factor_report = factor_report
                         st.session_state.adjusted_factors = factors.copy()  # เก็บค่าสำหรับ adjustment
                         st.session_state.budget_calculated = True
                         st.session_state.show_adjusted_breakdown = False  # Reset breakdown display
@@ -1117,8 +1263,15 @@ with tab_budget:
             # ==========================================
             st.markdown("## 🤖 System Estimation")
             st.caption("AI-generated budget based on TOR analysis - Products Only")
+            factor_report = st.session_state.budget_factor_report
+            if factor_report:
+                from_rules = [f for f, r in factor_report.items() if r['source'] == 'rules']
+                st.caption(
+                    f"⚡ {len(from_rules)}/{len(factor_report)} factors read directly from the TOR"
+                    + (": " + ", ".join(f"{f} ({factor_report[f]['location'] or 'document'})" for f in from_rules) if from_rules else "")
+                )
             
-            system_results = calculate_budget_sheets(
+            system_results = budget_view(
                 st.session_state.budget_factors, st.session_state.matched_products,
                 st.session_state.pricing_df, st.session_state.addon_df
             )
@@ -1132,16 +1285,17 @@ with tab_budget:
                 st.markdown("#### 📦 Product Package Details")
                 for res in system_results:
                     with st.expander(f"📦 {res['Product']} - Package: {res['Package'].get('Package', 'N/A')}", expanded=False):
-                         raw_html = format_budget_report(res['Product'], res['Package'], st.session_state.budget_factors, res['Breakdown'])
-                         clean_html = "\n".join([line.lstrip() for line in raw_html.split('\n')])
-                         st.markdown(clean_html, unsafe_allow_html=True)
+                         st.markdown(res['Report'], unsafe_allow_html=True)
+                         if res.get('Alternatives'):
+                             best_cost = res['Breakdown']['total'] + initial_fee(res['Package'])
+                             st.caption("💡 Next best: " + ", ".join(
+                                 f"{alt['Package'].get('Package', 'N/A')} (+{alt['Breakdown']['total'] + initial_fee(alt['Package']) - best_cost:,.0f} THB)"
+                                 for alt in res['Alternatives']
+                             ))
                 
                 # Calculate costs per product
                 for res in system_results:
-                    init_fee = res['Package'].get('Initial_Fee (THB)', 0)
-                    product_cost = res['Breakdown']['total']
-                    if init_fee and isinstance(init_fee, (int, float)): 
-                        product_cost += init_fee
+                    product_cost = res['Breakdown']['total'] + initial_fee(res['Package'])
                     
                     if res['Product'] == 'Zocial Eye':
                         system_ze_cost = product_cost
@@ -1194,6 +1348,34 @@ with tab_budget:
                     </h1>
                 </div>
                 """, unsafe_allow_html=True)
+
+                # 🧮 What-if scenarios: whole grids in one vectorized pass
+                with st.expander("🧮 What-if Scenarios", expanded=False):
+                    analysis = scenario_view(
+                        st.session_state.budget_factors, st.session_state.matched_products,
+                        st.session_state.pricing_df, st.session_state.addon_df
+                    )
+                    st.markdown("##### 📈 Sensitivity (one factor at a time)")
+                    st.dataframe(analysis['sensitivity'].round(0), use_container_width=True, hide_index=True)
+
+                    st.markdown("##### 🔀 Package Breakpoints")
+                    if analysis['breakpoints'].empty:
+                        st.caption("No package change within the tested ranges.")
+                    else:
+                        st.dataframe(analysis['breakpoints'].round(0), use_container_width=True, hide_index=True)
+
+                    st.markdown("##### 🗺️ Cost Surface (THB/Year)")
+                    axis_options = [f for f in FACTOR_LABELS if f != 'chatbot_required']
+                    c_row, c_col = st.columns(2)
+                    with c_row:
+                        row_factor = st.selectbox("Rows", axis_options, index=0, format_func=FACTOR_LABELS.get, key="surface_rows")
+                    with c_col:
+                        col_factor = st.selectbox("Columns", [f for f in axis_options if f != row_factor], format_func=FACTOR_LABELS.get, key="surface_cols")
+                    surface = surface_view(
+                        st.session_state.budget_factors, st.session_state.matched_products,
+                        st.session_state.pricing_df, st.session_state.addon_df, row_factor, col_factor
+                    )
+                    st.dataframe(surface.round(0), use_container_width=True)
             else:
                 st.warning("⚠️ No suitable package found.")
             
@@ -1271,7 +1453,7 @@ with tab_budget:
             # Show Adjusted Budget if recalculated
             if st.session_state.show_adjusted_breakdown:
                 # Calculate adjusted budget
-                adjusted_results = calculate_budget_sheets(
+                adjusted_results = budget_view(
                     st.session_state.adjusted_factors, st.session_state.matched_products,
                     st.session_state.pricing_df, st.session_state.addon_df
                 )
@@ -1286,14 +1468,15 @@ with tab_budget:
                     st.markdown("#### 📦 Adjusted Product Package Details")
                     for res in adjusted_results:
                         with st.expander(f"📦 {res['Product']}", expanded=True):
-                             raw_html = format_budget_report(res['Product'], res['Package'], st.session_state.adjusted_factors, res['Breakdown'])
-                             clean_html = "\n".join([line.lstrip() for line in raw_html.split('\n')])
-                             st.markdown(clean_html, unsafe_allow_html=True)
+                             st.markdown(res['Report'], unsafe_allow_html=True)
+                             if res.get('Alternatives'):
+                                 best_cost = res['Breakdown']['total'] + initial_fee(res['Package'])
+                                 st.caption("💡 Next best: " + ", ".join(
+                                     f"{alt['Package'].get('Package', 'N/A')} (+{alt['Breakdown']['total'] + initial_fee(alt['Package']) - best_cost:,.0f} THB)"
+                                     for alt in res['Alternatives']
+                                 ))
                         
-                        init_fee = res['Package'].get('Initial_Fee (THB)', 0)
-                        product_cost = res['Breakdown']['total']
-                        if init_fee and isinstance(init_fee, (int, float)): 
-                            product_cost += init_fee
+                        product_cost = res['Breakdown']['total'] + initial_fee(res['Package'])
                         
                         if res['Product'] == 'Zocial Eye':
                             adjusted_ze_cost = product_cost
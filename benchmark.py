@@ -0,0 +1,151 @@
+"""
+Offline Pipeline Benchmark
+Formatting, FR/NFR classification and budget extraction against the local Gemini stand-in
+
+    python benchmark.py --clauses 400 --runs 3
+    python benchmark.py --file tor.pdf --cassette gemini.jsonl --out bench_output.txt
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+FR_CLAUSES = [
+    "ระบบต้องสามารถรวบรวมข้อมูลจาก Social Media ได้แก่ Facebook, X, Instagram และ TikTok",
+    "ระบบต้องแสดงผลการวิเคราะห์ Sentiment แยกตามช่องทาง",
+    "Platform must provide a dashboard of trending keywords by day",
+    "ผู้ใช้งานสามารถส่งออกรายงานเป็นไฟล์ Excel และ PDF ได้",
+    "The system shall support a chatbot that answers customer messages on LINE",
+    "ระบบต้องแจ้งเตือนเมื่อพบข้อความเชิงลบเกินเกณฑ์ที่กำหนด",
+]
+NFR_CLAUSES = [
+    "ระบบต้องรองรับผู้ใช้งานพร้อมกันไม่น้อยกว่า {n} คน",
+    "ระบบต้องเก็บข้อมูลย้อนหลังไม่น้อยกว่า {n} วัน",
+    "System must maintain 99.9% uptime with response time under {n} seconds",
+    "ข้อมูลทั้งหมดต้องเข้ารหัสและสำรองข้อมูลทุกวัน",
+    "The platform shall process at least {n} messages per month",
+]
+
+
+def synthetic_tor(clauses, seed=0):
+    """Numbered Thai/English TOR text with a realistic FR/NFR mix"""
+    rng = random.Random(seed)
+    lines = ["ขอบเขตของงาน (Scope of Work)"]
+    for i in range(clauses):
+        section, item = divmod(i, 10)
+        pool = NFR_CLAUSES if rng.random() < 0.35 else FR_CLAUSES
+        text = rng.choice(pool).format(n=rng.choice([5, 10, 50, 90, 365, 35000]))
+        lines.append(f"{section + 1}.{item + 1} {text}")
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline TOR pipeline benchmark")
+    parser.add_argument('--file', help="TOR document to read (default: synthetic text)")
+    parser.add_argument('--clauses', type=int, default=300, help="clauses in the synthetic TOR")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cassette', help="recorded responses (GEMINI_RECORD_PATH output)")
+    parser.add_argument('--latency-ms', type=float, default=250)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=6000, help="client rate limit during the run")
+    parser.add_argument('--warm-cache', action='store_true', help="keep the response cache between runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="also write the report to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Isolated stores and a generous client rate limit; must be set before the app modules load
+    workdir = tempfile.mkdtemp(prefix="tor-bench-")
+    os.environ['TOR_LLM_CACHE'] = os.path.join(workdir, "llm_cache.sqlite3")
+    os.environ['TOR_LABEL_MEMO'] = os.path.join(workdir, "label_memo.sqlite3")
+    os.environ['GEMINI_RPM'] = str(args.rpm)
+
+    from utils.gemini_replay import ReplayServer, ReplayProfile, load_cassette
+    profile = ReplayProfile(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=0.5, seed=args.seed
+    )
+    server = ReplayServer(cassette=load_cassette(args.cassette), profile=profile).start()
+    os.environ['GEMINI_BASE_URL'] = server.base_url
+
+    from utils import gemini_client
+    from utils.llm_cache import llm_cache
+    from utils.label_memo import label_memo
+    from utils.model_health import model_health
+    from utils.segmenter import segment_sentences
+    from utils.file_reader import read_file_content, extract_sentences_from_tor
+    from utils.ai_processor import extract_scope_smart_ai, classify_scope_hybrid
+    from utils.budget_engine import extract_budget_factors
+
+    api_key = "offline-benchmark"
+    timings = {}
+
+    def timed(stage, fn, *fn_args, **fn_kwargs):
+        start = time.perf_counter()
+        value = fn(*fn_args, **fn_kwargs)
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+        return value
+
+    counts = {}
+    for run in range(args.runs):
+        if not args.warm_cache:
+            llm_cache.clear()
+            label_memo.clear()
+        model_health.reset()
+
+        if args.file:
+            with open(args.file, 'rb') as f:
+                raw_text = timed('read', read_file_content, f)
+        else:
+            raw_text = synthetic_tor(args.clauses, args.seed)
+
+        segments = timed('segment', segment_sentences, raw_text)
+        formatted = timed('ai_format', extract_scope_smart_ai, raw_text, api_key)
+        sentences = extract_sentences_from_tor(formatted)
+        labels = timed('classify', classify_scope_hybrid, sentences, api_key)
+        factors = timed('budget_factors', extract_budget_factors, raw_text, api_key)
+        counts = {
+            'chars': len(raw_text), 'segments': len(segments), 'sentences': len(sentences),
+            'nfr': labels.count("Non-Functional"), 'factors': sum(v is not None for v in factors.values())
+        }
+
+    lines = [
+        "=" * 60,
+        f"📈 Offline benchmark ({args.runs} run(s), stand-in latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms,"
+        f" errors {args.error_rate:.0%}, 429 {args.rate_limit_rate:.0%})",
+        f"   Input: {counts.get('chars', 0):,} chars, {counts.get('sentences', 0)} sentences"
+        f" ({counts.get('nfr', 0)} NFR), {counts.get('factors', 0)} budget factors",
+        "-" * 60,
+        f"{'stage':<16}{'min s':>10}{'median s':>12}{'max s':>10}",
+    ]
+    for stage, values in timings.items():
+        lines.append(f"{stage:<16}{min(values):>10.3f}{statistics.median(values):>12.3f}{max(values):>10.3f}")
+    total = [sum(values[i] for values in timings.values()) for i in range(args.runs)]
+    lines.append(f"{'total':<16}{min(total):>10.3f}{statistics.median(total):>12.3f}{max(total):>10.3f}")
+    lines.append("-" * 60)
+    lines.append(f"Stand-in requests: {json.dumps(server.requests, sort_keys=True)}")
+    lines.append(f"Client stats: {json.dumps(gemini_client.get_client_stats(), sort_keys=True)}")
+    report = "\n".join(lines)
+    print(report)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
+
+    server.shutdown()
+    server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
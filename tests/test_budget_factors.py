@@ -0,0 +1,63 @@
+from utils.budget_factors import extract_factors_locally, select_factor_candidates, LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_negation_after_chatbot_cue_keeps_chatbot():
+    factors = extract_factors_locally("ต้องมีแชทบอทตอบกลับอัตโนมัติ โดยไม่มีค่าใช้จ่ายเพิ่มเติม")
+    assert factors['chatbot_required']['value'] is True
+    assert factors['product_type']['value'] == 'Warroom'
+
+
+def test_negated_chatbot_is_left_to_the_model():
+    factors = extract_factors_locally("ไม่จำเป็นต้องมีระบบแชทบอท")
+    assert factors['chatbot_required']['value'] is False
+    assert factors['chatbot_required']['confidence'] < LOCAL_CONFIDENCE_THRESHOLD
+
+
+def test_users_number_skips_period():
+    factors = extract_factors_locally("ระบบต้องมีผู้ใช้งาน 1 ปี จำนวน 20 คน")
+    assert factors['num_users']['value'] == 20
+
+
+def test_leading_quantity_is_not_a_clause_number():
+    assert extract_factors_locally("10 users")['num_users']['value'] == 10
+    assert extract_factors_locally("90 days of historical data")['data_backward_days']['value'] == 90
+    assert extract_factors_locally("5 social channels")['social_channels_count']['value'] == 5
+    assert select_factor_candidates("100 transactions per year")[0]['clause'] is None
+
+
+def test_clause_numbers_are_still_stripped():
+    factors = extract_factors_locally("4.2 ผู้ใช้งาน 10 คน\n3) 15 users")
+    assert factors['num_users']['value'] == 15
+    assert [c['clause'] for c in select_factor_candidates("4.2.1 ผู้ใช้งาน 10 คน")] == ['4.2.1']
+
+
+def test_document_pages_are_not_channels():
+    factors = extract_factors_locally("The vendor shall deliver a report of 50 pages")
+    assert factors['social_channels_count']['value'] is None
+    assert extract_factors_locally("3 Facebook pages")['social_channels_count']['value'] == 3
+
+
+def test_explicit_backward_period_wins_over_contract_length():
+    factors = extract_factors_locally("ระยะเวลาสัญญา 12 เดือน ย้อนหลัง 3 เดือน")
+    assert factors['data_backward_days']['value'] == 90
+
+
+STATED = (
+    "ระบบ Warroom รองรับผู้ใช้งาน 10 คน\n"
+    "ข้อมูลย้อนหลัง 90 วัน\n"
+    "รองรับ 50,000 ข้อความต่อเดือน\n"
+    "เชื่อมต่อ 3 ช่องทาง"
+)
+
+
+def test_chatbot_silence_defaults_without_a_model_call(monkeypatch):
+    import utils.budget_engine as budget_engine
+
+    def no_call(*args, **kwargs):
+        raise AssertionError("model called")
+    monkeypatch.setattr(budget_engine, 'generate_with_fallback', no_call)
+
+    factors, report = budget_engine.extract_budget_factors(STATED, "key", return_report=True)
+    assert factors['chatbot_required'] is False
+    assert report['chatbot_required']['source'] == 'default'
+    assert report['num_users']['source'] == 'rules'
@@ -0,0 +1,55 @@
+import numpy as np
+
+from utils.budget_engine import extract_budget_factors
+from utils.budget_factors import FACTOR_DESCRIPTIONS, select_factor_candidates
+
+UNIT_LESS = "ทีมงานฝ่ายการตลาดทั้งหมดต้องเข้าระบบได้"
+
+
+class FakeEncoder:
+    """Puts UNIT_LESS on the users description; everything else is orthogonal"""
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.calls += 1
+        self.texts.extend(texts)
+        descriptions = list(FACTOR_DESCRIPTIONS.values())
+        size = len(descriptions) + 1
+        rows = []
+        for text in texts:
+            vec = np.zeros(size, dtype=np.float32)
+            if text in descriptions:
+                vec[descriptions.index(text)] = 1.0
+            elif text == UNIT_LESS:
+                vec[list(FACTOR_DESCRIPTIONS).index('num_users')] = 1.0
+            else:
+                vec[-1] = 1.0
+            rows.append(vec)
+        return np.array(rows)
+
+
+def test_unit_less_clause_needs_the_encoder():
+    text = f"บทนำ\n{UNIT_LESS}\nจบเอกสาร"
+    assert select_factor_candidates(text) == []
+    picked = select_factor_candidates(text, encoder=FakeEncoder())
+    assert [c['text'] for c in picked] == [UNIT_LESS]
+
+
+def test_extract_budget_factors_uses_the_encoder():
+    encoder = FakeEncoder()
+    extract_budget_factors(f"ผู้ใช้งาน 10 คน\n{UNIT_LESS}", api_key=None, encoder=encoder)
+    assert encoder.calls > 0
+
+
+def test_only_keyword_misses_are_encoded_and_descriptions_once():
+    encoder = FakeEncoder()
+    text = f"ผู้ใช้งาน 10 คน\n{UNIT_LESS}"
+    select_factor_candidates(text, encoder=encoder)
+    select_factor_candidates(text, encoder=encoder)
+    assert "ผู้ใช้งาน 10 คน" not in encoder.texts
+    assert encoder.texts.count(UNIT_LESS) == 2
+    for description in FACTOR_DESCRIPTIONS.values():
+        assert encoder.texts.count(description) == 1
@@ -0,0 +1,26 @@
+import io
+
+import pytest
+
+from utils.file_reader import read_file_content
+
+
+class Upload(io.BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def test_upload_over_the_memory_budget_is_rejected():
+    with pytest.raises(ValueError, match="per-upload limit"):
+        read_file_content(Upload(b"x" * 4096, "big.txt"), memory_budget_mb=0.001)
+
+
+def test_report_is_returned_per_call():
+    text, report = read_file_content(Upload(b"hello", "a.txt"), return_report=True)
+    assert text == "hello"
+    assert report['format'] == 'txt' and report['buffer'] == 'upload buffer'
+
+    text, report = read_file_content(Upload(b"x" * 3000, "b.txt"), spool_threshold_mb=0.001, return_report=True)
+    assert len(text) == 3000
+    assert report['mode'] == 'spooled' and report['buffer'] == 'temp file'
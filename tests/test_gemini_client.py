@@ -0,0 +1,34 @@
+import utils.gemini_client as gemini_client
+
+
+class _Response:
+    status_code = 200
+    text = ''
+
+
+def _fake_send(calls, raw_text):
+    def send(session, model, body, headers, timeout, on_text=None):
+        calls.append(model)
+        return _Response(), raw_text, {}
+    return send
+
+
+def test_unparseable_reply_retries_and_moves_to_next_model(monkeypatch):
+    calls = []
+    monkeypatch.setattr(gemini_client, '_send', _fake_send(calls, "not json"))
+    result = gemini_client.generate_with_fallback(
+        ['retry-a', 'retry-b'], 'p', 'k', parse=gemini_client.parse_json_list, use_cache=False, attempts=2
+    )
+    assert not result['ok']
+    assert calls == ['retry-a', 'retry-a', 'retry-b', 'retry-b']
+
+
+def test_stop_on_invalid_keeps_the_first_raw_reply(monkeypatch):
+    calls = []
+    monkeypatch.setattr(gemini_client, '_send', _fake_send(calls, "line one\nline two"))
+    result = gemini_client.generate_with_fallback(
+        ['stop-a', 'stop-b'], 'p', 'k', parse=gemini_client.parse_json_list, use_cache=False, stop_on_invalid=True
+    )
+    assert not result['ok']
+    assert result['text'] == "line one\nline two"
+    assert calls == ['stop-a']
@@ -0,0 +1,10 @@
+from utils.json_stream import JsonArrayStream
+
+
+def test_positions_survive_an_undecodable_element():
+    stream = JsonArrayStream()
+    items = []
+    for chunk in ['```json\n["FR", NF', 'R, "NFR"', ', {"a": [1, 2]}]']:
+        items.extend(stream.feed(chunk))
+    assert items == [(0, "FR"), (2, "NFR"), (3, {"a": [1, 2]})]
+    assert stream.done
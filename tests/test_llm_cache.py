@@ -0,0 +1,16 @@
+import utils.gemini_client as gemini_client
+from utils.llm_cache import LLMCache
+
+
+def test_fallback_chain_counts_one_lookup(tmp_path, monkeypatch):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(gemini_client, 'llm_cache', cache)
+    monkeypatch.setattr(gemini_client, 'generate', lambda *a, **k: gemini_client._result(a[0], error="offline"))
+
+    gemini_client.generate_with_fallback(['m1', 'm2', 'm3'], 'prompt', 'key')
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cache.put('m3', 'prompt', '["ok"]')
+    result = gemini_client.generate_with_fallback(['m1', 'm2', 'm3'], 'prompt', 'key', parse=gemini_client.parse_json_list)
+    assert result['cached']
+    assert (cache.hits, cache.misses) == (1, 1)
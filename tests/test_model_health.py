@@ -0,0 +1,34 @@
+import pytest
+
+import utils.gemini_client as gemini_client
+from utils.model_health import ModelHealth, model_health
+
+
+def test_unmeasured_primary_stays_ahead_of_measured_fallback():
+    health = ModelHealth()
+    health.record_failure('primary', status=500)
+    health.record_success('fallback', 0.5)
+    assert health.rank(['primary', 'fallback']) == ['primary', 'fallback']
+
+
+def test_measured_faster_fallback_can_lead():
+    health = ModelHealth()
+    health.record_success('primary', 4.0)
+    health.record_success('fallback', 0.5)
+    assert health.rank(['primary', 'fallback']) == ['fallback', 'primary']
+
+
+def test_unexpected_error_releases_the_probe_slot(monkeypatch):
+    model = 'probe-leak'
+    for _ in range(3):
+        model_health.record_failure(model, status=500)
+    entry = model_health._models[model]
+    entry['open_until'] = 0.0
+
+    def explode(*args, **kwargs):
+        raise KeyError("boom")
+    monkeypatch.setattr(gemini_client, '_send', explode)
+    with pytest.raises(KeyError):
+        gemini_client.generate(model, 'p', 'k', use_cache=False)
+    assert entry['probing'] is False
+    assert model_health.allow(model)
@@ -0,0 +1,62 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import utils.sheet_client as sheet_client
+
+
+class FakeCreds:
+    def __init__(self, refresh_seconds=0.0):
+        self.token = None
+        self.expiry = None
+        self.refreshes = 0
+        self.refresh_seconds = refresh_seconds
+
+    def refresh(self, request):
+        time.sleep(self.refresh_seconds)
+        self.refreshes += 1
+        self.token = "t"
+        self.expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+
+
+class FakeClient:
+    def __init__(self):
+        self.opens = 0
+
+    def set_timeout(self, timeout):
+        pass
+
+    def open_by_url(self, url):
+        self.opens += 1
+        time.sleep(0.05)
+        return type('Sheet', (), {'title': url})()
+
+
+def _pool(monkeypatch, creds, client):
+    monkeypatch.setattr(sheet_client.Credentials, 'from_service_account_info', lambda info, scopes: creds)
+    monkeypatch.setattr(sheet_client.gspread, 'authorize', lambda c: client)
+    return sheet_client.SheetClientPool()
+
+
+def test_concurrent_first_callers_share_one_refresh_and_one_open(monkeypatch):
+    creds, client = FakeCreds(refresh_seconds=0.05), FakeClient()
+    pool = _pool(monkeypatch, creds, client)
+    threads = [threading.Thread(target=pool.spreadsheet, args=("url", {"k": 1})) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert creds.refreshes == 1
+    assert client.opens == 1
+
+
+def test_token_refresh_does_not_hold_the_pool_lock(monkeypatch):
+    creds, client = FakeCreds(refresh_seconds=0.5), FakeClient()
+    pool = _pool(monkeypatch, creds, client)
+    worker = threading.Thread(target=pool.client, args=({"k": 1},))
+    worker.start()
+    time.sleep(0.1)
+    start = time.perf_counter()
+    pool.invalidate("other")
+    assert time.perf_counter() - start < 0.2
+    worker.join()
@@ -5,98 +5,90 @@ Port from Colab V29.0
 
 import re
 import json
-import requests
-import time
+import queue
+import contextvars
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from utils.segmenter import detect_language, segment_tor_text
+from utils.gemini_client import generate_with_fallback, parse_json_list, strip_code_fences
+from utils.quota_scheduler import quota_context, BATCH
+from utils.label_memo import label_memo
+from utils.embedding_classifier import predict_labels, CONFIDENCE_THRESHOLD as EMBEDDING_CONFIDENCE_THRESHOLD
 
-def extract_scope_smart_ai(full_text, api_key):
+# Token budget per formatting chunk and segments repeated across chunk seams
+FORMAT_CHUNK_TOKENS = 6000
+FORMAT_CHUNK_OVERLAP = 2
+FORMAT_MAX_WORKERS = 4
+FORMAT_MODELS = ["gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"]
+
+THAI_SCRIPT_PATTERN = re.compile(r'[\u0E00-\u0E7F]')
+
+
+def estimate_tokens(text):
+    """Rough token estimate (Thai script packs fewer chars per token)"""
+    thai_chars = len(THAI_SCRIPT_PATTERN.findall(text))
+    return int(thai_chars / 2.5 + (len(text) - thai_chars) / 4) + 1
+
+
+def chunk_segments(segments, max_tokens=FORMAT_CHUNK_TOKENS, overlap=FORMAT_CHUNK_OVERLAP):
     """
-    AI INTELLIGENT FORMATTING (Language & Numeral Detection)
-    Port from Colab code
+    Pack bullet-bounded segments into token-budgeted chunks
+    Each chunk after the first repeats the last `overlap` segments of the previous one
     """
-    if not api_key:
-        print("⚠️ No API Key - using basic formatting")
-        return full_text
-    
-    # STEP 0: LANGUAGE & NUMERAL DETECTION
-    sample_text = full_text[:3000]
-    thai_char_count = len(re.findall(r'[ก-ฮ]', sample_text))
-    is_thai_doc = thai_char_count > 20
-    
-    thai_digits = len(re.findall(r'[๐-๙]', sample_text))
-    is_thai_numeral = thai_digits > 5
-    
-    print(f"🌍 Language: {'THAI' if is_thai_doc else 'ENGLISH'}")
-    print(f"🔢 Numerals: {'THAI' if is_thai_numeral else 'ARABIC'}")
-    
-    # STEP 1: PYTHON PRE-PROCESSING (Buffer Logic)
-    raw_lines = full_text.split('\n')
-    cleaned_lines = []
-    
-    page_num_pattern = re.compile(r'^\s*-?\s*(หน้า|Page)?\s*[\d๐-๙]+\s*-?\s*$', re.IGNORECASE)
-    bullet_chars = r'\-\•\*\‣\⁃\●'
-    
-    bullet_pattern = re.compile(r'^(' +
-        r'[\d๐-๙]+(\.[\d๐-๙]+)*\.|' +
-        r'\([\d๐-๙]+\)|' +
-        r'\([a-zA-Z]\)|' +
-        r'[a-zA-Z]\.|' +
-        r'[ก-ฮ]\.|' +
-        r'[' + bullet_chars + r']|' +
-        r'ข้อที่' +
-        r')')
-    
-    current_buffer = ""
-    
-    for line in raw_lines:
-        line = line.strip()
-        if not line: 
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for seg in segments:
+        seg_tokens = estimate_tokens(seg)
+        if current and current_tokens + seg_tokens > max_tokens:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else []
+            current_tokens = sum(estimate_tokens(s) for s in current)
+        current.append(seg)
+        current_tokens += seg_tokens
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def _normalize_item(item):
+    return re.sub(r'\s+', '', str(item)).lower()
+
+
+def stitch_chunk_results(chunk_results, overlap=FORMAT_CHUNK_OVERLAP):
+    """
+    Concatenate per-chunk JSON lists, dropping duplicates at chunk seams
+    """
+    stitched = []
+    # AI may split one overlapping segment into several items
+    window = max(1, overlap) * 4
+
+    for idx, items in enumerate(chunk_results):
+        if idx == 0 or not overlap:
+            stitched.extend(items)
             continue
-        if page_num_pattern.match(line):
-            if len(line) < 10: 
+
+        tail = {_normalize_item(x) for x in stitched[-window:]}
+        for pos, item in enumerate(items):
+            if pos < window and _normalize_item(item) in tail:
                 continue
-        
-        should_split = False
-        is_bullet = bool(bullet_pattern.match(line))
-        
-        if is_thai_doc:
-            if is_bullet: 
-                should_split = True
-        else:
-            is_header = (len(line) < 80) and \
-                        (line[0].isupper()) and \
-                        (not line.endswith('.')) and \
-                        (not line.endswith(',')) and \
-                        (not line.endswith(':')) and \
-                        ("updated information" not in line.lower())
-            
-            if is_bullet or (is_header and current_buffer != ""):
-                should_split = True
-        
-        if should_split:
-            if current_buffer: 
-                cleaned_lines.append(current_buffer)
-            current_buffer = line
-        else:
-            if current_buffer:
-                current_buffer = current_buffer + " " + line
-            else:
-                current_buffer = line
-    
-    if current_buffer: 
-        cleaned_lines.append(current_buffer)
-    pre_cleaned_text = "\n".join(cleaned_lines)
-    
-    # STEP 2: AI REFINEMENT
-    models = ["gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"]
-    headers = {'Content-Type': 'application/json'}
-    
+            stitched.append(item)
+
+    return stitched
+
+
+def _build_format_prompt(text, is_thai_doc, is_thai_numeral):
     if is_thai_doc:
         numeral_instruction = """
         🚨 NUMERAL RULE: The document uses THAI NUMERALS (๑, ๒).
         Please output THAI NUMERALS in the list.
         """ if is_thai_numeral else "🚨 NUMERAL RULE: Use ARABIC NUMERALS (1, 2)."
         
-        prompt = f"""
+        return f"""
         You are a TOR Specialist. Language: THAI.
         Target: Clean JSON List of ALL requirements.
         {numeral_instruction}
@@ -104,46 +96,118 @@ def extract_scope_smart_ai(full_text, api_key):
         1. TABLE DATA: Treat "TR 1.1", "REQ-01" as bullet points.
         2. NO TRANSLATION: Keep text exactly as found.
         3. NO FILTERING: Do NOT remove any sections. Keep Introduction, Commercial, Scope, EVERYTHING.
-        Input: {pre_cleaned_text[:40000]}
+        Input: {text}
         """
-    else:
-        prompt = f"""
+    
+    return f"""
         You are a TOR Specialist. Language: ENGLISH.
         Target: Clean JSON List of ALL requirements.
         🚧 RULES:
         1. TABLE DATA: Treat "TR 1.1" as bullet points.
         2. FUSED TEXT: Split items stuck together.
         3. NO FILTERING: Do NOT remove any sections. Keep Introduction, Commercial, Scope, EVERYTHING.
-        Input: {pre_cleaned_text[:40000]}
+        Input: {text}
         """
+
+
+def _map_with_events(fn, count, max_workers, on_event=None):
+    """
+    Ordered executor.map over range(count) where fn(idx, emit) may report progress
+    emit(*args) is thread-safe; on_event(*args) always runs on the calling
+    thread, so it may touch UI elements. Workers run in a copy of the
+    caller's context, so the quota session/priority carries over.
+    """
+    contexts = [contextvars.copy_context() for _ in range(count)]
     
-    ai_result_list = []
-    for model in models:
-        print(f"🔄 Trying AI Model: {model}...")
-        try:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-            response = requests.post(
-                url, 
-                headers=headers, 
-                data=json.dumps({"contents": [{"parts": [{"text": prompt}]}]}),
-                timeout=30
-            )
-            if response.status_code == 200:
-                print(f"✅ SUCCESS with {model}!")
-                raw_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                raw_text = raw_text.replace('```json', '').replace('```', '').strip()
-                try:
-                    ai_result_list = json.loads(raw_text)
-                    print(f"✅ Parsed JSON successfully")
-                    break
-                except:
-                    ai_result_list = raw_text.split('\n')
-                    break
-            elif response.status_code == 429: 
-                time.sleep(2)
-        except Exception as e:
-            print(f"⚠️ Error with {model}: {e}")
-            continue
+    def run(idx, emit):
+        return contexts[idx].run(fn, idx, emit)
+    
+    if on_event is None:
+        with ThreadPoolExecutor(max_workers=min(max_workers, count)) as executor:
+            return list(executor.map(lambda idx: run(idx, None), range(count)))
+    
+    events = queue.Queue()
+    
+    def emit(*args):
+        events.put(args)
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, count)) as executor:
+        futures = [executor.submit(run, idx, emit) for idx in range(count)]
+        while not all(f.done() for f in futures) or not events.empty():
+            try:
+                on_event(*events.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        return [f.result() for f in futures]
+
+
+def _format_chunk(chunk_text, is_thai_doc, is_thai_numeral, api_key, label="", on_item=None):
+    """
+    Send one chunk through the model fallback chain
+    Returns list of requirement strings (empty if every model failed)
+    on_item(position, text) receives requirements while the response streams in
+    """
+    prompt = _build_format_prompt(chunk_text, is_thai_doc, is_thai_numeral)
+    
+    result = generate_with_fallback(
+        FORMAT_MODELS, prompt, api_key, timeout=30, parse=parse_json_list, label=label, on_item=on_item,
+        stop_on_invalid=True
+    )
+    if result['ok']:
+        print(f"{'💾' if result['cached'] else '✅'} {label}{result['model']}")
+        return result['value']
+    
+    # Model answered but not with a JSON list: keep its lines
+    if result['text']:
+        return strip_code_fences(result['text']).split('\n')
+    return []
+
+
+def extract_scope_smart_ai(full_text, api_key, max_chunk_tokens=FORMAT_CHUNK_TOKENS, max_workers=FORMAT_MAX_WORKERS, on_item=None):
+    """
+    AI INTELLIGENT FORMATTING (Language & Numeral Detection)
+    Port from Colab code
+
+    Long documents are split on bullet boundaries into token-budgeted chunks
+    that are formatted concurrently and stitched back in order.
+
+    on_item(chunk_index, position, text) is called on the calling thread for
+    each requirement as the model streams it (partial, before stitching).
+    """
+    if not api_key:
+        print("⚠️ No API Key - using basic formatting")
+        return full_text
+    
+    # STEP 0: LANGUAGE & NUMERAL DETECTION
+    is_thai_doc, is_thai_numeral = detect_language(full_text)
+    
+    print(f"🌍 Language: {'THAI' if is_thai_doc else 'ENGLISH'}")
+    print(f"🔢 Numerals: {'THAI' if is_thai_numeral else 'ARABIC'}")
+    
+    # STEP 1: PYTHON PRE-PROCESSING (Buffer Logic)
+    cleaned_lines = segment_tor_text(full_text, is_thai_doc)
+    pre_cleaned_text = "\n".join(cleaned_lines)
+    
+    # STEP 2: AI REFINEMENT (chunked map-reduce)
+    chunks = chunk_segments(cleaned_lines, max_chunk_tokens)
+    print(f"🧩 {len(chunks)} chunk(s) for AI formatting")
+    
+    def run_chunk(idx, emit):
+        label = f"[{idx + 1}/{len(chunks)}] " if len(chunks) > 1 else ""
+        chunk_item = (lambda pos, item: emit(idx, pos, item)) if emit else None
+        result = _format_chunk("\n".join(chunks[idx]), is_thai_doc, is_thai_numeral, api_key, label, chunk_item)
+        if not result:
+            print(f"⚠️ {label}AI Failed, using pre-processed chunk.")
+            return list(chunks[idx])
+        return result
+    
+    if len(chunks) > 1:
+        chunk_results = _map_with_events(run_chunk, len(chunks), max_workers, on_item)
+    else:
+        single_item = (lambda pos, item: on_item(0, pos, item)) if on_item else None
+        chunk_results = [_format_chunk(pre_cleaned_text, is_thai_doc, is_thai_numeral, api_key, on_item=single_item)]
+    
+    ai_result_list = stitch_chunk_results(chunk_results)
     
     if not ai_result_list:
         print("⚠️ AI Failed, using pre-processed text.")
@@ -171,123 +235,143 @@ def extract_scope_smart_ai(full_text, api_key):
     return "\n".join(final_lines)
 
 
-def classify_scope_regex(sentences):
+# ==========================================
+# REGEX CLASSIFIER (precompiled)
+# ==========================================
+
+# NON-FUNCTIONAL PATTERNS
+NFR_PATTERNS = [
+    # Performance & Scalability
+    r'(?:รองรับ).*(?:ผู้ใช้งาน|users|บัญชี|concurrent)',
+    r'(?:รองรับ).*(?:[\d,]+\s*(?:คน|user|account))',
+    r'(?:response time|เวลาตอบสนอง|ความเร็ว)',
+    r'(?:performance|ประสิทธิภาพ|throughput)',
+    r'(?:scalability|ขยายได้|scale)',
+    
+    # Availability & Reliability
+    r'(?:uptime|availability|ความพร้อมใช้งาน)',
+    r'(?:99\.9%|ตลอด\s*24\s*ชั่วโมง|24/7)',
+    r'(?:backup|สำรองข้อมูล|recovery)',
+    r'(?:disaster recovery|แผนฉุกเฉิน)',
+    
+    # Security
+    r'(?:security|ความปลอดภัย|encryption|เข้ารหัส)',
+    r'(?:authentication|authorization|SSO|OAuth)',
+    r'(?:access control|สิทธิ์การเข้าถึง|role)',
+    r'(?:audit|audit trail|log)',
+    
+    # Usability
+    r'(?:usability|ใช้งานง่าย|user[\s-]*friendly)',
+    r'(?:interface|ui|ux|หน้าจอ)',
+    r'(?:responsive|รองรับ).*(?:มือถือ|mobile|tablet)',
+    
+    # Compatibility
+    r'(?:compatibility|เข้ากันได้|รองรับ).*(?:browser|เบราว์เซอร์)',
+    r'(?:รองรับ).*(?:chrome|firefox|safari|edge)',
+    r'(?:cross[\s-]*platform|ข้ามแพลตฟอร์ม)',
+    
+    # Technical Constraints
+    r'(?:cloud|คลาวด์)',
+    r'(?:api|integration|เชื่อมต่อ).*(?:third[\s-]*party|ระบบภายนอก)',
+]
+
+# High confidence NFR patterns
+HIGH_CONF_NFR_PATTERNS = [
+    r'รองรับ.*[\d,]+.*คน',
+    r'รองรับ.*[\d,]+.*user',
+    r'99\.9%',
+    r'uptime',
+    r'response time',
+    r'performance',
+    r'concurrent',
+]
+
+# High confidence FR patterns
+HIGH_CONF_FR_PATTERNS = [
+    r'ระบบต้อง.*จัดเก็บ',
+    r'ระบบต้อง.*แสดงผล',
+    r'ระบบต้อง.*วิเคราะห์',
+    r'system must.*provide',
+    r'platform must.*support',
+]
+
+# Medium confidence
+MEDIUM_CONF_PATTERNS = [
+    r'สามารถ', r'รองรับ', r'แสดงผล',
+    r'can', r'support', r'provide',
+]
+
+
+def _compile_alternation(patterns, prefix=None, flags=0):
+    """One regex for a pattern list; named groups (prefix_i) report the rule that fired"""
+    if prefix:
+        body = "|".join(f"(?P<{prefix}_{i}>{p})" for i, p in enumerate(patterns))
+    else:
+        body = "|".join(f"(?:{p})" for p in patterns)
+    return re.compile(body, flags)
+
+
+NFR_REGEX = _compile_alternation(NFR_PATTERNS, 'nfr', re.IGNORECASE)
+HIGH_CONF_REGEX = _compile_alternation(HIGH_CONF_NFR_PATTERNS + HIGH_CONF_FR_PATTERNS, 'high')
+MEDIUM_CONF_REGEX = _compile_alternation(MEDIUM_CONF_PATTERNS, 'medium')
+
+# Group-free variants for pandas .str.contains
+_NFR_ANY = _compile_alternation(NFR_PATTERNS, flags=re.IGNORECASE)
+_HIGH_CONF_ANY = _compile_alternation(HIGH_CONF_NFR_PATTERNS + HIGH_CONF_FR_PATTERNS)
+_MEDIUM_CONF_ANY = _compile_alternation(MEDIUM_CONF_PATTERNS)
+
+
+def classify_regex_with_confidence(sentence):
     """
-    Regex-based classifier (fallback when AI fails)
-    Classifies as Functional or Non-Functional Requirements
+    Single-sentence regex classification
+    Returns (is_nfr, confidence, rule) where rule names the NFR group that fired
     """
-    results = []
+    sent_lower = sentence.lower()
     
-    for sent in sentences:
-        sent_lower = sent.lower()
-        is_nfr = False  # Default: Functional
-        
-        # NON-FUNCTIONAL PATTERNS
-        nfr_patterns = [
-            # Performance & Scalability
-            r'(รองรับ).*(ผู้ใช้งาน|users|บัญชี|concurrent)',
-            r'(รองรับ).*([\d,]+\s*(คน|user|account))',
-            r'(response time|เวลาตอบสนอง|ความเร็ว)',
-            r'(performance|ประสิทธิภาพ|throughput)',
-            r'(scalability|ขยายได้|scale)',
-            
-            # Availability & Reliability
-            r'(uptime|availability|ความพร้อมใช้งาน)',
-            r'(99\.9%|ตลอด\s*24\s*ชั่วโมง|24/7)',
-            r'(backup|สำรองข้อมูล|recovery)',
-            r'(disaster recovery|แผนฉุกเฉิน)',
-            
-            # Security
-            r'(security|ความปลอดภัย|encryption|เข้ารหัส)',
-            r'(authentication|authorization|SSO|OAuth)',
-            r'(access control|สิทธิ์การเข้าถึง|role)',
-            r'(audit|audit trail|log)',
-            
-            # Usability
-            r'(usability|ใช้งานง่าย|user[\s-]*friendly)',
-            r'(interface|ui|ux|หน้าจอ)',
-            r'(responsive|รองรับ).*(มือถือ|mobile|tablet)',
-            
-            # Compatibility
-            r'(compatibility|เข้ากันได้|รองรับ).*(browser|เบราว์เซอร์)',
-            r'(รองรับ).*(chrome|firefox|safari|edge)',
-            r'(cross[\s-]*platform|ข้ามแพลตฟอร์ม)',
-            
-            # Technical Constraints
-            r'(cloud|คลาวด์)',
-            r'(api|integration|เชื่อมต่อ).*(third[\s-]*party|ระบบภายนอก)',
-        ]
-        
-        for pattern in nfr_patterns:
-            if re.search(pattern, sent_lower, re.IGNORECASE):
-                is_nfr = True
-                break
-        
-        results.append(is_nfr)
+    nfr_match = NFR_REGEX.search(sent_lower)
     
-    return results
+    if HIGH_CONF_REGEX.search(sent_lower):
+        confidence = 0.95
+    elif MEDIUM_CONF_REGEX.search(sent_lower):
+        confidence = 0.7
+    else:
+        confidence = 0.3
+    
+    return bool(nfr_match), confidence, nfr_match.lastgroup if nfr_match else None
 
 
-def calculate_regex_confidence(sentence):
+def classify_regex_series(sentences):
     """
-    Calculate confidence score for FR/NFR classification
+    Vectorized regex classification over a pandas string Series (or list)
+    Returns DataFrame with columns: is_nfr, confidence
     """
-    sent_lower = sentence.lower()
+    series = pd.Series(sentences, dtype=object).fillna('').astype(str).str.lower()
     
-    # High confidence NFR patterns
-    high_conf_nfr = [
-        r'รองรับ.*[\d,]+.*คน',
-        r'รองรับ.*[\d,]+.*user',
-        r'99\.9%',
-        r'uptime',
-        r'response time',
-        r'performance',
-        r'concurrent',
-    ]
-    
-    # High confidence FR patterns
-    high_conf_fr = [
-        r'ระบบต้อง.*จัดเก็บ',
-        r'ระบบต้อง.*แสดงผล',
-        r'ระบบต้อง.*วิเคราะห์',
-        r'system must.*provide',
-        r'platform must.*support',
-    ]
-    
-    for pattern in high_conf_nfr:
-        if re.search(pattern, sent_lower):
-            return 0.95
-    
-    for pattern in high_conf_fr:
-        if re.search(pattern, sent_lower):
-            return 0.95
-    
-    # Medium confidence
-    medium_patterns = [
-        r'สามารถ', r'รองรับ', r'แสดงผล',
-        r'can', r'support', r'provide',
-    ]
-    
-    for pattern in medium_patterns:
-        if re.search(pattern, sent_lower):
-            return 0.7
-    
-    return 0.3
-
-
-def classify_scope_batch_fast(sentences, api_key, batch_size=20):
-    """
-    AI Classifier: Functional vs Non-Functional Requirements
-    """
-    results = []
-    consecutive_rate_limits = 0
+    is_nfr = series.str.contains(_NFR_ANY)
+    high = series.str.contains(_HIGH_CONF_ANY)
+    medium = series.str.contains(_MEDIUM_CONF_ANY)
     
-    models_to_try = [
-        "gemini-2.0-flash",
-        "gemini-2.0-flash-lite",
-    ]
+    confidence = np.select([high, medium], [0.95, 0.7], default=0.3)
     
-    system_context = """You are a **Requirements Analysis Expert**.
+    return pd.DataFrame({'is_nfr': is_nfr.to_numpy(dtype=bool), 'confidence': confidence}, index=series.index)
+
+
+def classify_scope_regex(sentences):
+    """
+    Regex-based classifier (fallback when AI fails)
+    Classifies as Functional or Non-Functional Requirements
+    """
+    return [bool(NFR_REGEX.search(sent.lower())) for sent in sentences]
+
+
+def calculate_regex_confidence(sentence):
+    """
+    Calculate confidence score for FR/NFR classification
+    """
+    return classify_regex_with_confidence(sentence)[1]
+
+
+CLASSIFY_SYSTEM_CONTEXT = """You are a **Requirements Analysis Expert**.
 
 🎯 MISSION: Classify requirements as "FUNCTIONAL" or "NON-FUNCTIONAL".
 
@@ -324,17 +408,77 @@ Output: ["Functional", "Non-Functional", "Non-Functional"]
 Input: ["Platform must analyze sentiment", "System must support 10,000 concurrent users", "99.9% uptime required"]
 Output: ["Functional", "Non-Functional", "Non-Functional"]
 """
+
+CLASSIFY_MODELS = [
+    "gemini-2.0-flash",
+    "gemini-2.0-flash-lite",
+]
+CLASSIFY_MAX_WORKERS = 4
+
+# Batch packing: sentence tokens per request, sentences per request, and the
+# output budget per label ('"Non-Functional",' is ~5 tokens)
+CLASSIFY_BATCH_INPUT_TOKENS = 4000
+CLASSIFY_BATCH_MAX_ITEMS = 60
+OUTPUT_TOKENS_PER_LABEL = 8
+OUTPUT_TOKENS_OVERHEAD = 64
+
+def _parse_classification(raw_res, expected):
+    """Parse model output into exactly `expected` labels (None if impossible)"""
+    raw_res = raw_res.replace('```json', '').replace('```', '').strip()
+    
+    try:
+        result_list = json.loads(raw_res)
+        if isinstance(result_list, list) and len(result_list) == expected:
+            return result_list
+    except:
+        # Fallback parsing
+        lines = raw_res.split('\n')
+        fallback_list = []
+        for line in lines:
+            line_lower = line.lower()
+            if 'non-functional' in line_lower or 'nonfunctional' in line_lower:
+                fallback_list.append("Non-Functional")
+            elif 'functional' in line_lower:
+                fallback_list.append("Functional")
+        
+        if len(fallback_list) == expected:
+            return fallback_list
     
-    total_batches = (len(sentences) + batch_size - 1) // batch_size
+    return None
+
+
+def pack_classification_batches(sentences, max_input_tokens=CLASSIFY_BATCH_INPUT_TOKENS, max_items=CLASSIFY_BATCH_MAX_ITEMS):
+    """
+    Group consecutive sentences into batches by estimated token count
+    Many short sentences share one request; long table rows get smaller batches
+    """
+    batches = []
+    current = []
+    current_tokens = 0
     
-    for batch_idx in range(0, len(sentences), batch_size):
-        batch = sentences[batch_idx:batch_idx+batch_size]
-        batch_num = batch_idx // batch_size + 1
-        
-        progress_pct = int((batch_num / total_batches) * 100)
-        print(f"[{progress_pct:3d}%] Batch {batch_num}/{total_batches}...", end=" ")
-        
-        final_prompt = f"""{system_context}
+    for sent in sentences:
+        # JSON quoting / indentation adds a few tokens per item
+        sent_tokens = estimate_tokens(sent) + 4
+        if current and (current_tokens + sent_tokens > max_input_tokens or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(sent)
+        current_tokens += sent_tokens
+    
+    if current:
+        batches.append(current)
+    
+    return batches
+
+
+def _classify_batch(batch, api_key, label="", on_item=None):
+    """
+    Classify one batch through the model chain
+    Returns list of labels, or None when every model failed
+    on_item(position, label) receives labels while the response streams in
+    """
+    final_prompt = f"""{CLASSIFY_SYSTEM_CONTEXT}
 
 NOW ANALYZE THESE SENTENCES:
 {json.dumps(batch, ensure_ascii=False, indent=2)}
@@ -347,145 +491,167 @@ INSTRUCTIONS:
 5. NO markdown, NO explanations, JUST the JSON array
 
 OUTPUT:"""
-        
-        batch_results = None
-        
-        for model in models_to_try:
-            if batch_results is not None:
-                break
-            
-            for attempt in range(2):
-                try:
-                    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-                    
-                    payload = {
-                        "contents": [{"parts": [{"text": final_prompt}]}],
-                        "generationConfig": {
-                            "temperature": 0.1,
-                            "topP": 0.8,
-                            "topK": 10,
-                            "maxOutputTokens": 500,
-                        }
-                    }
-                    
-                    response = requests.post(
-                        url,
-                        headers={'Content-Type': 'application/json'},
-                        data=json.dumps(payload),
-                        timeout=10
-                    )
-                    
-                    if response.status_code == 200:
-                        raw_res = response.json()['candidates'][0]['content']['parts'][0]['text']
-                        raw_res = raw_res.replace('```json', '').replace('```', '').strip()
-                        
-                        try:
-                            result_list = json.loads(raw_res)
-                            if isinstance(result_list, list) and len(result_list) == len(batch):
-                                batch_results = result_list
-                                consecutive_rate_limits = 0
-                                print(f"✅")
-                                break
-                        except:
-                            # Fallback parsing
-                            lines = raw_res.split('\n')
-                            fallback_list = []
-                            for line in lines:
-                                line_lower = line.lower()
-                                if 'non-functional' in line_lower or 'nonfunctional' in line_lower:
-                                    fallback_list.append("Non-Functional")
-                                elif 'functional' in line_lower:
-                                    fallback_list.append("Functional")
-                            
-                            if len(fallback_list) == len(batch):
-                                batch_results = fallback_list
-                                consecutive_rate_limits = 0
-                                print(f"✅ (fallback)")
-                                break
-                    
-                    elif response.status_code == 429:
-                        consecutive_rate_limits += 1
-                        
-                        if consecutive_rate_limits >= 3:
-                            print(f"⏸️ (pause 60s)...", end=" ")
-                            time.sleep(60)
-                            consecutive_rate_limits = 0
-                        else:
-                            time.sleep(3)
-                        
-                        if attempt < 1:
-                            continue
-                        else:
-                            break
-                    
-                    else:
-                        if attempt < 1:
-                            continue
-                        else:
-                            break
-                
-                except:
-                    if attempt < 1:
-                        continue
-                    else:
-                        break
-                
-                if batch_results is not None:
-                    break
+    
+    generation_config = {
+        "temperature": 0.1,
+        "topP": 0.8,
+        "topK": 10,
+        "maxOutputTokens": OUTPUT_TOKENS_OVERHEAD + OUTPUT_TOKENS_PER_LABEL * len(batch),
+    }
+    
+    result = generate_with_fallback(
+        CLASSIFY_MODELS, final_prompt, api_key, generation_config,
+        timeout=10, parse=lambda raw: _parse_classification(raw, len(batch)), label=label, on_item=on_item
+    )
+    if not result['ok']:
+        return None
+    print(f"{label}{'💾' if result['cached'] else '✅'}")
+    return result['value']
+
+
+def classify_scope_batch_fast(sentences, api_key, batch_size=CLASSIFY_BATCH_MAX_ITEMS, max_workers=CLASSIFY_MAX_WORKERS, return_sources=False, on_item=None):
+    """
+    AI Classifier: Functional vs Non-Functional Requirements
+
+    Sentences are packed into batches by estimated token count (at most
+    batch_size per request) and the output budget scales with batch length.
+    Several batches are kept in flight at once; requests go through the
+    shared quota scheduler at batch priority and each model backs off
+    independently on 429/5xx.
+    Results are returned in input order.
+
+    With return_sources=True also returns a per-sentence flag that is True
+    when the label came from the model (False for the regex fallback).
+
+    on_item(sentence_index, label) is called on the calling thread as labels
+    stream in; a later call for the same index supersedes the earlier one.
+    """
+    batches = pack_classification_batches(sentences, max_items=batch_size)
+    total_batches = len(batches)
+    offsets = [0]
+    for batch in batches[:-1]:
+        offsets.append(offsets[-1] + len(batch))
+    
+    def run_batch(batch_idx, emit):
+        label = f"[Batch {batch_idx + 1}/{total_batches}] "
+        batch = batches[batch_idx]
+        offset = offsets[batch_idx]
+        batch_item = (lambda pos, item: emit(offset + pos, item)) if emit else None
+        batch_results = _classify_batch(batch, api_key, label, batch_item)
+        from_ai = batch_results is not None
         
         if batch_results is None:
-            print(f"⚠️ Regex")
+            print(f"{label}⚠️ Regex")
             regex_results = classify_scope_regex(batch)
             batch_results = ["Non-Functional" if r else "Functional" for r in regex_results]
         
-        results.extend(batch_results)
+        if emit:
+            for pos, item in enumerate(batch_results):
+                emit(offset + pos, item)
+        return batch_results, from_ai
     
+    results = []
+    sources = []
+    if total_batches:
+        # Bulk labelling yields to interactive requests from other sessions
+        with quota_context(priority=BATCH):
+            batch_outputs = _map_with_events(run_batch, total_batches, max_workers, on_item)
+        for batch_results, from_ai in batch_outputs:
+            results.extend(batch_results)
+            sources.extend([from_ai] * len(batch_results))
+    
+    if return_sources:
+        return results, sources
     return results
 
 
-def classify_scope_hybrid(sentences, api_key):
+def classify_scope_hybrid(sentences, api_key, embeddings=None, on_item=None):
     """
     HYBRID STRATEGY: Classify Functional vs Non-Functional Requirements
     
     Strategy:
+    - Phase 0: Label memo (sentences labelled before, by AI or reviewers)
     - Phase 1: Regex pre-filter (fast, ~70% accuracy)
-    - Phase 2: AI selective (uncertain cases only)
+    - Phase 1.5: Local embedding classifier (when matcher embeddings are given)
+    - Phase 2: AI selective (low-confidence cases only)
+
+    on_item(index, label) reports labels as they are decided (AI labels stream in).
     """
     print(f"🎯 Hybrid Classification: {len(sentences)} sentences")
     
-    results = []
+    results = [None] * len(sentences)
     uncertain_indices = []
     uncertain_sentences = []
     
+    # PHASE 0: LABEL MEMO
+    memo_results = label_memo.lookup(sentences)
+    for i, label in memo_results.items():
+        results[i] = label
+        if on_item:
+            on_item(i, label)
+    print(f"🧠 Phase 0: Label memo... {len(memo_results)} known")
+    
+    pending_indices = [i for i in range(len(sentences)) if results[i] is None]
+    pending_sentences = [sentences[i] for i in pending_indices]
+    
     # PHASE 1: REGEX PRE-FILTER
     print("📊 Phase 1: Regex pre-filter...", end=" ")
     
-    regex_results = classify_scope_regex(sentences)
-    confidences = [calculate_regex_confidence(sent) for sent in sentences]
+    regex_df = classify_regex_series(pending_sentences)
+    regex_results = regex_df['is_nfr'].tolist()
+    confidences = regex_df['confidence'].tolist()
     
-    for i, (sent, is_nfr, confidence) in enumerate(zip(sentences, regex_results, confidences)):
+    for i, sent, is_nfr, confidence in zip(pending_indices, pending_sentences, regex_results, confidences):
         if confidence >= 0.9:
-            results.append("Non-Functional" if is_nfr else "Functional")
+            results[i] = "Non-Functional" if is_nfr else "Functional"
+            if on_item:
+                on_item(i, results[i])
         else:
             uncertain_indices.append(i)
             uncertain_sentences.append(sent)
-            results.append(None)
     
     print(f"Done! ({len(uncertain_sentences)} uncertain)")
     
+    # PHASE 1.5: LOCAL EMBEDDING CLASSIFIER
+    if uncertain_sentences and embeddings is not None:
+        local_labels, local_conf = predict_labels(np.asarray(embeddings)[uncertain_indices])
+        if local_labels is not None:
+            still_uncertain = []
+            for pos, (i, label, conf) in enumerate(zip(uncertain_indices, local_labels, local_conf)):
+                if conf >= EMBEDDING_CONFIDENCE_THRESHOLD:
+                    results[i] = label
+                    if on_item:
+                        on_item(i, label)
+                else:
+                    still_uncertain.append(pos)
+            print(f"🧮 Phase 1.5: Local classifier... {len(uncertain_indices) - len(still_uncertain)} confident")
+            uncertain_indices = [uncertain_indices[p] for p in still_uncertain]
+            uncertain_sentences = [uncertain_sentences[p] for p in still_uncertain]
+    
     # PHASE 2: AI SELECTIVE
     if uncertain_sentences:
         print(f"🤖 Phase 2: AI classification ({len(uncertain_sentences)} items)...")
-        print(f"Expected time: ~{len(uncertain_sentences) // 20 * 10}s")
+        expected_batches = len(pack_classification_batches(uncertain_sentences))
+        print(f"Expected time: ~{expected_batches * 10 // CLASSIFY_MAX_WORKERS}s ({expected_batches} requests)")
         
-        ai_results = classify_scope_batch_fast(
+        ai_results, from_ai = classify_scope_batch_fast(
             uncertain_sentences, 
             api_key,
-            batch_size=20
+            return_sources=True,
+            on_item=(lambda pos, label: on_item(uncertain_indices[pos], label)) if on_item else None
         )
         
         for idx, ai_result in zip(uncertain_indices, ai_results):
             results[idx] = ai_result
+        
+        # Only genuine model answers are memoized (not the regex fallback)
+        ai_ok = [pos for pos, ok in enumerate(from_ai) if ok]
+        label_memo.remember(
+            [uncertain_sentences[p] for p in ai_ok],
+            [ai_results[p] for p in ai_ok],
+            source='ai',
+            embeddings=[embeddings[uncertain_indices[p]] for p in ai_ok] if embeddings is not None else None
+        )
     
     print(f"✅ Hybrid classification complete!")
     return results
@@ -5,45 +5,114 @@ Port from Colab V29.0
 
 import pandas as pd
 import numpy as np
-import json
-import requests
 import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.pricing_index import (
+    get_pricing_index, quoted_initial_fee, DEFAULT_ZOCIAL_USERS, DEFAULT_BACKWARD_DAYS, DEFAULT_WARROOM_USERS
+)
+from utils.gemini_client import generate_with_fallback, parse_json_object
+from utils.budget_factors import (
+    select_factor_candidates, format_candidates, extract_factors_locally,
+    FACTOR_FIELDS, LOCAL_CONFIDENCE_THRESHOLD
+)
+
+FACTOR_PROMPT_FIELDS = {
+    'product_type': '"product_type": "Zocial Eye" or "Warroom"',
+    'num_users': '"num_users": Integer',
+    'data_backward_days': '"data_backward_days": Integer',
+    'monthly_transactions': '"monthly_transactions": Integer',
+    'social_channels_count': '"social_channels_count": Integer',
+    'chatbot_required': '"chatbot_required": Boolean',
+}
 
-def extract_budget_factors(tor_text, api_key):
+# Rendered budgets and scenario tables per (inputs, pricing version); reruns
+# of the budget tab with unchanged inputs are served from here
+BUDGET_MEMO_SIZE = 32
+_budget_memo = OrderedDict()
+_budget_memo_lock = threading.Lock()
+
+
+def extract_budget_factors(tor_text, api_key, encoder=None, return_report=False):
     """
-    Extract budget factors using AI
+    Extract budget factors (rules first, AI for the rest)
+
+    Fields stated in predictable forms are read locally with a confidence;
+    Gemini is asked only for fields below LOCAL_CONFIDENCE_THRESHOLD, and
+    only the clauses that look like they state a factor (with their line and
+    clause numbers) are sent. Documented defaults (no chatbot when none is
+    mentioned) need no call; they are only re-asked when a call is made for
+    other fields. An optional sentence-transformers encoder widens the
+    clause search.
+
+    With return_report=True also returns the per-field value, confidence,
+    source ('rules' / 'default' / 'ai') and location of this extraction.
     """
+    candidates = select_factor_candidates(tor_text, encoder=encoder)
+    local = extract_factors_locally(tor_text, candidates)
+    
+    report = {}
+    factors = {}
+    defaults = []
+    for field in FACTOR_FIELDS:
+        entry = local[field]
+        if entry['confidence'] >= LOCAL_CONFIDENCE_THRESHOLD:
+            factors[field] = entry['value']
+            report[field] = dict(entry, source='rules')
+        elif entry.get('default'):
+            factors[field] = entry['value']
+            report[field] = dict(entry, source='default')
+            defaults.append(field)
+    
+    def done():
+        return (factors, report) if return_report else factors
+    
+    unresolved = [f for f in FACTOR_FIELDS if f not in factors]
+    if not unresolved:
+        print("⚡ Budget factors resolved locally")
+        return done()
+    
+    asked = unresolved + defaults
+    print(f"⚡ Budget factors: {len(factors) - len(defaults)} local, asking AI for {', '.join(asked)}")
     if not api_key:
         print("⚠️ No API Key - skipping budget extraction")
-        return {}
+        return done()
+    
+    model = "gemini-1.5-flash"
     
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+    if candidates:
+        source = "Clauses selected from the TOR (location in brackets):\n" + format_candidates(candidates)
+        print(f"🔎 Budget factors: {len(candidates)} candidate clauses ({len(source):,} of {len(tor_text):,} chars)")
+    else:
+        source = f"Text: {tor_text[:30000]}"
     
+    field_lines = "\n    ".join(f"- {FACTOR_PROMPT_FIELDS[f]}" for f in FACTOR_FIELDS if f in asked)
     prompt = f"""Act as Sales Engineer. Analyze TOR text. Return JSON (null if not found):
-    - "product_type": "Zocial Eye" or "Warroom"
-    - "num_users": Integer
-    - "data_backward_days": Integer
-    - "monthly_transactions": Integer
-    - "social_channels_count": Integer
-    - "chatbot_required": Boolean
+    {field_lines}
     
-    Text: {tor_text[:30000]}"""
+    {source}"""
     
-    try:
-        res = requests.post(
-            url, 
-            headers={'Content-Type': 'application/json'}, 
-            data=json.dumps({"contents": [{"parts": [{"text": prompt}]}]}),
-            timeout=30
-        )
-        if res.status_code == 200:
-            raw_text = res.json()['candidates'][0]['content']['parts'][0]['text']
-            raw_text = raw_text.replace('```json', '').replace('```', '').strip()
-            return json.loads(raw_text)
-    except Exception as e:
-        print(f"⚠️ Budget extraction failed: {e}")
+    result = generate_with_fallback([model], prompt, api_key, timeout=30, parse=parse_json_object)
+    if result['ok']:
+        if result['cached']:
+            print("💾 Budget factors from cache")
+        for field in asked:
+            value = result['value'].get(field)
+            if field in defaults and value is None:
+                continue
+            factors[field] = value
+            report[field] = {'value': value, 'confidence': None, 'location': None, 'source': 'ai'}
+        return done()
     
-    return {}
+    print(f"⚠️ Budget extraction failed: {result['error']}")
+    # Keep whatever the rules found, even below the confidence threshold
+    for field in unresolved:
+        if local[field]['value'] is not None:
+            factors[field] = local[field]['value']
+            report[field] = dict(local[field], source='rules')
+    return done()
 
 
 def format_money(val):
@@ -56,25 +125,52 @@ def format_money(val):
         return str(val)
 
 
+def initial_fee(package_row):
+    """Package initial fee added to quoted totals (only plain int/float cells, as before)"""
+    return quoted_initial_fee(package_row.get('Initial_Fee (THB)', 0))
+
+
+def _count(value):
+    return int(value) if float(value).is_integer() else value
+
+
+def _warroom_option(index, pos, extra_ch, extra_u):
+    """Package row + add-on breakdown for one solver option"""
+    base_pack = index.warroom_row(pos)
+    addon_cost = 0
+    details = []
+    if extra_ch > 0:
+        cost = _count(extra_ch) * index.channel_price
+        addon_cost += cost
+        details.append(f"{_count(extra_ch)} Extra Channels ({format_money(cost)} THB)")
+    if extra_u > 0:
+        cost = _count(extra_u) * index.user_price
+        addon_cost += cost
+        details.append(f"{_count(extra_u)} Extra Users ({format_money(cost)} THB)")
+    return {
+        'Package': base_pack,
+        'Breakdown': {
+            'addon_cost': addon_cost,
+            'details': details,
+            'total': base_pack['Total_Price_Per_Year (THB)'] + addon_cost
+        }
+    }
+
+
 def calculate_budget_sheets(factors, matched_products, pricing_df, addon_df):
     """
     Calculate budget for matched products
     Returns list of budget results
+
+    Package lookups go through the pricing index, which is compiled once
+    per master-data version instead of on every call. Warroom takes the
+    cheapest package + add-on combination (initial fee included); the
+    next-best options are kept under 'Alternatives'.
     """
-    if pricing_df is None or pricing_df.empty:
+    index = get_pricing_index(pricing_df, addon_df)
+    if index is None:
         return []
     
-    # Build addon dictionary
-    addon_dict = {}
-    if addon_df is not None and not addon_df.empty:
-        for _, row in addon_df.iterrows():
-            key = f"{str(row.get('Product','')).strip()}_{str(row.get('AddOn_Name','')).strip()}"
-            if 'User_Limit' in key: 
-                key = 'Warroom_User'
-            elif 'Owned_Social_Channel' in key: 
-                key = 'Warroom_Channel'
-            addon_dict[key] = row.get('Price (THB)', 0)
-    
     prod_type = factors.get('product_type')
     if not prod_type: 
         prod_type = " & ".join(matched_products)
@@ -83,21 +179,12 @@ def calculate_budget_sheets(factors, matched_products, pricing_df, addon_df):
     
     # === ZOCIAL EYE ===
     if "Zocial Eye" in prod_type:
-        users = factors.get('num_users') or 2
-        bw = factors.get('data_backward_days') or 90
+        users = factors.get('num_users') or DEFAULT_ZOCIAL_USERS
+        bw = factors.get('data_backward_days') or DEFAULT_BACKWARD_DAYS
         
-        df_z = pricing_df[pricing_df['Product'] == 'Zocial Eye'].copy()
-        if not df_z.empty:
-            df_z['Data_Backward (Days)'] = pd.to_numeric(df_z['Data_Backward (Days)'], errors='coerce').fillna(0)
-            df_z['User_Limit (User)'] = pd.to_numeric(df_z['User_Limit (User)'], errors='coerce').fillna(0)
-            
-            valid = df_z[
-                (df_z['Data_Backward (Days)'] >= bw) & 
-                (df_z['User_Limit (User)'] >= users)
-            ]
-            
-            best = valid.sort_values('Total_Price_Per_Year (THB)').iloc[0] if not valid.empty else df_z.iloc[-1]
-            
+        pos = index.select_zocial(users, bw)
+        if pos is not None:
+            best = index.zocial_row(pos)
             results.append({
                 'Product': 'Zocial Eye',
                 'Package': best,
@@ -110,68 +197,17 @@ def calculate_budget_sheets(factors, matched_products, pricing_df, addon_df):
     
     # === WARROOM ===
     if "Warroom" in prod_type:
-        users = factors.get('num_users') or 5
+        users = factors.get('num_users') or DEFAULT_WARROOM_USERS
         tx = factors.get('monthly_transactions')
         ch = factors.get('social_channels_count')
         chatbot = factors.get('chatbot_required', False)
         
-        df_w = pricing_df[pricing_df['Product'] == 'Warroom'].copy()
-        if not df_w.empty:
-            tx_col = 'Transaction_Limit_PerMonth (Messages)' if 'Transaction_Limit_PerMonth (Messages)' in df_w.columns else 'Message_Limit_PerMonth (Messages)'
-            ch_col = 'Owned_Social_Channel (Account)'
-            
-            df_w['Tx_Num'] = pd.to_numeric(df_w[tx_col], errors='coerce').fillna(999999999)
-            df_w['Ch_Num'] = pd.to_numeric(df_w[ch_col], errors='coerce').fillna(999)
-            
-            base_pack = None
-            addon_cost = 0
-            details = []
-            
-            # Select package based on chatbot/channels
-            if chatbot or (ch and ch > 0):
-                target_ch = ch if ch else 2
-                unlimits = df_w[df_w['Tx_Num'] > 1000000].sort_values('Ch_Num')
-                
-                for _, row in unlimits.iterrows():
-                    if row['Ch_Num'] >= target_ch: 
-                        base_pack = row
-                        break
-                
-                if base_pack is None:
-                    base_pack = unlimits.iloc[-1]
-                    extra_ch = target_ch - base_pack['Ch_Num']
-                    cost = extra_ch * addon_dict.get('Warroom_Channel', 60000)
-                    addon_cost += cost
-                    details.append(f"{extra_ch} Extra Channels ({format_money(cost)} THB)")
-            else:
-                target_tx = tx if tx else 35000
-                limits = df_w[df_w['Tx_Num'] < 1000000].sort_values('Tx_Num')
-                
-                for _, row in limits.iterrows():
-                    if row['Tx_Num'] >= target_tx: 
-                        base_pack = row
-                        break
-                
-                if base_pack is None: 
-                    base_pack = limits.iloc[-1]
-            
-            # Check user limit
-            pkg_users = pd.to_numeric(base_pack['User_Limit (User)'], errors='coerce')
-            if users > pkg_users:
-                extra_u = users - pkg_users
-                cost = extra_u * addon_dict.get('Warroom_User', 12000)
-                addon_cost += cost
-                details.append(f"{extra_u} Extra Users ({format_money(cost)} THB)")
-            
-            results.append({
-                'Product': 'Warroom',
-                'Package': base_pack,
-                'Breakdown': {
-                    'addon_cost': addon_cost,
-                    'details': details,
-                    'total': base_pack['Total_Price_Per_Year (THB)'] + addon_cost
-                }
-            })
+        options = [
+            _warroom_option(index, pos, extra_ch, extra_u)
+            for pos, extra_ch, extra_u in index.solve_warroom(tx, ch, chatbot, users)
+        ]
+        if options:
+            results.append({'Product': 'Warroom', **options[0], 'Alternatives': options[1:]})
     
     return results
 
@@ -179,6 +215,9 @@ def calculate_budget_sheets(factors, matched_products, pricing_df, addon_df):
 def format_budget_report(product, package_row, factors, breakdown):
     """
     Format budget report as HTML for Streamlit
+
+    Lines are collected in a list and joined once; they carry no leading
+    indentation, so Markdown never reads them as code blocks.
     """
     def get_val(col_name, suffix=""):
         val = package_row.get(col_name)
@@ -193,90 +232,128 @@ def format_budget_report(product, package_row, factors, breakdown):
         except: 
             return "-"
     
-    # HTML Construction
     # ✅ FIX: Reduced font sizes (h2 -> h3, h2 -> h4) for better look
-    html = f"""
-    <div style="border: 1px solid #e0e0e0; border-radius: 8px; padding: 20px; margin: 15px 0; background-color: #ffffff; box-shadow: 0 2px 4px rgba(0,0,0,0.05);">
-        <h3 style="color: #1f77b4; margin-top: 0; font-size: 1.4rem;">📦 {product}</h3>
-        <div style="color: #666; font-weight: 500; margin-bottom: 15px;">Package: {package_row.get('Package', 'Custom')}</div>
-        <hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">
-        
-        <div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">📝 Factor Checklist</div>
-        <ul style="list-style-type: none; padding-left: 0; margin-bottom: 15px; font-size: 0.95rem;">
-    """
+    lines = [
+        "",
+        '<div style="border: 1px solid #e0e0e0; border-radius: 8px; padding: 20px; margin: 15px 0; background-color: #ffffff; box-shadow: 0 2px 4px rgba(0,0,0,0.05);">',
+        f'<h3 style="color: #1f77b4; margin-top: 0; font-size: 1.4rem;">📦 {product}</h3>',
+        f'<div style="color: #666; font-weight: 500; margin-bottom: 15px;">Package: {package_row.get("Package", "Custom")}</div>',
+        '<hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">',
+        "",
+        '<div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">📝 Factor Checklist</div>',
+        '<ul style="list-style-type: none; padding-left: 0; margin-bottom: 15px; font-size: 0.95rem;">',
+        "",
+    ]
     
     # Factors
+    users = factors.get('num_users')
     if product == 'Zocial Eye':
-        users = factors.get('num_users')
         bw = factors.get('data_backward_days')
-        html += f"""
-            <li style="margin-bottom: 4px;">{'✅' if users else '❌'} <b>Number of Users:</b> {users if users else 'Default'}</li>
-            <li style="margin-bottom: 4px;">{'✅' if bw else '❌'} <b>Data Backward:</b> {bw if bw else 'Default'} Days</li>
-        """
+        lines += [
+            f'<li style="margin-bottom: 4px;">{"✅" if users else "❌"} <b>Number of Users:</b> {users if users else "Default"}</li>',
+            f'<li style="margin-bottom: 4px;">{"✅" if bw else "❌"} <b>Data Backward:</b> {bw if bw else "Default"} Days</li>',
+            "",
+        ]
     elif product == 'Warroom':
-        users = factors.get('num_users')
         tx = factors.get('monthly_transactions')
         chatbot = factors.get('chatbot_required')
-        html += f"""
-            <li style="margin-bottom: 4px;">{'✅' if users else '❌'} <b>Number of Users:</b> {users if users else 'Default'}</li>
-            <li style="margin-bottom: 4px;">{'✅' if tx else '❌'} <b>Monthly Transactions:</b> {tx if tx else 'Default'} Msgs</li>
-            <li style="margin-bottom: 4px;">✅ <b>Chatbot Required:</b> {'Yes' if chatbot else 'No'}</li>
-        """
+        lines += [
+            f'<li style="margin-bottom: 4px;">{"✅" if users else "❌"} <b>Number of Users:</b> {users if users else "Default"}</li>',
+            f'<li style="margin-bottom: 4px;">{"✅" if tx else "❌"} <b>Monthly Transactions:</b> {tx if tx else "Default"} Msgs</li>',
+            f'<li style="margin-bottom: 4px;">✅ <b>Chatbot Required:</b> {"Yes" if chatbot else "No"}</li>',
+            "",
+        ]
     
-    html += """
-        </ul>
-        <hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">
-        
-        <div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">📋 Package Details</div>
-        <ul style="padding-left: 20px; font-size: 0.95rem; margin-bottom: 15px;">
-    """
+    lines += [
+        "</ul>",
+        '<hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">',
+        "",
+        '<div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">📋 Package Details</div>',
+        '<ul style="padding-left: 20px; font-size: 0.95rem; margin-bottom: 15px;">',
+    ]
     
     # Package details
     init_fee = package_row.get('Initial_Fee (THB)', 0)
-    html += f"<li><b>Initial Fee:</b> {format_money(init_fee)} THB</li>"
-    
+    details = [f"<li><b>Initial Fee:</b> {format_money(init_fee)} THB</li>"]
     if product == 'Zocial Eye':
-        html += f"""
-            <li><b>Message limit:</b> {format_money(package_row.get('Message_Limit_PerContract (Messages)'))}</li>
-            <li><b>Campaign limit:</b> {get_val('Campaign_Limit')}</li>
-            <li><b>User limit:</b> {get_val('User_Limit (User)')}</li>
-            <li><b>Data backward:</b> {format_days(package_row.get('Data_Backward (Days)'))}</li>
-        """
+        details += [
+            f"<li><b>Message limit:</b> {format_money(package_row.get('Message_Limit_PerContract (Messages)'))}</li>",
+            f"<li><b>Campaign limit:</b> {get_val('Campaign_Limit')}</li>",
+            f"<li><b>User limit:</b> {get_val('User_Limit (User)')}</li>",
+            f"<li><b>Data backward:</b> {format_days(package_row.get('Data_Backward (Days)'))}</li>",
+        ]
     elif product == 'Warroom':
         tx_limit = package_row.get('Transaction_Limit_PerMonth (Messages)') or package_row.get('Message_Limit_PerMonth (Messages)')
-        html += f"""
-            <li><b>Tx Limit:</b> {format_money(tx_limit) if tx_limit else 'Unlimited'}</li>
-            <li><b>User limit:</b> {get_val('User_Limit (User)')}</li>
-            <li><b>Social Channel:</b> {get_val('Owned_Social_Channel (Account)')}</li>
-        """
-    
-    html += f"<li><b>Annual Base Price:</b> {format_money(package_row.get('Total_Price_Per_Year (THB)'))} THB</li>"
-    html += "</ul>"
+        details += [
+            f"<li><b>Tx Limit:</b> {format_money(tx_limit) if tx_limit else 'Unlimited'}</li>",
+            f"<li><b>User limit:</b> {get_val('User_Limit (User)')}</li>",
+            f"<li><b>Social Channel:</b> {get_val('Owned_Social_Channel (Account)')}</li>",
+        ]
+    base_price = f"<li><b>Annual Base Price:</b> {format_money(package_row.get('Total_Price_Per_Year (THB)'))} THB</li></ul>"
+    if len(details) > 1:
+        details.append(base_price)
+    else:
+        details[-1] += base_price
+    lines += details
     
     # Add-ons
     if breakdown['addon_cost'] > 0:
-        html += """
-            <hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">
-            <div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">🔧 Add-ons</div>
-            <ul style="padding-left: 20px; font-size: 0.95rem;">
-        """
-        for detail in breakdown['details']:
-            html += f"<li>{detail}</li>"
-        html += f"<li><b>Add-ons Cost:</b> {format_money(breakdown['addon_cost'])} THB</li>"
-        html += "</ul>"
+        addons = "".join(f"<li>{detail}</li>" for detail in breakdown['details'])
+        lines += [
+            '<hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">',
+            '<div style="color: #ff7f0e; font-weight: 600; margin-bottom: 8px;">🔧 Add-ons</div>',
+            '<ul style="padding-left: 20px; font-size: 0.95rem;">',
+            f"{addons}<li><b>Add-ons Cost:</b> {format_money(breakdown['addon_cost'])} THB</li></ul>",
+        ]
     
     # Total
-    grand_total = breakdown['total']
-    if init_fee and isinstance(init_fee, (int, float)):
-        grand_total += init_fee
-    
-    html += f"""
-        <hr style="border: 0; border-top: 2px solid #f0f0f0; margin: 20px 0;">
-        <h4 style="color: #28a745; text-align: center; margin: 0; font-size: 1.3rem;">💰 TOTAL: {format_money(grand_total)} THB/Year</h4>
-    </div>
+    grand_total = breakdown['total'] + initial_fee(package_row)
+    lines += [
+        '<hr style="border: 0; border-top: 2px solid #f0f0f0; margin: 20px 0;">',
+        f'<h4 style="color: #28a745; text-align: center; margin: 0; font-size: 1.3rem;">💰 TOTAL: {format_money(grand_total)} THB/Year</h4>',
+        "</div>",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def budget_key(*parts):
+    """Hash of everything a memoized budget result depends on"""
+    canonical = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def memoized_budget(key, compute):
+    """compute() once per key, keeping the BUDGET_MEMO_SIZE most recent results"""
+    with _budget_memo_lock:
+        if key in _budget_memo:
+            _budget_memo.move_to_end(key)
+            return _budget_memo[key]
+    value = compute()
+    with _budget_memo_lock:
+        _budget_memo[key] = value
+        while len(_budget_memo) > BUDGET_MEMO_SIZE:
+            _budget_memo.popitem(last=False)
+    return value
+
+
+def pricing_version_of(pricing_df, addon_df):
+    index = get_pricing_index(pricing_df, addon_df)
+    return index.version if index else None
+
+
+def budget_view(factors, matched_products, pricing_df, addon_df):
     """
-    
-    # Clean whitespace
-    clean_html = "\n".join([line.lstrip() for line in html.split('\n')])
-    
-    return clean_html
+    calculate_budget_sheets results with their HTML report under 'Report'
+
+    Memoized on (factors, matched products, pricing version), so reruns with
+    unchanged inputs cost nothing; the returned results are shared and must
+    not be modified.
+    """
+    def compute():
+        return [
+            {**res, 'Report': format_budget_report(res['Product'], res['Package'], factors, res['Breakdown'])}
+            for res in calculate_budget_sheets(factors, matched_products, pricing_df, addon_df)
+        ]
+    key = budget_key('view', factors, list(matched_products or []), pricing_version_of(pricing_df, addon_df))
+    return memoized_budget(key, compute)
@@ -0,0 +1,345 @@
+"""
+Budget Factor Candidate Selection
+Finds the few TOR clauses that state users, retention, volumes and channels
+"""
+
+import re
+import weakref
+import threading
+import numpy as np
+
+MAX_CANDIDATES = 40
+MAX_UNIT_CHARS = 400
+
+THAI_DIGITS = str.maketrans('๐๑๒๓๔๕๖๗๘๙', '0123456789')
+
+NUMBER = r'[\d๐-๙][\d๐-๙,\.]*'
+
+# Unit / cue words per factor; a number next to one is strong evidence
+FACTOR_CUES = {
+    'num_users': r'users?|user\s*accounts?|licen[cs]es?|ผู้ใช้(?:งาน)?|คน|บัญชีผู้ใช้|seats?',
+    'data_backward_days': r'days?|วัน|months?|เดือน|years?|ปี|ย้อนหลัง|backward|historical|retention',
+    'monthly_transactions': r'messages?|ข้อความ|transactions?|mentions?|posts?|records?|รายการ',
+    'social_channels_count': r'channels?|ช่องทาง|pages?|เพจ|official\s*accounts?|บัญชี(?:ทางการ)?',
+    'chatbot_required': r'chat\s*bot|แชท\s*บอท|บอท|auto[\s-]*reply|ตอบกลับอัตโนมัติ|ตอบข้อความอัตโนมัติ',
+    'product_type': r'social\s*listening|zocial\s*eye|warroom|monitoring|ติดตาม(?:ข้อมูล|กระแส)|รับฟังเสียง',
+}
+
+FACTOR_DESCRIPTIONS = {
+    'num_users': "The system must support a number of users / user accounts (จำนวนผู้ใช้งาน)",
+    'data_backward_days': "Historical data retention: data backward a number of days (ข้อมูลย้อนหลัง วัน)",
+    'monthly_transactions': "Number of messages or transactions per month (จำนวนข้อความต่อเดือน)",
+    'social_channels_count': "Number of owned social media channels or pages (จำนวนช่องทาง)",
+    'chatbot_required': "A chatbot that replies to customer messages automatically (แชทบอท)",
+    'product_type': "Social listening / social media monitoring or customer messaging platform",
+}
+
+# Factor-description embeddings per encoder (computed once per loaded model)
+_description_embeddings = weakref.WeakKeyDictionary()
+_description_lock = threading.Lock()
+
+_CUE_PATTERNS = {f: re.compile(cue, re.IGNORECASE) for f, cue in FACTOR_CUES.items()}
+_NUMBER_UNIT_PATTERNS = {
+    f: re.compile(rf'{NUMBER}\s*(?:{cue})|(?:{cue})\D{{0,25}}?{NUMBER}', re.IGNORECASE)
+    for f, cue in FACTOR_CUES.items()
+}
+# A leading clause number is dotted ("4.2.1"), terminated ("3." / "3)") or
+# followed by the clause's own number ("2 10 users"); a bare "10 users" is a quantity
+_CLAUSE_NUMBER = re.compile(
+    r'^\s*([\d๐-๙]+(?:\.[\d๐-๙]+)+(?=[\.\)]?\s)|[\d๐-๙]+(?=[\.\)]\s)|[\d๐-๙]+(?=\s+[\d๐-๙]))[\.\)]?\s'
+)
+_UNIT_SPLIT = re.compile(r'(?<=[\.;])\s+|\s{3,}')
+
+
+def split_units(text):
+    """
+    TOR text as (line_no, char_offset, text) units
+    Long lines (flattened PDF paragraphs) are split further at sentence breaks.
+    """
+    units = []
+    offset = 0
+    for line_no, line in enumerate(text.split('\n'), start=1):
+        stripped = line.strip()
+        if stripped:
+            if len(stripped) <= MAX_UNIT_CHARS:
+                units.append((line_no, offset + line.find(stripped), stripped))
+            else:
+                pos = 0
+                for part in _UNIT_SPLIT.split(line):
+                    start = line.find(part, pos)
+                    pos = start + len(part)
+                    # Run-on text without sentence breaks: fixed windows
+                    for k in range(0, len(part), MAX_UNIT_CHARS):
+                        piece = part[k:k + MAX_UNIT_CHARS]
+                        if piece.strip():
+                            units.append((line_no, offset + start + k, piece.strip()))
+        offset += len(line) + 1
+    return units
+
+
+def score_unit(text):
+    """(score, factors) from numeric/unit patterns and cue words"""
+    score = 0.0
+    factors = []
+    for field, pattern in _NUMBER_UNIT_PATTERNS.items():
+        if pattern.search(text):
+            score += 3.0
+            factors.append(field)
+        elif _CUE_PATTERNS[field].search(text):
+            score += 1.0
+            factors.append(field)
+    return score, factors
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def _descriptions_for(encoder):
+    with _description_lock:
+        ref = _description_embeddings.get(encoder)
+    if ref is None:
+        ref = _normalized(encoder.encode(list(FACTOR_DESCRIPTIONS.values()), show_progress_bar=False))
+        with _description_lock:
+            _description_embeddings[encoder] = ref
+    return ref
+
+
+def _description_similarity(texts, encoder):
+    """Best cosine similarity of each text to any factor description"""
+    emb = _normalized(encoder.encode(texts, show_progress_bar=False))
+    return (emb @ _descriptions_for(encoder).T).max(axis=1)
+
+
+def select_factor_candidates(tor_text, max_candidates=MAX_CANDIDATES, encoder=None, min_similarity=0.45):
+    """
+    Clauses likely to state a budget factor, in document order
+
+    Every line of the document is scored (no length cut-off): numbers next
+    to a factor unit count most, cue words alone count less. With a
+    sentence-transformers `encoder`, units the keyword pass missed are
+    scored by similarity to the factor descriptions so unit-less phrasings
+    are found too (only those units are encoded).
+
+    Returns list of dicts: line, offset, clause, text, factors, score
+    """
+    units = split_units(tor_text or "")
+    if not units:
+        return []
+
+    scored = [score_unit(text) for _, _, text in units]
+    scores = np.array([s for s, _ in scored], dtype=np.float32)
+
+    missed = np.flatnonzero(scores == 0)
+    if encoder is not None and len(missed):
+        similarity = _description_similarity([units[i][2] for i in missed], encoder)
+        scores[missed] = np.where(similarity >= min_similarity, similarity * 3.0, 0.0)
+
+    # Identical clauses (repeated headers, boilerplate) are sent once
+    seen = set()
+    order = []
+    for i in np.argsort(-scores, kind='stable'):
+        if scores[i] <= 0:
+            break
+        key = _CLAUSE_NUMBER.sub('', units[i][2]).lower()
+        if key not in seen:
+            seen.add(key)
+            order.append(i)
+
+    # Every factor gets its share before the remaining slots go by score;
+    # a lone cue word (score 1) only qualifies through its factor's share
+    per_factor = max(1, max_candidates // (2 * len(FACTOR_CUES)))
+    chosen = []
+    for field in FACTOR_CUES:
+        picked = [i for i in order if field in scored[i][1] and i not in chosen][:per_factor]
+        chosen.extend(picked)
+    chosen_set = set(chosen)
+    chosen.extend([i for i in order if i not in chosen_set and scores[i] >= 2][:max(0, max_candidates - len(chosen))])
+
+    candidates = []
+    for i in sorted(chosen[:max_candidates]):
+        line_no, offset, text = units[i]
+        clause = _CLAUSE_NUMBER.match(text)
+        candidates.append({
+            'line': line_no,
+            'offset': offset,
+            'clause': clause.group(1).translate(THAI_DIGITS) if clause else None,
+            'text': text,
+            'factors': scored[i][1],
+            'score': round(float(scores[i]), 2),
+        })
+    return candidates
+
+
+def format_candidates(candidates):
+    """Prompt block: one located clause per line"""
+    lines = []
+    for c in candidates:
+        where = f"line {c['line']}" + (f", clause {c['clause']}" if c['clause'] else "")
+        lines.append(f"[{where}] {c['text']}")
+    return "\n".join(lines)
+
+
+# --- Rule-based extraction ------------------------------------------------
+
+FACTOR_FIELDS = (
+    'product_type', 'num_users', 'data_backward_days',
+    'monthly_transactions', 'social_channels_count', 'chatbot_required'
+)
+
+# Fields below this confidence are left to the model
+LOCAL_CONFIDENCE_THRESHOLD = 0.8
+
+# A TOR that never mentions a chatbot is quoted without one; this default
+# needs no model call, but the model may refine it when it is asked anyway
+CHATBOT_DEFAULT = False
+
+_QTY = r'(\d[\d,]*(?:\.\d+)?)\s*(k|K|พัน|หมื่น|แสน|ล้าน|million)?'
+_MULTIPLIERS = {'k': 1000, 'K': 1000, 'พัน': 1000, 'หมื่น': 10000, 'แสน': 100000, 'ล้าน': 1000000, 'million': 1000000}
+_FILLER = r'(?:ไม่น้อยกว่า|อย่างน้อย|ขั้นต่ำ|ได้|จำนวน|รวม|พร้อมกัน|concurrent(?:ly)?|simultaneous(?:ly)?|at\s+least|minimum(?:\s+of)?|up\s+to|of|to|\s)*'
+
+_PERIOD = r'(?:วัน|days?|เดือน|months?|ปี|years?|ชั่วโมง|hours?)'
+_USER_KEYWORD = r'(?:ผู้ใช้งาน|ผู้ใช้|บัญชีผู้ใช้|users?|user\s*accounts?)'
+_PEOPLE = r'(?:คน|ราย|users?|accounts?|บัญชี)'
+
+_USERS = [
+    # A bare number after the keyword counts unless it is a period ("ผู้ใช้งาน 1 ปี")
+    (re.compile(rf'{_USER_KEYWORD}{_FILLER}{_QTY}(?!\d|[,\.]\d|\s*{_PERIOD})\s*{_PEOPLE}?', re.IGNORECASE), 0.9),
+    # Further along the clause the number must carry a people unit
+    (re.compile(rf'{_USER_KEYWORD}[^\n]{{0,30}}?(?<![\d,\.]){_QTY}\s*{_PEOPLE}', re.IGNORECASE), 0.9),
+    (re.compile(rf'{_QTY}\s*(?:named\s+|concurrent\s+)?(?:users?|user\s*accounts?|licen[cs]es?|seats?)', re.IGNORECASE), 0.9),
+    (re.compile(rf'{_QTY}\s*(?:คน|ราย)', re.IGNORECASE), 0.6),
+]
+_BACKWARD = [
+    (re.compile(rf'(?:ย้อนหลัง|backward|historical(?:\s+data)?|retention|ข้อมูลเก่า){_FILLER}{_QTY}\s*(วัน|days?|เดือน|months?|ปี|years?)', re.IGNORECASE), 0.9),
+    # "12 เดือน ย้อนหลัง 3 เดือน": the cue belongs to the number after it, and an
+    # explicit "ย้อนหลัง N" outranks this form
+    (re.compile(rf'{_QTY}\s*(วัน|days?|เดือน|months?|ปี|years?)\s*(?:of\s+)?(?:ย้อนหลัง|backward|back|historical|history|retention)(?!{_FILLER}\d)', re.IGNORECASE), 0.85),
+]
+_TRANSACTIONS = [
+    (re.compile(rf'{_QTY}\s*(?:messages?|ข้อความ|transactions?|mentions?|รายการ)\s*(?:/|per|ต่อ|a|ใน\s*1|ภายใน\s*1)?\s*(เดือน|month|ปี|year)', re.IGNORECASE), 0.9),
+    (re.compile(rf'(?:เดือนละ|ต่อเดือน|per\s+month|monthly|/\s*month){_FILLER}{_QTY}\s*(?:messages?|ข้อความ|transactions?|mentions?|รายการ)', re.IGNORECASE), 0.9),
+    (re.compile(rf'(?:messages?|ข้อความ|transactions?|mentions?){_FILLER}{_QTY}\s*(?:ข้อความ|messages?|รายการ)?\s*(?:/|per|ต่อ)\s*(เดือน|month|ปี|year)', re.IGNORECASE), 0.85),
+]
+# A page count is a channel count only with a social-media qualifier ("report of 50 pages")
+_SOCIAL_PAGE = r'(?:facebook|fb|social(?:\s+media)?|fan|เฟ[ซส]บุ๊[กค]|แฟน)\s*(?:pages?|เพจ)'
+_CHANNELS = [
+    (re.compile(rf'{_QTY}\s*(?:social\s+(?:media\s+)?)?(?:channels?|ช่องทาง|official\s*accounts?)', re.IGNORECASE), 0.85),
+    (re.compile(rf'{_QTY}\s*{_SOCIAL_PAGE}', re.IGNORECASE), 0.85),
+    (re.compile(rf'(?:ช่องทาง|channels?|{_SOCIAL_PAGE}){_FILLER}{_QTY}\s*(?:ช่องทาง|channels?|เพจ|pages?|บัญชี|accounts?)', re.IGNORECASE), 0.85),
+    # Bare เพจ is usually a Facebook page, but not certainly
+    (re.compile(rf'{_QTY}\s*เพจ', re.IGNORECASE), 0.7),
+]
+_CHATBOT = re.compile(FACTOR_CUES['chatbot_required'], re.IGNORECASE)
+_WARROOM = re.compile(r'warroom|chat\s*bot|แชท\s*บอท|inbox|ตอบ(?:กลับ)?ข้อความ|customer\s+(?:care|service)|omni\s*channel', re.IGNORECASE)
+_ZOCIAL = re.compile(r'zocial\s*eye|social\s*listening|ติดตาม(?:ข้อมูล|กระแส)|รับฟังเสียง|sentiment|trend|monitor(?:ing)?', re.IGNORECASE)
+_NEGATION = re.compile(r'ไม่ต้อง|ไม่จำเป็น|ไม่มี|not\s+required|no\s+need|without', re.IGNORECASE)
+
+# Characters before a cue searched for a negation; Thai has no word spaces
+NEGATION_WINDOW = 24
+
+
+def _quantity(number, multiplier):
+    value = float(number.replace(',', ''))
+    return int(round(value * _MULTIPLIERS.get(multiplier or '', 1)))
+
+
+def _to_days(value, unit):
+    unit = unit.lower()
+    if unit.startswith(('เดือน', 'month')):
+        return value * 30
+    if unit.startswith(('ปี', 'year')):
+        return value * 365
+    return value
+
+
+def _per_month(value, period):
+    return int(round(value / 12)) if period and period.lower().startswith(('ปี', 'year')) else value
+
+
+def _cue_hits(pattern, text):
+    """Negated flag of every cue match: a negation only counts just before the cue"""
+    return [bool(_NEGATION.search(text, max(0, m.start() - NEGATION_WINDOW), m.start())) for m in pattern.finditer(text)]
+
+
+def _best(findings):
+    """
+    Among the strongest pattern matches the highest stated requirement wins
+    (TORs state minimums); disagreement between clauses lowers the confidence
+    """
+    if not findings:
+        return None, 0.0, None
+    confidence = max(f[1] for f in findings)
+    tier = [f for f in findings if f[1] == confidence]
+    value, _, location = max(tier, key=lambda f: f[0])
+    if len({f[0] for f in tier}) > 1:
+        confidence -= 0.1
+    return value, round(confidence, 2), location
+
+
+def extract_factors_locally(tor_text, candidates=None):
+    """
+    Rule-based budget factors with a confidence per field
+
+    Reads Thai and Arabic numerals, thousands separators and k/พัน/หมื่น
+    style multipliers from the candidate clauses. Returns
+    {field: {'value', 'confidence', 'location'}} for all six fields;
+    unresolved fields have value None and confidence 0. A field filled with
+    a documented default (chatbot silence) also carries 'default': True.
+    """
+    if candidates is None:
+        candidates = select_factor_candidates(tor_text)
+
+    found = {field: [] for field in ('num_users', 'data_backward_days', 'monthly_transactions', 'social_channels_count')}
+    chatbot_hits = []
+    warroom_hits = 0
+    zocial_hits = 0
+
+    for c in candidates:
+        text = c['text'].translate(THAI_DIGITS)
+        text = _CLAUSE_NUMBER.sub('', text)
+        where = f"line {c['line']}" + (f", clause {c['clause']}" if c['clause'] else "")
+
+        for pattern, conf in _USERS:
+            for m in pattern.finditer(text):
+                found['num_users'].append((_quantity(m.group(1), m.group(2)), conf, where))
+        for pattern, conf in _BACKWARD:
+            for m in pattern.finditer(text):
+                found['data_backward_days'].append((_to_days(_quantity(m.group(1), m.group(2)), m.group(3)), conf, where))
+        for pattern, conf in _TRANSACTIONS:
+            for m in pattern.finditer(text):
+                period = m.group(3) if m.lastindex and m.lastindex >= 3 else None
+                found['monthly_transactions'].append((_per_month(_quantity(m.group(1), m.group(2)), period), conf, where))
+        for pattern, conf in _CHANNELS:
+            for m in pattern.finditer(text):
+                found['social_channels_count'].append((_quantity(m.group(1), m.group(2)), conf, where))
+
+        negated = _cue_hits(_CHATBOT, text)
+        if negated:
+            chatbot_hits.append((not all(negated), any(negated), where))
+        warroom_hits += not all(_cue_hits(_WARROOM, text) or [True])
+        zocial_hits += not all(_cue_hits(_ZOCIAL, text) or [True])
+
+    factors = {}
+    for field, findings in found.items():
+        value, confidence, location = _best([f for f in findings if f[0] > 0])
+        factors[field] = {'value': value, 'confidence': confidence, 'location': location}
+
+    if chatbot_hits:
+        required = any(flag for flag, _, _ in chatbot_hits)
+        location = next((where for flag, _, where in chatbot_hits if flag == required), None)
+        # Negations are easy to misread; leave the final word to the model
+        confidence = 0.7 if any(negated for _, negated, _ in chatbot_hits) else 0.9
+        factors['chatbot_required'] = {'value': required, 'confidence': confidence, 'location': location}
+    else:
+        factors['chatbot_required'] = {'value': CHATBOT_DEFAULT, 'confidence': 0.6, 'location': None, 'default': True}
+
+    if warroom_hits and not zocial_hits:
+        factors['product_type'] = {'value': 'Warroom', 'confidence': 0.85, 'location': None}
+    elif zocial_hits and not warroom_hits:
+        factors['product_type'] = {'value': 'Zocial Eye', 'confidence': 0.85, 'location': None}
+    else:
+        factors['product_type'] = {'value': None, 'confidence': 0.0, 'location': None}
+
+    return factors
@@ -0,0 +1,243 @@
+"""
+Budget Scenario Engine
+What-if grids, package breakpoints and sensitivity over the pricing rules in one vectorized pass
+"""
+
+import numpy as np
+import pandas as pd
+from utils.pricing_index import (
+    get_pricing_index, DEFAULT_ZOCIAL_USERS, DEFAULT_BACKWARD_DAYS, DEFAULT_WARROOM_USERS
+)
+from utils.budget_engine import budget_key, memoized_budget, pricing_version_of
+
+SCENARIO_FACTORS = ['num_users', 'data_backward_days', 'monthly_transactions', 'social_channels_count', 'chatbot_required']
+
+FACTOR_LABELS = {
+    'num_users': 'Users',
+    'data_backward_days': 'Data Backward (Days)',
+    'monthly_transactions': 'Monthly Transactions',
+    'social_channels_count': 'Social Channels',
+    'chatbot_required': 'Chatbot',
+}
+
+# Values sales usually asks about; package limits are added on top
+DEFAULT_STEPS = {
+    'num_users': [1, 2, 5, 10, 20, 50],
+    'data_backward_days': [30, 90, 180, 365, 730],
+    'monthly_transactions': [10000, 35000, 100000, 500000],
+    'social_channels_count': [0, 1, 2, 3, 5, 10],
+    'chatbot_required': [False, True],
+}
+
+MAX_SWEEP_VALUES = 40
+
+
+def _product_type(factors, matched_products):
+    return factors.get('product_type') or " & ".join(matched_products or [])
+
+
+def _numeric(scenarios, col):
+    if col not in scenarios.columns:
+        return np.full(len(scenarios), np.nan)
+    return pd.to_numeric(scenarios[col], errors='coerce').to_numpy(dtype=float)
+
+
+def scenario_grid(base_factors, **axes):
+    """
+    Cartesian product of the given factor values, other factors fixed at base
+
+        scenario_grid(factors, num_users=[5, 10], data_backward_days=[90, 180])
+    """
+    names = list(axes)
+    if names:
+        grid = pd.MultiIndex.from_product([list(axes[n]) for n in names], names=names).to_frame(index=False)
+    else:
+        grid = pd.DataFrame(index=[0])
+    for name in SCENARIO_FACTORS:
+        if name not in grid.columns:
+            grid[name] = base_factors.get(name)
+    return grid[SCENARIO_FACTORS + [c for c in grid.columns if c not in SCENARIO_FACTORS]]
+
+
+def evaluate_scenarios(scenarios, matched_products, pricing_df, addon_df, product_type=None):
+    """
+    Apply calculate_budget_sheets' package rules to every scenario row at once
+
+    `scenarios` is a DataFrame (or list of factor dicts). Returns a copy with
+    the chosen package and yearly cost per product (initial fee included, as
+    in the budget summary) and total_cost. Missing factors take the same
+    defaults as the single-scenario calculation; Warroom also gets its
+    runner-up option.
+    """
+    scenarios = pd.DataFrame(scenarios).reset_index(drop=True)
+    out = scenarios.copy()
+    index = get_pricing_index(pricing_df, addon_df)
+    prod_type = product_type or _product_type({}, matched_products)
+    out['total_cost'] = 0.0
+    if index is None or scenarios.empty:
+        return out
+
+    users = _numeric(scenarios, 'num_users')
+    stated_users = np.nan_to_num(users) != 0
+
+    if "Zocial Eye" in prod_type and index.zocial is not None:
+        z = index.zocial
+        backward = _numeric(scenarios, 'data_backward_days')
+        backward = np.where(np.nan_to_num(backward) != 0, backward, DEFAULT_BACKWARD_DAYS)
+        pos = index.select_zocial_many(np.where(stated_users, users, DEFAULT_ZOCIAL_USERS), backward)
+        out['zocial_package'] = z['package'][pos]
+        out['zocial_cost'] = z['price'][pos] + z['init_fee'][pos]
+        out['total_cost'] += out['zocial_cost']
+
+    if "Warroom" in prod_type and index.warroom is not None:
+        w = index.warroom
+        chatbot = scenarios['chatbot_required'].fillna(False).astype(bool).to_numpy() if 'chatbot_required' in scenarios.columns else np.zeros(len(scenarios), dtype=bool)
+        wr_users = np.where(stated_users, users, DEFAULT_WARROOM_USERS)
+        positions, extra_ch, extra_u, cost = index.solve_warroom_many(
+            _numeric(scenarios, 'monthly_transactions'), _numeric(scenarios, 'social_channels_count'),
+            chatbot, wr_users, limit=2
+        )
+        found = positions >= 0
+        names = np.where(found, w['package'][np.where(found, positions, 0)], None)
+        out['warroom_package'] = names[:, 0]
+        out['warroom_extra_channels'] = extra_ch[:, 0]
+        out['warroom_extra_users'] = extra_u[:, 0]
+        out['warroom_addon'] = extra_ch[:, 0] * index.channel_price + extra_u[:, 0] * index.user_price
+        out['warroom_cost'] = np.where(found[:, 0], cost[:, 0], np.nan)
+        out['warroom_runner_up'] = names[:, 1]
+        out['warroom_runner_up_cost'] = np.where(found[:, 1], cost[:, 1], np.nan)
+        out['total_cost'] += out['warroom_cost'].fillna(0)
+
+    return out
+
+
+def cost_surface(results, row_factor, col_factor, value='total_cost'):
+    """row_factor x col_factor table of the cheapest cost among matching scenarios"""
+    return results.pivot_table(index=row_factor, columns=col_factor, values=value, aggfunc='min')
+
+
+def _packages(results):
+    cols = [c for c in ('zocial_package', 'warroom_package') if c in results.columns]
+    if not cols:
+        return pd.Series("", index=results.index)
+    return results[cols].fillna('-').astype(str).agg(' + '.join, axis=1)
+
+
+def find_breakpoints(results, factor):
+    """
+    Points along `factor` (other factors fixed) where the chosen package changes
+
+    Returns one row per change: the fixed factors, the factor value before and
+    after, the package(s) on each side and the cost step.
+    """
+    others = [f for f in SCENARIO_FACTORS if f != factor and f in results.columns]
+    ordered = results.assign(_packages=_packages(results))
+    ordered = ordered.sort_values(others + [factor], kind='stable').reset_index(drop=True)
+    fixed = ordered[others].astype(str).agg('|'.join, axis=1) if others else pd.Series("", index=ordered.index)
+    same_group = fixed.eq(fixed.shift())
+    changed = same_group & ordered['_packages'].ne(ordered['_packages'].shift())
+
+    after = ordered[changed]
+    breaks = after[others].copy()
+    breaks['factor'] = factor
+    breaks['from_value'] = ordered[factor].astype(object).shift()[changed].values
+    breaks['to_value'] = after[factor].astype(object).values
+    breaks['from_package'] = ordered['_packages'].shift()[changed].values
+    breaks['to_package'] = after['_packages'].values
+    breaks['cost_change'] = after['total_cost'].values - ordered['total_cost'].shift()[changed].values
+    return breaks.reset_index(drop=True)
+
+
+def breakpoint_values(index, factor):
+    """Package limits (and one past them) for a factor; where package choice can change"""
+    values = []
+    if index is None:
+        return values
+    if factor == 'num_users':
+        for limits in (index.zocial['users'] if index.zocial is not None else [],
+                       index.warroom['users_num'] if index.warroom is not None else []):
+            values.extend(v for limit in limits if np.isfinite(limit) and limit > 0 for v in (limit, limit + 1))
+    elif factor == 'data_backward_days' and index.zocial is not None:
+        values.extend(v for limit in index.zocial['backward'] if limit > 0 for v in (limit, limit + 1))
+    elif factor == 'monthly_transactions' and index.warroom is not None:
+        values.extend(v for limit in index.warroom['limited_tx'] for v in (limit, limit + 1))
+    elif factor == 'social_channels_count' and index.warroom is not None:
+        values.extend(v for limit in index.warroom['unlimited_ch'] if limit < 999 for v in (limit, limit + 1))
+    return values
+
+
+def _sweep_values(index, factor, base_value, steps):
+    if factor == 'chatbot_required':
+        return [False, True]
+    values = set(float(v) for v in steps.get(factor, []))
+    values.update(float(v) for v in breakpoint_values(index, factor))
+    if base_value is not None and not pd.isna(base_value):
+        values.add(float(base_value))
+    values = sorted(v for v in values if v >= 0)
+    if len(values) > MAX_SWEEP_VALUES:
+        keep = np.linspace(0, len(values) - 1, MAX_SWEEP_VALUES).round().astype(int)
+        values = [values[i] for i in sorted(set(keep))]
+    return [int(v) if float(v).is_integer() else v for v in values]
+
+
+def scenario_analysis(base_factors, matched_products, pricing_df, addon_df, steps=None):
+    """
+    One-at-a-time sweeps of every factor around the base, evaluated in one pass
+
+    Returns {'base': evaluated base row (Series), 'sensitivity': factor / value /
+    package / cost / change-vs-base table, 'breakpoints': package changes
+    along each sweep}.
+    """
+    steps = steps or DEFAULT_STEPS
+    index = get_pricing_index(pricing_df, addon_df)
+    prod_type = _product_type(base_factors, matched_products)
+
+    frames = [scenario_grid(base_factors).assign(factor='base')]
+    for factor in SCENARIO_FACTORS:
+        values = _sweep_values(index, factor, base_factors.get(factor), steps)
+        frames.append(scenario_grid(base_factors, **{factor: values}).assign(factor=factor))
+    scenarios = pd.concat(frames, ignore_index=True)
+    results = evaluate_scenarios(scenarios, matched_products, pricing_df, addon_df, product_type=prod_type)
+
+    base = results.iloc[0]
+    sweeps = results.iloc[1:]
+    rows = []
+    for factor, group in sweeps.groupby('factor', sort=False):
+        table = pd.DataFrame({
+            'factor': FACTOR_LABELS[factor],
+            'value': group[factor].values,
+            'package': _packages(group).values,
+            'total_cost': group['total_cost'].values,
+        })
+        table['change_vs_base'] = table['total_cost'] - base['total_cost']
+        rows.append(table)
+    sensitivity = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+    breaks = [find_breakpoints(group, factor) for factor, group in sweeps.groupby('factor', sort=False)]
+    breaks = [b[['factor', 'from_value', 'to_value', 'from_package', 'to_package', 'cost_change']] for b in breaks if not b.empty]
+    breakpoints = pd.concat(breaks, ignore_index=True) if breaks else pd.DataFrame(
+        columns=['factor', 'from_value', 'to_value', 'from_package', 'to_package', 'cost_change'])
+    breakpoints['factor'] = breakpoints['factor'].map(FACTOR_LABELS)
+
+    return {'base': base, 'sensitivity': sensitivity, 'breakpoints': breakpoints}
+
+
+def scenario_view(base_factors, matched_products, pricing_df, addon_df):
+    """scenario_analysis, memoized with the budget results (shared; do not modify)"""
+    key = budget_key('scenarios', base_factors, list(matched_products or []), pricing_version_of(pricing_df, addon_df))
+    return memoized_budget(key, lambda: scenario_analysis(base_factors, matched_products, pricing_df, addon_df))
+
+
+def surface_view(base_factors, matched_products, pricing_df, addon_df, row_factor, col_factor):
+    """Cost surface over DEFAULT_STEPS of two factors, memoized (shared; do not modify)"""
+    def compute():
+        grid = scenario_grid(base_factors, **{row_factor: DEFAULT_STEPS[row_factor], col_factor: DEFAULT_STEPS[col_factor]})
+        results = evaluate_scenarios(
+            grid, matched_products, pricing_df, addon_df,
+            product_type=_product_type(base_factors, matched_products)
+        )
+        return cost_surface(results, row_factor, col_factor)
+    key = budget_key(
+        'surface', base_factors, list(matched_products or []), pricing_version_of(pricing_df, addon_df), row_factor, col_factor
+    )
+    return memoized_budget(key, compute)
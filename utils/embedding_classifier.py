@@ -0,0 +1,70 @@
+"""
+Local FR/NFR Classifier on Sentence Embeddings
+Trained on labelled sentences from the label memo
+"""
+
+import threading
+import numpy as np
+from utils.label_memo import label_memo
+
+MIN_SAMPLES_PER_CLASS = 20
+CONFIDENCE_THRESHOLD = 0.85
+
+_classifier_state = {'version': None, 'model': None}
+_train_lock = threading.Lock()
+
+
+def _train(X, y):
+    from sklearn.linear_model import LogisticRegression
+
+    # Embeddings are compared by direction, as in product matching
+    X = X / np.clip(np.linalg.norm(X, axis=1, keepdims=True), 1e-12, None)
+    model = LogisticRegression(max_iter=1000, class_weight='balanced')
+    model.fit(X, y)
+    return model
+
+
+def get_classifier():
+    """
+    Logistic regression over memo embeddings, retrained only when the memo changes
+    Returns None until both classes have enough labelled examples
+    """
+    version = label_memo.version()
+
+    with _train_lock:
+        if version is not None and version == _classifier_state['version']:
+            return _classifier_state['model']
+
+        X, y = label_memo.labelled_embeddings()
+        model = None
+        counts = {label: y.count(label) for label in set(y)}
+        if len(counts) == 2 and min(counts.values()) >= MIN_SAMPLES_PER_CLASS:
+            model = _train(X, y)
+            print(f"🧮 Local FR/NFR classifier trained on {len(y)} sentences")
+
+        _classifier_state['version'] = version
+        _classifier_state['model'] = model
+        return model
+
+
+def predict_labels(embeddings):
+    """
+    Predict FR/NFR labels from sentence embeddings
+
+    Returns (labels, confidences), or (None, None) when no classifier is
+    available or the embedding dimension does not match the training data.
+    """
+    model = get_classifier()
+    if model is None or embeddings is None or len(embeddings) == 0:
+        return None, None
+
+    X = np.asarray(embeddings, dtype=np.float32)
+    if X.ndim != 2 or X.shape[1] != model.coef_.shape[1]:
+        return None, None
+
+    X = X / np.clip(np.linalg.norm(X, axis=1, keepdims=True), 1e-12, None)
+    proba = model.predict_proba(X)
+    best = proba.argmax(axis=1)
+    labels = [str(model.classes_[i]) for i in best]
+    confidences = proba[np.arange(len(best)), best]
+    return labels, confidences
@@ -7,57 +7,338 @@ import pandas as pd
 import numpy as np
 import re
 import io
-from docx import Document
-import pdfplumber
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import threading
+
+# Uploads up to this size are parsed straight from the upload buffer; larger
+# ones are spooled to a temp file in chunks and opened by path. This picks the
+# buffer source only; parsers may still build their own structures in memory.
+UPLOAD_SPOOL_THRESHOLD_MB = float(os.environ.get("TOR_UPLOAD_SPOOL_THRESHOLD_MB", 32))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Per-upload memory budget: a session never parses an upload larger than this
+UPLOAD_MEMORY_BUDGET_MB = float(os.environ.get("TOR_UPLOAD_MEMORY_BUDGET_MB", 200))
+
 
 def normalize(s):
     """Normalize string for comparison"""
     return re.sub(r'\s+', '', str(s)).lower()
 
 
-def read_file_content(uploaded_file):
+class MemoryViewIO(io.RawIOBase):
+    """
+    Read-only seekable file object over a memoryview (no copy of the buffer)
+    """
+
+    def __init__(self, view):
+        self._view = memoryview(view).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def _open_source(source):
+    """
+    Turn a reader input into something parsers can open without copying
+    Accepts: file path, bytes, memoryview or binary file object
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if isinstance(source, bytes):
+        return io.BytesIO(source)  # BytesIO shares an immutable bytes buffer
+    if isinstance(source, (memoryview, bytearray)):
+        return MemoryViewIO(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def _read_text_source(source):
+    """Decode a text source (path / buffer / file object) as UTF-8"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding='utf-8') as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return str(source, 'utf-8')
+    if isinstance(source, MemoryViewIO):
+        return str(source._view, 'utf-8')
+    source.seek(0)
+    return source.read().decode('utf-8')
+
+
+def _upload_size(uploaded_file):
+    size = getattr(uploaded_file, 'size', None)
+    if size is None:
+        pos = uploaded_file.tell()
+        size = uploaded_file.seek(0, io.SEEK_END)
+        uploaded_file.seek(pos)
+    return size
+
+
+# ==========================================
+# READER REGISTRY
+# ==========================================
+# Heavy parsing backends (pdfplumber, python-docx, openpyxl) are imported
+# inside each reader, so they are only loaded on first use of that format.
+
+_READERS = {}
+_reader_stats = {}
+_reader_stats_lock = threading.Lock()
+
+_MAGIC_PDF = b'%PDF'
+_MAGIC_ZIP = b'PK\x03\x04'
+_MAGIC_OLE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def register_reader(fmt, reader, extensions=(), label=None):
+    """
+    Register a format reader
+
+    Args:
+        fmt: format key returned by sniff_format (e.g. 'pdf', 'csv')
+        reader: callable(source) -> text, or (text, stats) where stats may give
+                'pages' for throughput; source is a path or binary file object
+        extensions: file extensions used when magic bytes are inconclusive
+    """
+    _READERS[fmt] = {
+        'reader': reader,
+        'extensions': tuple(ext.lower() for ext in extensions),
+        'label': label or fmt.upper()
+    }
+
+
+def get_registered_formats():
+    """List registered format keys"""
+    return list(_READERS.keys())
+
+
+def _peek_header(source, n=8):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(n)
+    pos = source.tell()
+    header = source.read(n)
+    source.seek(pos)
+    return header
+
+
+def _zip_format(source):
+    """Tell OOXML containers apart by their part names"""
+    try:
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+        with zipfile.ZipFile(source) as zf:
+            names = zf.namelist()
+    except zipfile.BadZipFile:
+        return None
+    finally:
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+    
+    if any(n.startswith('word/') for n in names):
+        return 'docx'
+    if any(n.startswith('xl/') for n in names):
+        return 'xlsx'
+    return None
+
+
+def _format_from_extension(fname):
+    fname = str(fname or '').lower()
+    for fmt, entry in _READERS.items():
+        if entry['extensions'] and fname.endswith(entry['extensions']):
+            return fmt
+    return None
+
+
+def sniff_format(source, fname=None):
+    """
+    Detect document format from magic bytes
+    File extension is only used to disambiguate (OLE2 / plain text families).
+    Returns None when the format cannot be told (caller reports it unsupported).
+    """
+    header = _peek_header(source)
+    ext_fmt = _format_from_extension(fname)
+    
+    if header.startswith(_MAGIC_PDF):
+        return 'pdf'
+    if header.startswith(_MAGIC_ZIP):
+        return _zip_format(source) or ext_fmt
+    if header.startswith(_MAGIC_OLE):
+        # Legacy Office binaries (.xls / .doc / .ppt) share one container format
+        ext = os.path.splitext(str(fname or ''))[1].lower()
+        return {'.xls': 'xls', '.doc': 'doc'}.get(ext)
+    
+    # No binary signature: text formats by name only
+    return ext_fmt
+
+
+def _record_reader_stats(fmt, nbytes, seconds, pages):
+    with _reader_stats_lock:
+        stats = _reader_stats.setdefault(fmt, {'calls': 0, 'bytes': 0, 'seconds': 0.0, 'pages': 0})
+        stats['calls'] += 1
+        stats['bytes'] += nbytes
+        stats['seconds'] += seconds
+        stats['pages'] += pages or 0
+
+
+def get_reader_stats():
+    """
+    Throughput per reader for benchmarking
+    Returns dict: fmt -> {'calls', 'mb', 'seconds', 'mb_per_sec', 'pages_per_sec'}
+    """
+    report = {}
+    with _reader_stats_lock:
+        snapshot = {fmt: dict(stats) for fmt, stats in _reader_stats.items()}
+    for fmt, stats in snapshot.items():
+        mb = stats['bytes'] / (1024 * 1024)
+        secs = stats['seconds']
+        report[fmt] = {
+            'calls': stats['calls'],
+            'mb': round(mb, 2),
+            'seconds': round(secs, 3),
+            'mb_per_sec': round(mb / secs, 2) if secs > 0 else None,
+            'pages_per_sec': round(stats['pages'] / secs, 2) if secs > 0 and stats['pages'] else None
+        }
+    return report
+
+
+def read_file_content(uploaded_file, spool_threshold_mb=None, memory_budget_mb=None, return_report=False):
     """
     Read content from uploaded file with advanced parsing
-    Supports: PDF, Word, Excel, Text
+    Supports every registered reader (PDF, Word, Excel, CSV, Text by default);
+    the format is sniffed from magic bytes, not the file name.
+
+    The upload is never copied into a new bytes object: uploads up to the
+    spool threshold are parsed from a memoryview of the upload buffer, larger
+    ones are spooled to disk and parsed by path. Uploads over the memory
+    budget are rejected with a ValueError before anything is parsed.
+
+    With return_report=True also returns this read's report: size, budget,
+    buffer source, format, pages and seconds.
     """
     fname = uploaded_file.name
-    content = uploaded_file.read()
+    threshold_mb = UPLOAD_SPOOL_THRESHOLD_MB if spool_threshold_mb is None else spool_threshold_mb
+    budget_mb = UPLOAD_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    size = _upload_size(uploaded_file)
+    size_mb = size / (1024 * 1024)
     text = ""
     
     print(f"📂 Reading file: {fname}...")
     
+    if size_mb > budget_mb:
+        raise ValueError(
+            f"{fname} is {size_mb:.1f} MB, over the {budget_mb:.0f} MB per-upload limit "
+            f"(TOR_UPLOAD_MEMORY_BUDGET_MB); split or compress the document"
+        )
+    
+    report = {
+        'file': fname,
+        'size_mb': round(size_mb, 2),
+        'memory_budget_mb': budget_mb,
+        'spool_threshold_mb': threshold_mb,
+    }
+    
+    tmp_path = None
+    view = None
+    content = None
     try:
-        if fname.endswith('.pdf'):
-            text = read_pdf_advanced(content)
+        if size_mb > threshold_mb:
+            # Spool to disk: at most one chunk is held in memory at a time
+            suffix = os.path.splitext(fname)[1]
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                uploaded_file.seek(0)
+                shutil.copyfileobj(uploaded_file, tmp, SPOOL_CHUNK_SIZE)
+                tmp_path = tmp.name
+            content = tmp_path
+            mode = 'spooled'
+        elif hasattr(uploaded_file, 'getbuffer'):
+            view = uploaded_file.getbuffer()
+            content = MemoryViewIO(view)
+            mode = 'memoryview'
+        else:
+            content = uploaded_file
+            mode = 'stream'
         
-        elif fname.endswith('.docx'):
-            text = read_word_advanced(content)
+        report['mode'] = mode
+        report['buffer'] = 'temp file' if mode == 'spooled' else 'upload buffer'
+        print(f"💾 Upload {size_mb:.1f} MB / spool above {threshold_mb:.0f} MB -> {mode}")
         
-        elif fname.endswith(('.xlsx', '.xls')):
-            text = read_excel_advanced(content)
+        fmt = sniff_format(content, fname)
+        if fmt not in _READERS:
+            raise ValueError(f"Unsupported file type: {fname}")
+        report['format'] = fmt
         
-        elif fname.endswith('.txt'):
-            text = content.decode('utf-8')
-            print(f"✅ Text file loaded")
+        start = time.perf_counter()
+        result = _READERS[fmt]['reader'](content)
+        elapsed = time.perf_counter() - start
+        text, stats = result if isinstance(result, tuple) else (result, {})
         
-        else:
-            raise ValueError(f"Unsupported file type: {fname}")
+        report.update(stats)
+        report['seconds'] = round(elapsed, 3)
+        _record_reader_stats(fmt, size, elapsed, stats.get('pages'))
+        print(f"⏱️ {_READERS[fmt]['label']} reader: {elapsed:.2f}s ({size_mb / elapsed if elapsed > 0 else 0:.1f} MB/s)")
         
     except Exception as e:
         print(f"❌ Error reading file: {e}")
         import traceback
         traceback.print_exc()
     
-    return text
+    finally:
+        if isinstance(content, MemoryViewIO):
+            content.close()
+        if view is not None:
+            view.release()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return (text, report) if return_report else text
 
 
 def read_pdf_advanced(content):
     """
     Advanced PDF reading with table detection
     Port from Colab code (500+ lines simplified)
+    Returns (text, {'pages': page count})
     """
-    with pdfplumber.open(io.BytesIO(content)) as pdf:
+    import pdfplumber
+    
+    with pdfplumber.open(_open_source(content)) as pdf:
         full_doc_text = []
+        pages = len(pdf.pages)
         
         for page_idx, page in enumerate(pdf.pages):
             page_content = []
@@ -164,7 +445,7 @@ def read_pdf_advanced(content):
         text = "\n".join(full_doc_text)
         print(f"✅ PDF loaded: {len(full_doc_text)} lines")
     
-    return text
+    return text, {'pages': pages}
 
 
 def read_word_advanced(content):
@@ -172,7 +453,9 @@ def read_word_advanced(content):
     Advanced Word reading with structure preservation
     Port from Colab code
     """
-    doc = Document(io.BytesIO(content))
+    from docx import Document
+    
+    doc = Document(_open_source(content))
     full_text = []
     
     for element in doc.element.body:
@@ -213,40 +496,79 @@ def read_excel_advanced(content):
     """
     Advanced Excel reading with multi-sheet support
     Port from Colab code
+    Returns (text, {'pages': sheet count})
     """
-    excel_data = pd.read_excel(io.BytesIO(content), sheet_name=None)
     all_text_parts = []
     
-    for sheet_name, df in excel_data.items():
-        print(f"📊 Processing Sheet: {sheet_name}")
-        print(f"   Rows in sheet: {len(df)}")
+    # Parse one sheet at a time so only a single sheet DataFrame is alive
+    with pd.ExcelFile(_open_source(content)) as excel_file:
+        sheet_names = excel_file.sheet_names
         
-        for row_idx, row in df.iterrows():
-            row_parts = []
+        for sheet_name in sheet_names:
+            df = excel_file.parse(sheet_name)
+            print(f"📊 Processing Sheet: {sheet_name}")
+            print(f"   Rows in sheet: {len(df)}")
             
-            for col_idx, val in enumerate(row):
-                if pd.notna(val):
-                    val_str = str(val).strip()
-                    
-                    if val_str and len(val_str) > 0:
-                        val_str = re.sub(r'\s+', ' ', val_str)
-                        row_parts.append(val_str)
-            
-            if row_parts:
-                row_text = " ".join(row_parts)
+            for row_idx, row in enumerate(df.itertuples(index=False, name=None)):
+                row_parts = []
+                
+                for val in row:
+                    if pd.notna(val):
+                        val_str = str(val).strip()
+                        
+                        if val_str and len(val_str) > 0:
+                            val_str = re.sub(r'\s+', ' ', val_str)
+                            row_parts.append(val_str)
                 
-                if len(row_text.strip()) > 5:
-                    all_text_parts.append(row_text)
+                if row_parts:
+                    row_text = " ".join(row_parts)
                     
-                    if row_idx < 3:
-                        print(f"   Row {row_idx}: {row_text[:80]}...")
+                    if len(row_text.strip()) > 5:
+                        all_text_parts.append(row_text)
+                        
+                        if row_idx < 3:
+                            print(f"   Row {row_idx}: {row_text[:80]}...")
+            
+            del df
     
     text = "\n".join(all_text_parts)
-    print(f"✅ Excel file loaded: {len(all_text_parts)} lines from {len(excel_data)} sheet(s)")
+    print(f"✅ Excel file loaded: {len(all_text_parts)} lines from {len(sheet_names)} sheet(s)")
     
+    return text, {'pages': len(sheet_names)}
+
+
+def read_text_file(content):
+    """Plain UTF-8 text file"""
+    text = _read_text_source(content)
+    print(f"✅ Text file loaded")
     return text
 
 
+def read_csv_file(content):
+    """
+    CSV reading (same row flattening as Excel)
+    """
+    df = pd.read_csv(_open_source(content), dtype=str, keep_default_na=False)
+    all_text_parts = []
+    
+    for row in df.itertuples(index=False, name=None):
+        row_parts = [re.sub(r'\s+', ' ', str(val).strip()) for val in row if str(val).strip()]
+        row_text = " ".join(row_parts)
+        if len(row_text) > 5:
+            all_text_parts.append(row_text)
+    
+    print(f"✅ CSV file loaded: {len(all_text_parts)} lines")
+    return "\n".join(all_text_parts)
+
+
+register_reader('pdf', read_pdf_advanced, extensions=('.pdf',), label='PDF')
+register_reader('docx', read_word_advanced, extensions=('.docx',), label='Word')
+register_reader('xlsx', read_excel_advanced, extensions=('.xlsx',), label='Excel')
+register_reader('xls', read_excel_advanced, extensions=('.xls',), label='Excel 97-2003')
+register_reader('csv', read_csv_file, extensions=('.csv',), label='CSV')
+register_reader('txt', read_text_file, extensions=('.txt',), label='Text')
+
+
 def extract_sentences_from_tor(text):
     """Extract sentences from formatted text"""
     return [line.strip() for line in text.split('\n') if len(line.strip()) > 2]
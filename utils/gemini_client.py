@@ -0,0 +1,415 @@
+"""
+Shared Gemini REST Client
+Pooled keep-alive session, one retry policy and per-call accounting
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from utils.quota_scheduler import quota_scheduler
+from utils.llm_cache import llm_cache
+from utils.model_health import model_health
+from utils.json_stream import JsonArrayStream
+
+GEMINI_BASE_URL = os.environ.get(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"
+).rstrip('/')
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_ATTEMPTS = 2
+POOL_MAXSIZE = 16
+
+# Local stand-in / replay server: GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta
+# Cassette of live exchanges for utils.gemini_replay: GEMINI_RECORD_PATH=gemini.jsonl
+RECORD_PATH = os.environ.get("GEMINI_RECORD_PATH")
+
+# Callers that pass on_item get streamed responses unless this is switched off
+STREAMING_ENABLED = os.environ.get("GEMINI_STREAMING", "1") != "0"
+
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+
+_session = None
+_recorder = None
+_session_lock = threading.Lock()
+_recorder_lock = threading.Lock()
+
+# Per-model cool-down deadlines (monotonic time) shared by all workers
+_model_cooldown_until = {}
+_cooldown_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide requests.Session; TLS connections are reused across calls"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _session = session
+        return _session
+
+
+def get_recorder():
+    """Cassette recorder when GEMINI_RECORD_PATH is set, else None"""
+    global _recorder
+    if not RECORD_PATH:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            from utils.gemini_replay import CassetteRecorder
+            _recorder = CassetteRecorder(RECORD_PATH)
+        return _recorder
+
+
+def model_url(model, method="generateContent"):
+    return f"{GEMINI_BASE_URL}/models/{model}:{method}"
+
+
+def build_payload(prompt, generation_config=None):
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    return payload
+
+
+def response_text(data):
+    """Concatenated text of the first candidate ('' if the response has none)"""
+    try:
+        parts = data['candidates'][0]['content']['parts']
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "".join(part.get('text', '') for part in parts)
+
+
+def strip_code_fences(raw_text):
+    return raw_text.replace('```json', '').replace('```', '').strip()
+
+
+def parse_json_list(raw_text):
+    """JSON array from model output, or None"""
+    try:
+        value = json.loads(strip_code_fences(raw_text))
+    except ValueError:
+        return None
+    return value if isinstance(value, list) else None
+
+
+def parse_json_object(raw_text):
+    """JSON object from model output, or None"""
+    try:
+        value = json.loads(strip_code_fences(raw_text))
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+# --- Retry policy ---------------------------------------------------------
+
+def retry_after_seconds(response):
+    """Read the server's retry hint (Retry-After header or RetryInfo detail)"""
+    header = response.headers.get('Retry-After') if response.headers else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        for detail in response.json().get('error', {}).get('details', []):
+            delay = detail.get('retryDelay')
+            if delay:
+                return float(str(delay).rstrip('s'))
+    except Exception:
+        pass
+    return None
+
+
+def backoff_model(model, attempt, retry_after=None):
+    """Put a model in cool-down: server hint if given, else exponential with jitter"""
+    if retry_after is None:
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+    else:
+        delay = retry_after + random.uniform(0, 1)
+    with _cooldown_lock:
+        _model_cooldown_until[model] = max(_model_cooldown_until.get(model, 0), time.monotonic() + delay)
+    return delay
+
+
+def wait_for_model(model):
+    with _cooldown_lock:
+        wait = _model_cooldown_until.get(model, 0) - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+
+
+# --- Accounting -----------------------------------------------------------
+
+def _record(model, status, latency, usage):
+    with _stats_lock:
+        entry = _stats.setdefault(model, {
+            'calls': 0, 'errors': 0, 'rate_limited': 0, 'latency_total': 0.0,
+            'prompt_tokens': 0, 'output_tokens': 0
+        })
+        entry['calls'] += 1
+        entry['latency_total'] += latency
+        if status == 429:
+            entry['rate_limited'] += 1
+        elif status != 200:
+            entry['errors'] += 1
+        entry['prompt_tokens'] += usage.get('promptTokenCount', 0)
+        entry['output_tokens'] += usage.get('candidatesTokenCount', 0)
+
+
+def get_client_stats():
+    """Per-model call counts, mean latency and token usage since start"""
+    with _stats_lock:
+        stats = {}
+        for model, entry in _stats.items():
+            stats[model] = dict(entry)
+            stats[model]['avg_latency'] = round(entry['latency_total'] / entry['calls'], 3) if entry['calls'] else 0.0
+        return stats
+
+
+def reset_client_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+# --- Calls ----------------------------------------------------------------
+
+def _result(model, ok=False, text="", value=None, status=None, latency=0.0, usage=None, cached=False, error=None):
+    return {
+        'ok': ok, 'model': model, 'text': text, 'value': value, 'status': status,
+        'latency': latency, 'usage': usage or {}, 'cached': cached, 'error': error
+    }
+
+
+def cached_result(model, prompt, generation_config=None, parse=None, count=True):
+    """Result built from the response cache, or None on miss (count=False: not in the hit rate)"""
+    raw_text = llm_cache.get(model, prompt, generation_config, count=False)
+    value = None
+    if raw_text is not None:
+        value = parse(raw_text) if parse else raw_text
+    if count:
+        llm_cache.record_lookup(value is not None)
+    if value is None:
+        return None
+    return _result(model, ok=True, text=raw_text, value=value, status=200, cached=True)
+
+
+def _send(session, model, body, headers, timeout, on_text=None):
+    """
+    POST one request; returns (response, raw_text or None, usage)
+    With on_text the streaming endpoint is used and text deltas are handed
+    over as they arrive.
+    """
+    if on_text is None:
+        response = session.post(model_url(model), data=body, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            return response, None, {}
+        try:
+            data = response.json()
+        except ValueError:
+            return response, None, {}
+        return response, response_text(data), data.get('usageMetadata') or {}
+
+    url = model_url(model, "streamGenerateContent") + "?alt=sse"
+    response = session.post(url, data=body, headers=headers, timeout=timeout, stream=True)
+    if response.status_code != 200:
+        return response, None, {}
+
+    parts = []
+    usage = {}
+    response.encoding = 'utf-8'
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                continue
+            usage = event.get('usageMetadata') or usage
+            delta = response_text(event)
+            if delta:
+                parts.append(delta)
+                on_text(delta)
+    finally:
+        response.close()
+    return response, "".join(parts), usage
+
+
+def _item_feeder(on_item):
+    """on_text callback turning streamed text into on_item(position, element) calls"""
+    stream = JsonArrayStream()
+
+    def on_text(delta):
+        for position, item in stream.feed(delta):
+            on_item(position, item)
+    return on_text
+
+
+def _replay_items(result, on_item):
+    if on_item is not None and isinstance(result['value'], list):
+        for position, item in enumerate(result['value']):
+            on_item(position, item)
+    return result
+
+
+def generate(model, prompt, api_key, generation_config=None, timeout=DEFAULT_TIMEOUT,
+             attempts=DEFAULT_ATTEMPTS, parse=None, use_cache=True, label="", on_item=None,
+             stop_on_invalid=False):
+    """
+    One generateContent call with the shared retry policy
+
+    Each attempt waits out the model's cool-down and a slot from the shared
+    quota scheduler. 429 and 5xx responses and network errors back the model
+    off and retry; other 4xx answers fail immediately. Output that `parse`
+    rejects is retried without a cool-down, or with stop_on_invalid=True
+    returned at once (ok=False, raw text kept) for callers that can use it.
+    Transport, 429, 5xx and 404 outcomes feed the model health board; a
+    model whose circuit is open is not called at all.
+    `parse(text)` validates the output (None = invalid); only validated
+    responses are cached. Returns a result dict (see _result).
+
+    With `on_item(position, element)` the response is streamed and each
+    element of the JSON array is reported as soon as it is complete. A
+    retry starts again from position 0, so callers should key partial
+    results by position; the returned value is always the full parse.
+    """
+    if use_cache:
+        hit = cached_result(model, prompt, generation_config, parse)
+        if hit is not None:
+            return _replay_items(hit, on_item)
+
+    session = get_session()
+    recorder = get_recorder()
+    payload = build_payload(prompt, generation_config)
+    body = json.dumps(payload)
+    headers = {'x-goog-api-key': api_key or ''}
+    result = _result(model)
+
+    try:
+        for attempt in range(attempts):
+            if not model_health.allow(model):
+                result['error'] = result['error'] or "circuit open"
+                return result
+            wait_for_model(model)
+            quota_scheduler.acquire()
+            start = time.perf_counter()
+            try:
+                streaming = on_item is not None and STREAMING_ENABLED
+                on_text = _item_feeder(on_item) if streaming else None
+                response, raw_text, usage = _send(session, model, body, headers, timeout, on_text)
+            except requests.RequestException as e:
+                _record(model, None, time.perf_counter() - start, {})
+                result = _result(model, latency=time.perf_counter() - start, error=str(e))
+                model_health.record_failure(model, error=str(e)[:200])
+                backoff_model(model, attempt)
+                continue
+
+            latency = time.perf_counter() - start
+            status = response.status_code
+            _record(model, status, latency, usage)
+            if recorder is not None:
+                recorder.record(model, payload, status, raw_text, usage, latency)
+
+            if status == 200 and raw_text is not None:
+                value = parse(raw_text) if parse else raw_text
+                result = _result(model, text=raw_text, value=value, status=status, latency=latency, usage=usage)
+                if value is not None:
+                    result['ok'] = True
+                    model_health.record_success(model, latency)
+                    if use_cache:
+                        llm_cache.put(model, prompt, raw_text, generation_config)
+                    return result if streaming else _replay_items(result, on_item)
+                # Bad or truncated content says nothing about the model's health
+                result['error'] = "unparseable response"
+                model_health.release(model)
+                if stop_on_invalid:
+                    return result
+            elif status == 429:
+                delay = backoff_model(model, attempt, retry_after_seconds(response))
+                quota_scheduler.penalize(delay)
+                print(f"{label}⏸️ {model} rate limited ({delay:.1f}s)")
+                model_health.release(model)
+                result = _result(model, status=status, latency=latency, error="rate limited")
+            elif status >= 500:
+                backoff_model(model, attempt)
+                result = _result(model, status=status, latency=latency, error=f"HTTP {status}")
+                model_health.record_failure(model, status)
+            elif status == 200:
+                # Answered without text (blocked or empty candidates): retry, health unchanged
+                backoff_model(model, attempt)
+                result = _result(model, status=status, latency=latency, error="empty response")
+                model_health.release(model)
+            else:
+                # 404 means the model is gone; other 4xx are about the request
+                if status == 404:
+                    model_health.record_failure(model, status)
+                else:
+                    model_health.release(model)
+                return _result(model, status=status, latency=latency, error=f"HTTP {status}: {response.text[:200]}")
+
+    except BaseException:
+        # An unexpected error (callback, parser, recorder) must not keep a half-open probe slot
+        model_health.release(model)
+        raise
+
+    return result
+
+
+def generate_with_fallback(models, prompt, api_key, generation_config=None, timeout=DEFAULT_TIMEOUT,
+                           attempts=DEFAULT_ATTEMPTS, parse=None, use_cache=True, label="", on_item=None,
+                           stop_on_invalid=False):
+    """
+    Walk a model chain: cached answers from any model first, then live calls
+    Live calls skip open circuits and go to the fastest healthy model first.
+    Returns the first successful result, else the last failure; with
+    stop_on_invalid=True the first answer that did not parse ends the chain
+    (callers keep its raw text)
+    """
+    if use_cache:
+        # One request is one cache lookup, however many models it tries
+        for model in models:
+            hit = cached_result(model, prompt, generation_config, parse, count=False)
+            if hit is not None:
+                llm_cache.record_lookup(True)
+                return _replay_items(hit, on_item)
+        llm_cache.record_lookup(False)
+
+    ranked = model_health.rank(models)
+    result = _result(models[0] if models else None, error="all model circuits open" if models else "no models")
+    for model in ranked:
+        result = generate(model, prompt, api_key, generation_config, timeout, attempts,
+                          parse=parse, use_cache=False, label=label, on_item=on_item,
+                          stop_on_invalid=stop_on_invalid)
+        if result['ok']:
+            if use_cache:
+                llm_cache.put(model, prompt, result['text'], generation_config)
+            return result
+        if stop_on_invalid and result['text']:
+            return result
+        print(f"⚠️ {label}{model} failed: {result['error']}")
+    return result
+
+
+async def agenerate(model, prompt, api_key, **kwargs):
+    """Async generate(); runs on a worker thread so the pooled session is shared"""
+    return await asyncio.to_thread(generate, model, prompt, api_key, **kwargs)
+
+
+async def agenerate_with_fallback(models, prompt, api_key, **kwargs):
+    return await asyncio.to_thread(generate_with_fallback, models, prompt, api_key, **kwargs)
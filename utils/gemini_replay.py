@@ -0,0 +1,300 @@
+"""
+Gemini Record / Replay Harness
+Cassette recorder and a local stand-in server for offline benchmarking
+
+Record real traffic by setting GEMINI_RECORD_PATH before starting the app.
+Serve it back (or synthetic answers) with:
+
+    python -m utils.gemini_replay serve --port 8765 --cassette gemini.jsonl
+    GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta streamlit run app.py
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+_PATH_PATTERN = re.compile(r'/models/([^/:]+):(generateContent|streamGenerateContent)$')
+_EXPECTED_COUNT = re.compile(r'EXACTLY (\d+) elements')
+_NFR_HINT = re.compile(
+    r'รองรับ|ผู้ใช้งาน|ความปลอดภัย|ประสิทธิภาพ|uptime|concurrent|response time|security|performance|'
+    r'support(?:s)? \d|encrypt|backup|availability|\d+\s*(?:users?|คน|วินาที|seconds?)',
+    re.IGNORECASE
+)
+
+
+def cassette_key(model, payload):
+    """Stable key for a request: model + contents + generation config"""
+    canonical = json.dumps(
+        {'model': model, 'contents': payload.get('contents'), 'config': payload.get('generationConfig')},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CassetteRecorder:
+    """Appends one JSON line per live Gemini exchange"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, model, payload, status, text, usage=None, latency=0.0):
+        entry = {
+            'key': cassette_key(model, payload),
+            'model': model,
+            'request': payload,
+            'status': status,
+            'text': text,
+            'usage': usage or {},
+            'latency': round(latency, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+def load_cassette(path):
+    """{key: [entries]} in recorded order; repeated requests replay in turn"""
+    cassette = {}
+    if not path:
+        return cassette
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                cassette.setdefault(entry['key'], []).append(entry)
+    return cassette
+
+
+# --- Synthetic answers ----------------------------------------------------
+
+def _prompt_text(payload):
+    try:
+        return "".join(p.get('text', '') for p in payload['contents'][0]['parts'])
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def synthetic_text(prompt):
+    """
+    Plausible, deterministic model output for the app's three prompt types
+    (FR/NFR labels, requirement formatting, budget factors)
+    """
+    count = _EXPECTED_COUNT.search(prompt)
+    if count:
+        expected = int(count.group(1))
+        start = prompt.find('NOW ANALYZE THESE SENTENCES:')
+        end = prompt.find('INSTRUCTIONS:', start)
+        try:
+            sentences = json.loads(prompt[start + len('NOW ANALYZE THESE SENTENCES:'):end])
+        except ValueError:
+            sentences = [""] * expected
+        labels = ["Non-Functional" if _NFR_HINT.search(str(s)) else "Functional" for s in sentences]
+        return json.dumps(labels[:expected] + ["Functional"] * (expected - len(labels)))
+
+    if 'Act as Sales Engineer' in prompt:
+        text = prompt.split('Text:', 1)[-1] if 'Text:' in prompt else prompt.split('Clauses selected', 1)[-1]
+        users = re.search(r'(\d[\d,]*)\s*(?:users?|คน)', text, re.IGNORECASE)
+        return json.dumps({
+            'product_type': 'Warroom' if re.search(r'chatbot|แชทบอท|warroom', text, re.IGNORECASE) else 'Zocial Eye',
+            'num_users': int(users.group(1).replace(',', '')) if users else None,
+            'data_backward_days': None,
+            'monthly_transactions': None,
+            'social_channels_count': None,
+            'chatbot_required': bool(re.search(r'chatbot|แชทบอท', text, re.IGNORECASE)),
+        }, ensure_ascii=False)
+
+    if 'Input:' in prompt:
+        body = prompt.rsplit('Input:', 1)[-1]
+        lines = [line.strip() for line in body.split('\n') if line.strip()]
+        return "```json\n" + json.dumps(lines, ensure_ascii=False) + "\n```"
+
+    return "[]"
+
+
+# --- Stand-in server ------------------------------------------------------
+
+class ReplayProfile:
+    """Latency / failure behaviour of the stand-in (seeded, so runs repeat)"""
+
+    def __init__(self, latency_ms=300, jitter_ms=100, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, missing_models=(), stream_chunk_chars=80, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.missing_models = set(missing_models)
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(latency seconds, outcome) for one request"""
+        with self._lock:
+            latency = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return latency, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, 503
+        return latency, 200
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status, obj, headers=None):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        url = urlparse(self.path)
+        match = _PATH_PATTERN.search(url.path)
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not match:
+            self._send_json(404, {'error': {'code': 404, 'message': 'unknown path'}})
+            return
+        model, method = match.groups()
+        streaming = method == 'streamGenerateContent' and parse_qs(url.query).get('alt') == ['sse']
+        server.count(model)
+
+        if model in server.profile.missing_models:
+            self._send_json(404, {'error': {'code': 404, 'message': f'models/{model} is not found'}})
+            return
+
+        entry = server.next_entry(model, payload)
+        latency, outcome = server.profile.draw()
+        if entry is not None:
+            latency = entry.get('latency', latency)
+            outcome = entry.get('status', 200)
+        time.sleep(latency)
+
+        if outcome == 429:
+            self._send_json(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}},
+                            {'Retry-After': str(server.profile.retry_after)})
+            return
+        if outcome != 200:
+            self._send_json(outcome, {'error': {'code': outcome, 'message': 'stand-in failure'}})
+            return
+
+        if entry is not None and entry.get('text') is not None:
+            text = entry['text']
+        else:
+            text = synthetic_text(_prompt_text(payload))
+        usage = (entry or {}).get('usage') or {
+            'promptTokenCount': len(_prompt_text(payload)) // 4,
+            'candidatesTokenCount': len(text) // 4,
+        }
+        if not streaming:
+            self._send_json(200, {
+                'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}],
+                'usageMetadata': usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        size = server.profile.stream_chunk_chars
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            event = {'candidates': [{'content': {'parts': [{'text': piece}], 'role': 'model'}}]}
+            if i == len(pieces) - 1:
+                event['usageMetadata'] = usage
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+        self.close_connection = True
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Stand-in for the Gemini REST API (generateContent / streamGenerateContent)"""
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), cassette=None, profile=None):
+        super().__init__(address, _Handler)
+        self.cassette = cassette or {}
+        self.profile = profile or ReplayProfile()
+        self.requests = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def count(self, model):
+        with self._lock:
+            self.requests[model] = self.requests.get(model, 0) + 1
+
+    def next_entry(self, model, payload):
+        key = cassette_key(model, payload)
+        with self._lock:
+            entries = self.cassette.get(key)
+            if not entries:
+                return None
+            pos = self._cursor.get(key, 0)
+            self._cursor[key] = pos + 1
+            return entries[pos % len(entries)]
+
+    def start(self):
+        """Serve on a daemon thread; returns self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m utils.gemini_replay")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="run the local Gemini stand-in")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--cassette', help="JSONL recorded with GEMINI_RECORD_PATH")
+    serve.add_argument('--latency-ms', type=float, default=300)
+    serve.add_argument('--jitter-ms', type=float, default=100)
+    serve.add_argument('--error-rate', type=float, default=0.0)
+    serve.add_argument('--rate-limit-rate', type=float, default=0.0)
+    serve.add_argument('--retry-after', type=float, default=1.0)
+    serve.add_argument('--missing-model', action='append', default=[])
+    serve.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    profile = ReplayProfile(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        missing_models=args.missing_model, seed=args.seed
+    )
+    server = ReplayServer((args.host, args.port), load_cassette(args.cassette), profile)
+    print(f"🎞️ Gemini stand-in on {server.base_url} ({sum(len(v) for v in server.cassette.values())} recorded responses)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
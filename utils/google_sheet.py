@@ -2,60 +2,151 @@
 Google Sheet Operations
 """
 
+import os
+import time
 import gspread
-from google.oauth2.service_account import Credentials
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from gspread.utils import absolute_range_name, fill_gaps, numericise_all, to_records
 import pandas as pd
 import streamlit as st
 import re
+from collections import Counter
+from utils.sheet_client import sheet_pool
+from utils.master_snapshot import load_snapshot, save_snapshot
 
-def load_master_data(sheet_url):
+# Seconds a confirmed snapshot revision is trusted before Drive is asked again
+REVISION_CHECK_TTL = float(os.environ.get("MASTER_REVISION_TTL", "300"))
+
+_revision_checked = {}
+
+# Accepted tab names per master-data table, in order of preference
+MASTER_TABS = {
+    'pricing': ["Pricing_Rules", "Pricing Rules", "pricing_rules"],
+    'addon': ["AddOns", "Addons", "Add-ons"],
+    'spec': ["Product_Spec", "Product Spec", "Keywords"],
+    'definitions': ["Definitions", "Definition", "definitions"],
+}
+
+
+def _records_frame(values):
+    """
+    DataFrame from a tab's raw values, parsed like Worksheet.get_all_records()
+    (header row as keys, rows padded and numericised); None if unusable
+    """
+    try:
+        rows = fill_gaps(values) if values else [[]]
+    except KeyError:
+        rows = [[]]
+    if rows == [[]]:
+        return pd.DataFrame()
+    keys = rows[0]
+    if any(count > 1 for count in Counter(keys).values()):
+        return None
+    return pd.DataFrame(to_records(keys, [numericise_all(row) for row in rows[1:]]))
+
+
+def fetch_master_tabs(sh):
+    """
+    All master-data tabs in two requests: one metadata call to resolve tab
+    names, one values_batch_get for every matching tab
+    """
+    meta = sh.fetch_sheet_metadata(params={'fields': 'sheets.properties.title'})
+    titles = {sheet['properties']['title'] for sheet in meta.get('sheets', [])}
+    present = {key: [name for name in names if name in titles] for key, names in MASTER_TABS.items()}
+    ranges = [name for names in present.values() for name in names]
+
+    values = {}
+    if ranges:
+        response = sh.values_batch_get([absolute_range_name(name) for name in ranges])
+        for name, value_range in zip(ranges, response.get('valueRanges', [])):
+            values[name] = value_range.get('values', [[]])
+
+    frames = {}
+    for key, names in MASTER_TABS.items():
+        frames[key] = pd.DataFrame()
+        for name in present[key]:
+            df = _records_frame(values.get(name))
+            if df is not None:
+                print(f"   Found tab: '{name}'")
+                frames[key] = df
+                break
+        else:
+            print(f"   ⚠️ Warning: Tab not found (Tried: {names})")
+    return frames
+
+
+def sheet_revision(sh):
+    """Drive revision of the spreadsheet (file version, else modified time)"""
+    res = sh.client.request(
+        "get", f"{DRIVE_FILES_API_V3_URL}/{sh.id}",
+        params={"fields": "version,modifiedTime", "supportsAllDrives": True}
+    ).json()
+    return str(res.get("version") or res.get("modifiedTime"))
+
+
+def _master_tuple(frames):
+    def_df = frames['definitions']
+    def_dict = {}
+    if not def_df.empty:
+        try:
+            def_dict = dict(zip(def_df.iloc[:,0], def_df.iloc[:,1]))
+        except: 
+            pass
+    return frames['pricing'], frames['addon'], frames['spec'], def_dict
+
+
+def _status(source, meta_or_revision, read_only=False, error=None):
+    if isinstance(meta_or_revision, dict):
+        revision, saved_at = meta_or_revision.get('revision'), meta_or_revision.get('saved_at')
+    else:
+        revision, saved_at = meta_or_revision, time.time()
+    return {
+        'source': source, 'revision': revision, 'saved_at': saved_at,
+        'read_only': read_only, 'error': error
+    }
+
+
+def load_master_data(sheet_url, check_revision=False, return_status=False):
     """
     Load master data from Google Sheet
+
+    The local snapshot is used while the spreadsheet revision is unchanged
+    (checked at most every REVISION_CHECK_TTL seconds, or now with
+    check_revision=True); tabs are fetched only when it has moved. If
+    Sheets is unreachable the snapshot is served read-only.
+
+    With return_status=True also returns this load's status: source
+    ('sheet' / 'snapshot'), revision, saved_at, read_only flag and error.
     """
+    def done(frames, status):
+        return _master_tuple(frames) + (status,) if return_status else _master_tuple(frames)
+
+    snapshot = load_snapshot(sheet_url)
+    checked = _revision_checked.get(sheet_url)
+    if (snapshot and not check_revision and checked
+            and checked[1] == snapshot[1]['revision'] and time.monotonic() - checked[0] < REVISION_CHECK_TTL):
+        return done(snapshot[0], _status('snapshot', snapshot[1]))
+    
     try:
-        # Use Streamlit secrets for credentials
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-        )
-        client = gspread.authorize(creds)
+        # Use Streamlit secrets for credentials; client and handle are pooled
+        sh = sheet_pool.spreadsheet(sheet_url, st.secrets["gcp_service_account"])
+        revision = sheet_revision(sh)
+        _revision_checked[sheet_url] = (time.monotonic(), revision)
         
-        # Open sheet
-        sh = client.open_by_url(sheet_url)
+        if snapshot and snapshot[1]['revision'] == revision:
+            print(f"📦 Master data unchanged (revision {revision}) - using snapshot")
+            return done(snapshot[0], _status('snapshot', snapshot[1]))
         
-        print(f"✅ Connected to: {sh.title}")
-        
-        # Load tabs
-        def get_sheet_data(sheet_obj, tab_names):
-            for name in tab_names:
-                try:
-                    ws = sheet_obj.worksheet(name)
-                    print(f"   Found tab: '{name}'")
-                    return pd.DataFrame(ws.get_all_records())
-                except: 
-                    continue
-            print(f"   ⚠️ Warning: Tab not found (Tried: {tab_names})")
-            return pd.DataFrame()
-        
-        pricing_df = get_sheet_data(sh, ["Pricing_Rules", "Pricing Rules", "pricing_rules"])
-        addon_df = get_sheet_data(sh, ["AddOns", "Addons", "Add-ons"])
-        spec_df = get_sheet_data(sh, ["Product_Spec", "Product Spec", "Keywords"])
-        def_df = get_sheet_data(sh, ["Definitions", "Definition", "definitions"])
-        
-        def_dict = {}
-        if not def_df.empty:
-            try:
-                def_dict = dict(zip(def_df.iloc[:,0], def_df.iloc[:,1]))
-            except: 
-                pass
-        
-        return pricing_df, addon_df, spec_df, def_dict
+        # Load tabs (metadata + one batched read)
+        frames = fetch_master_tabs(sh)
+        save_snapshot(sheet_url, frames, revision)
+        return done(frames, _status('sheet', revision))
     
     except Exception as e:
+        sheet_pool.invalidate(sheet_url)
+        if snapshot:
+            print(f"⚠️ Google Sheets unreachable ({e}) - serving snapshot read-only")
+            return done(snapshot[0], _status('snapshot', snapshot[1], read_only=True, error=str(e)))
         st.error(f"❌ Failed to load Google Sheet: {e}")
         raise e
 
@@ -68,18 +159,7 @@ def save_to_product_spec(data_df, sheet_url):
         data_df: DataFrame with columns [Product, Sentence_TH, Sentence_ENG, Implementation]
     """
     try:
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-        )
-        client = gspread.authorize(creds)
-        
-        sh = client.open_by_url(sheet_url)
-        spec_ws = sh.worksheet("Product_Spec")
+        spec_ws = sheet_pool.worksheet(sheet_url, st.secrets["gcp_service_account"], "Product_Spec")
         
         # Prepare rows
         rows_to_append = []
@@ -91,12 +171,15 @@ def save_to_product_spec(data_df, sheet_url):
                 row['Implementation']
             ])
         
-        # Append to sheet
-        spec_ws.append_rows(rows_to_append, value_input_option='RAW')
+        # Append to sheet (one writer per spreadsheet at a time)
+        with sheet_pool.write_lock(sheet_url):
+            spec_ws.append_rows(rows_to_append, value_input_option='RAW')
+        _revision_checked.pop(sheet_url, None)
         
         return {"status": "success", "rows": len(rows_to_append)}
     
     except Exception as e:
+        sheet_pool.invalidate(sheet_url)
         raise Exception(f"Failed to save to Google Sheet: {e}")
 
 
@@ -105,36 +188,28 @@ def undo_last_update(last_save_data, sheet_url):
     Undo last save operation
     """
     try:
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(
-            creds_dict,
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-        )
-        client = gspread.authorize(creds)
-        
-        sh = client.open_by_url(sheet_url)
-        spec_ws = sh.worksheet("Product_Spec")
-        
-        # Find and delete rows
-        all_rows = spec_ws.get_all_values()
-        rows_to_delete = []
-        
-        for i, row in enumerate(all_rows[1:], start=2):  # Skip header
-            if any(
-                (row[1] == item['Sentence_TH'] and row[1] != '') or 
-                (row[2] == item['Sentence_ENG'] and row[2] != '')
-                for item in last_save_data
-            ):
-                rows_to_delete.append(i)
+        spec_ws = sheet_pool.worksheet(sheet_url, st.secrets["gcp_service_account"], "Product_Spec")
         
-        # Delete in reverse order
-        for row_idx in reversed(rows_to_delete):
-            spec_ws.delete_rows(row_idx)
+        # Read and delete under the write lock so a concurrent save cannot shift rows in between
+        with sheet_pool.write_lock(sheet_url):
+            all_rows = spec_ws.get_all_values()
+            rows_to_delete = []
+            
+            for i, row in enumerate(all_rows[1:], start=2):  # Skip header
+                if any(
+                    (row[1] == item['Sentence_TH'] and row[1] != '') or 
+                    (row[2] == item['Sentence_ENG'] and row[2] != '')
+                    for item in last_save_data
+                ):
+                    rows_to_delete.append(i)
+            
+            # Delete in reverse order
+            for row_idx in reversed(rows_to_delete):
+                spec_ws.delete_rows(row_idx)
+        _revision_checked.pop(sheet_url, None)
         
         return {"status": "success", "deleted": len(rows_to_delete)}
     
     except Exception as e:
+        sheet_pool.invalidate(sheet_url)
         raise Exception(f"Failed to undo: {e}")
@@ -0,0 +1,105 @@
+"""
+Incremental JSON Array Parser
+Emits top-level array elements while a model response is still streaming
+"""
+
+import json
+import re
+
+# Characters that change parser state outside / inside a string
+_STRUCTURAL = re.compile(r'["\[\]{},]')
+_IN_STRING = re.compile(r'["\\]')
+
+
+class JsonArrayStream:
+    """
+    Feed text fragments of a JSON array; get back (position, element) for
+    the elements they complete
+
+    Anything before the first '[' (e.g. a ```json fence) is skipped and
+    parsing stops at the matching ']'. Elements that fail to decode are
+    dropped but still take their position, so later elements keep their
+    index in the array; the caller still parses the full text at the end.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self.count = 0
+        self._buf = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        items = []
+        pos = 0
+        n = len(text)
+
+        while pos < n and not self.done:
+            if not self.started:
+                start = text.find('[', pos)
+                if start < 0:
+                    return items
+                self.started = True
+                pos = start + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._buf.append(text[pos])
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _IN_STRING.search(text, pos)
+                if match is None:
+                    self._buf.append(text[pos:])
+                    return items
+                end = match.end()
+                self._buf.append(text[pos:end])
+                if match.group() == '\\':
+                    self._escape = True
+                else:
+                    self._in_string = False
+                pos = end
+                continue
+
+            match = _STRUCTURAL.search(text, pos)
+            if match is None:
+                self._buf.append(text[pos:])
+                return items
+            self._buf.append(text[pos:match.start()])
+            ch = match.group()
+            pos = match.end()
+
+            if ch == '"':
+                self._in_string = True
+                self._buf.append(ch)
+            elif ch in '[{':
+                self._depth += 1
+                self._buf.append(ch)
+            elif ch in ']}':
+                if self._depth == 0 and ch == ']':
+                    self._emit(items)
+                    self.done = True
+                else:
+                    self._depth -= 1
+                    self._buf.append(ch)
+            elif self._depth == 0:
+                self._emit(items)
+            else:
+                self._buf.append(ch)
+
+        return items
+
+    def _emit(self, items):
+        raw = "".join(self._buf).strip()
+        self._buf = []
+        if not raw:
+            return
+        position = self.count
+        self.count += 1
+        try:
+            items.append((position, json.loads(raw)))
+        except ValueError:
+            pass
@@ -0,0 +1,189 @@
+"""
+Sentence-level FR/NFR Label Memo (SQLite)
+Persistent sentence -> label store shared across documents
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+from utils.version_diff import sentence_hash
+
+MEMO_PATH = os.environ.get(
+    "TOR_LABEL_MEMO",
+    os.path.join(os.path.expanduser("~"), ".wisetor", "label_memo.sqlite3")
+)
+
+VALID_LABELS = ("Functional", "Non-Functional")
+
+# Reviewer corrections always win over model output
+SOURCE_PRIORITY = {'ai': 1, 'reviewer': 2}
+_PRIORITY_SQL = "(CASE labels.source " + " ".join(
+    f"WHEN '{src}' THEN {p}" for src, p in SOURCE_PRIORITY.items()
+) + " ELSE 0 END)"
+
+
+class LabelMemo:
+    """
+    Sentence -> Requirement_Type store
+
+    Sentences are keyed by their normalized hash (whitespace, case, numeral
+    script and clause numbering ignored), so a clause recurring across tenders
+    is recognised word for word.
+    """
+
+    def __init__(self, path=MEMO_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS labels (
+                    key TEXT PRIMARY KEY,
+                    sentence TEXT,
+                    label TEXT,
+                    source TEXT,
+                    updated_at REAL,
+                    embedding BLOB
+                )
+            """)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(labels)")]
+            if 'embedding' not in columns:
+                self._conn.execute("ALTER TABLE labels ADD COLUMN embedding BLOB")
+            self._conn.commit()
+        return self._conn
+
+    def lookup(self, sentences):
+        """
+        Known labels for a list of sentences
+        Returns dict {index: label}
+        """
+        keys = [sentence_hash(s) for s in sentences]
+        found = {}
+        try:
+            with self._lock:
+                conn = self._connect()
+                unique_keys = list(set(keys))
+                known = {}
+                # Stay below SQLite's bound-parameter limit
+                for i in range(0, len(unique_keys), 500):
+                    part = unique_keys[i:i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    for key, label in conn.execute(
+                        f"SELECT key, label FROM labels WHERE key IN ({placeholders})", part
+                    ):
+                        known[key] = label
+        except sqlite3.Error as e:
+            print(f"⚠️ Label memo read failed: {e}")
+            return found
+
+        for i, key in enumerate(keys):
+            if key in known:
+                found[i] = known[key]
+
+        self.hits += len(found)
+        self.misses += len(sentences) - len(found)
+        return found
+
+    def remember(self, sentences, labels, source='ai', embeddings=None):
+        """
+        Store labels; never overwrites a label from a higher-priority source
+        Optional sentence embeddings are kept as training data for the local classifier
+        """
+        priority = SOURCE_PRIORITY.get(source, 0)
+        now = time.time()
+        if embeddings is None:
+            embeddings = [None] * len(sentences)
+        rows = [
+            (sentence_hash(sent), str(sent), label, source, now,
+             np.asarray(emb, dtype=np.float32).tobytes() if emb is not None else None)
+            for sent, label, emb in zip(sentences, labels, embeddings)
+            if label in VALID_LABELS
+        ]
+        if not rows:
+            return 0
+
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(f"""
+                    INSERT INTO labels (key, sentence, label, source, updated_at, embedding) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        sentence = excluded.sentence, label = excluded.label,
+                        source = excluded.source, updated_at = excluded.updated_at,
+                        embedding = COALESCE(excluded.embedding, labels.embedding)
+                    WHERE {_PRIORITY_SQL} <= {priority}
+                """, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Label memo write failed: {e}")
+            return 0
+
+        return len(rows)
+
+    def version(self):
+        """Changes whenever labels are added or updated"""
+        try:
+            with self._lock:
+                count, latest = self._connect().execute(
+                    "SELECT COUNT(*), MAX(updated_at) FROM labels"
+                ).fetchone()
+            return (count, latest)
+        except sqlite3.Error:
+            return None
+
+    def labelled_embeddings(self):
+        """
+        Training data for the local classifier
+        Returns (X float32 array, labels list) for rows that carry an embedding
+        """
+        vectors = []
+        labels = []
+        try:
+            with self._lock:
+                for label, blob in self._connect().execute(
+                    "SELECT label, embedding FROM labels WHERE embedding IS NOT NULL"
+                ):
+                    vectors.append(np.frombuffer(blob, dtype=np.float32))
+                    labels.append(label)
+        except sqlite3.Error as e:
+            print(f"⚠️ Label memo read failed: {e}")
+
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32), []
+        # Skip vectors from a different embedding model (dimension mismatch)
+        dim = len(vectors[-1])
+        keep = [i for i, v in enumerate(vectors) if len(v) == dim]
+        return np.vstack([vectors[i] for i in keep]), [labels[i] for i in keep]
+
+    def stats(self):
+        """Lookup metrics and stored label counts per source"""
+        by_source = {}
+        try:
+            with self._lock:
+                for src, cnt in self._connect().execute("SELECT source, COUNT(*) FROM labels GROUP BY source"):
+                    by_source[src] = cnt
+        except sqlite3.Error:
+            pass
+        return {'hits': self.hits, 'misses': self.misses, 'stored': by_source}
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM labels")
+            conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+
+# Process-wide memo
+label_memo = LabelMemo()
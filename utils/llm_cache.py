@@ -0,0 +1,154 @@
+"""
+Persistent LLM Response Cache (SQLite)
+Keyed by (model, generation config, prompt) fingerprint
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.environ.get(
+    "TOR_LLM_CACHE",
+    os.path.join(os.path.expanduser("~"), ".wisetor", "llm_cache.sqlite3")
+)
+DEFAULT_TTL_SECONDS = int(os.environ.get("TOR_LLM_CACHE_TTL", 30 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("TOR_LLM_CACHE_MAX_ENTRIES", 20000))
+
+# Eviction runs once every N writes
+_EVICT_EVERY = 100
+
+
+def prompt_fingerprint(model, prompt, generation_config=None):
+    """SHA-256 over model, canonical generation config and prompt text"""
+    config = json.dumps(generation_config or {}, sort_keys=True)
+    raw = f"{model}\x1f{config}\x1f{prompt}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Response cache with TTL and size-based (least recently used) eviction
+
+    Only store responses the caller has already parsed and validated.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT,
+                    created_at REAL,
+                    accessed_at REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, model, prompt, generation_config=None, count=True):
+        """
+        Cached response text, or None on miss / expiry
+        With count=False the lookup is left out of the hit/miss metrics
+        (callers that try several keys record one outcome with record_lookup).
+        """
+        key = prompt_fingerprint(model, prompt, generation_config)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                    if count:
+                        self.hits += 1
+                    return row[0]
+                if count:
+                    self.misses += 1
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache read failed: {e}")
+        return None
+
+    def record_lookup(self, hit):
+        """Count one logical lookup made of uncounted get() calls"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, model, prompt, response, generation_config=None):
+        """Store a validated response"""
+        key = prompt_fingerprint(model, prompt, generation_config)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now)
+                )
+                conn.commit()
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+
+    def stats(self):
+        """Hit/miss metrics and current size"""
+        entries = 0
+        try:
+            with self._lock:
+                entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'entries': entries
+        }
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+
+# Process-wide cache shared by all Gemini callers
+llm_cache = LLMCache()
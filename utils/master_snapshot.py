@@ -0,0 +1,160 @@
+"""
+Master Data Snapshot Store
+Parquet copies of the master-data tabs, tagged with the spreadsheet revision
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import pandas as pd
+
+SNAPSHOT_DIR = os.environ.get(
+    "TOR_MASTER_SNAPSHOT",
+    os.path.join(os.path.expanduser("~"), ".wisetor", "master_snapshot")
+)
+
+TABLES = ('pricing', 'addon', 'spec', 'definitions')
+
+# Superseded generations younger than this are kept for readers still on them
+STALE_SECONDS = 60
+
+_warned = False
+
+
+def snapshots_available():
+    """Parquet support is optional (pyarrow); without it every load goes to Sheets"""
+    global _warned
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        if not _warned:
+            print("⚠️ pyarrow not installed - master-data snapshots disabled")
+            _warned = True
+        return False
+
+
+def _snapshot_path(sheet_url):
+    return os.path.join(SNAPSHOT_DIR, hashlib.sha1(sheet_url.encode('utf-8')).hexdigest()[:16])
+
+
+def _is_mixed(series):
+    """Object column whose cells are not all str (Sheets mixes numbers and text)"""
+    if series.dtype != object:
+        return False
+    kinds = {type(v) for v in series if v is not None}
+    return len(kinds) > 1 or (kinds and kinds != {str})
+
+
+def _encode(df):
+    """Parquet-safe copy: mixed cells are stored as JSON so ints, floats and text survive"""
+    out = df.copy()
+    out.columns = [str(c) for c in out.columns]
+    encoded = []
+    for col in out.columns:
+        if _is_mixed(out[col]):
+            out[col] = [json.dumps(v, ensure_ascii=False, default=str) for v in out[col]]
+            encoded.append(col)
+    return out, encoded
+
+
+def _decode(df, encoded):
+    for col in encoded:
+        if col in df.columns:
+            df[col] = pd.Series([json.loads(v) for v in df[col]], index=df.index, dtype=object)
+    return df
+
+
+def _generation(path):
+    """Directory of the current generation, named by the CURRENT pointer file"""
+    try:
+        with open(os.path.join(path, "CURRENT"), encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return os.path.join(path, name) if name else None
+
+
+def _prune(path, keep):
+    """Drop old generations (and the pre-generation layout); recent ones may still be read or written"""
+    cutoff = time.time() - STALE_SECONDS
+    for entry in os.listdir(path):
+        full = os.path.join(path, entry)
+        if entry == "CURRENT" or full in keep:
+            continue
+        try:
+            if os.path.getmtime(full) > cutoff:
+                continue
+            if os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+            else:
+                os.remove(full)
+        except OSError:
+            pass
+
+
+def save_snapshot(sheet_url, frames, revision):
+    """
+    Write all tables and the revision tag as a new generation directory,
+    then switch the CURRENT pointer to it with one atomic rename; readers
+    see either the old generation or the new one, never a mix
+    """
+    if not snapshots_available():
+        return False
+    path = _snapshot_path(sheet_url)
+    os.makedirs(path, exist_ok=True)
+    generation = tempfile.mkdtemp(prefix="gen-", dir=path)
+    try:
+        meta = {'url': sheet_url, 'revision': revision, 'saved_at': time.time(), 'tables': {}}
+        for name in TABLES:
+            df, encoded = _encode(frames.get(name, pd.DataFrame()))
+            df.to_parquet(os.path.join(generation, f"{name}.parquet"), index=False)
+            meta['tables'][name] = {'rows': len(df), 'json_columns': encoded}
+        with open(os.path.join(generation, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        previous = _generation(path)
+        fd, pointer = tempfile.mkstemp(prefix=".current-", dir=path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(os.path.basename(generation))
+        os.replace(pointer, os.path.join(path, "CURRENT"))
+        _prune(path, keep={generation, previous})
+        return True
+    except Exception as e:
+        shutil.rmtree(generation, ignore_errors=True)
+        print(f"⚠️ Snapshot save failed: {e}")
+        return False
+
+
+def _read_meta(generation):
+    try:
+        with open(os.path.join(generation, "meta.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_meta(sheet_url):
+    """Revision tag and save time of the stored snapshot, or None"""
+    generation = _generation(_snapshot_path(sheet_url))
+    return _read_meta(generation) if generation else None
+
+
+def load_snapshot(sheet_url):
+    """(frames, meta) from the stored snapshot, or None if there is none / it is unreadable"""
+    generation = _generation(_snapshot_path(sheet_url))
+    meta = _read_meta(generation) if generation else None
+    if meta is None or not snapshots_available():
+        return None
+    try:
+        frames = {}
+        for name in TABLES:
+            df = pd.read_parquet(os.path.join(generation, f"{name}.parquet"))
+            frames[name] = _decode(df, meta['tables'][name]['json_columns'])
+        return frames, meta
+    except Exception as e:
+        print(f"⚠️ Snapshot unreadable, ignoring it: {e}")
+        return None
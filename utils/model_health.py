@@ -0,0 +1,160 @@
+"""
+Gemini Model Health Tracking
+Per-model success rate / latency and a circuit breaker for the fallback chains
+"""
+
+import time
+import threading
+
+EWMA_ALPHA = 0.2
+
+# Circuit opens after this many consecutive failures (or one "model not found")
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 600.0
+NOT_FOUND_OPEN_SECONDS = 3600.0
+
+# Caller order still counts: each later position costs this much extra latency
+POSITION_PENALTY = 0.25
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ModelHealth:
+    """
+    Process-wide health board for Gemini models
+
+    Closed circuits take traffic. After FAILURE_THRESHOLD consecutive
+    failures (404 immediately) a circuit opens for OPEN_SECONDS, doubling
+    on every re-trip. Once that passes a single probe call is let through
+    (half-open): success closes the circuit, failure re-opens it.
+    429 is neither success nor failure; cool-down handles rate limits.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, model):
+        entry = self._models.get(model)
+        if entry is None:
+            entry = {
+                'state': CLOSED, 'success_rate': 1.0, 'latency': None,
+                'consecutive_failures': 0, 'trips': 0, 'open_until': 0.0,
+                'probing': False, 'calls': 0, 'failures': 0, 'last_error': None
+            }
+            self._models[model] = entry
+        return entry
+
+    def record_success(self, model, latency):
+        with self._lock:
+            entry = self._entry(model)
+            entry['calls'] += 1
+            entry['success_rate'] += EWMA_ALPHA * (1.0 - entry['success_rate'])
+            if entry['latency'] is None:
+                entry['latency'] = latency
+            else:
+                entry['latency'] += EWMA_ALPHA * (latency - entry['latency'])
+            entry['consecutive_failures'] = 0
+            entry['trips'] = 0
+            entry['probing'] = False
+            entry['state'] = CLOSED
+
+    def record_failure(self, model, status=None, error=None):
+        with self._lock:
+            entry = self._entry(model)
+            entry['calls'] += 1
+            entry['failures'] += 1
+            entry['last_error'] = error or (f"HTTP {status}" if status else None)
+            entry['success_rate'] += EWMA_ALPHA * (0.0 - entry['success_rate'])
+            entry['consecutive_failures'] += 1
+            entry['probing'] = False
+
+            if status == 404:
+                open_for = NOT_FOUND_OPEN_SECONDS
+            elif entry['state'] == HALF_OPEN or entry['consecutive_failures'] >= FAILURE_THRESHOLD:
+                open_for = min(MAX_OPEN_SECONDS, OPEN_SECONDS * (2 ** entry['trips']))
+            else:
+                return
+            entry['trips'] += 1
+            entry['state'] = OPEN
+            entry['open_until'] = time.monotonic() + open_for
+            print(f"🔌 {model} circuit open for {open_for:.0f}s ({entry['last_error']})")
+
+    def release(self, model):
+        """Outcome says nothing about health (429, bad request); free the probe slot"""
+        with self._lock:
+            self._entry(model)['probing'] = False
+
+    def _refresh(self, entry, now):
+        if entry['state'] == OPEN and now >= entry['open_until']:
+            entry['state'] = HALF_OPEN
+
+    def allow(self, model):
+        """
+        May a call go to this model now?
+        In half-open state only the first caller gets the probe slot.
+        """
+        with self._lock:
+            entry = self._entry(model)
+            self._refresh(entry, time.monotonic())
+            if entry['state'] == CLOSED:
+                return True
+            if entry['state'] == HALF_OPEN and not entry['probing']:
+                entry['probing'] = True
+                return True
+            return False
+
+    def rank(self, models):
+        """
+        Models with a non-open circuit, fastest reliable first
+        Models without a latency sample are scored at the average measured
+        latency (neutral), so the caller's order decides between them and an
+        unmeasured primary is not pushed behind a measured fallback for good.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = []
+            for position, model in enumerate(models):
+                entry = self._entry(model)
+                self._refresh(entry, now)
+                if entry['state'] != OPEN:
+                    entries.append((position, model, entry))
+            measured = [e['latency'] for _, _, e in entries if e['latency'] is not None]
+            neutral = sum(measured) / len(measured) if measured else 1.0
+            scored = []
+            for position, model, entry in entries:
+                if entry['latency'] is None:
+                    score = neutral * (1 + POSITION_PENALTY * position)
+                else:
+                    score = entry['latency'] * (1 + POSITION_PENALTY * position) / max(entry['success_rate'], 0.05)
+                scored.append((score, position, model))
+        return [model for _, _, model in sorted(scored)]
+
+    def snapshot(self):
+        """Copy of the per-model board for display"""
+        now = time.monotonic()
+        with self._lock:
+            board = {}
+            for model, entry in self._models.items():
+                self._refresh(entry, now)
+                board[model] = {
+                    'state': entry['state'],
+                    'success_rate': round(entry['success_rate'], 3),
+                    'latency': round(entry['latency'], 3) if entry['latency'] is not None else None,
+                    'calls': entry['calls'],
+                    'failures': entry['failures'],
+                    'reopens_in': round(max(0.0, entry['open_until'] - now), 1) if entry['state'] == OPEN else 0.0,
+                    'last_error': entry['last_error']
+                }
+            return board
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+
+
+# Process-wide board shared by all Gemini callers
+model_health = ModelHealth()
@@ -0,0 +1,283 @@
+"""
+Pricing Index
+Master-data pricing compiled once per version into sorted NumPy arrays
+"""
+
+import hashlib
+import weakref
+import threading
+import numpy as np
+import pandas as pd
+
+PRICE_COL = 'Total_Price_Per_Year (THB)'
+USERS_COL = 'User_Limit (User)'
+BACKWARD_COL = 'Data_Backward (Days)'
+CHANNEL_COL = 'Owned_Social_Channel (Account)'
+INIT_FEE_COL = 'Initial_Fee (THB)'
+
+# Warroom packages above this monthly transaction limit count as unlimited
+UNLIMITED_TX = 1000000
+
+DEFAULT_CHANNEL_PRICE = 60000
+DEFAULT_USER_PRICE = 12000
+
+# Values assumed when the TOR does not state a factor
+DEFAULT_ZOCIAL_USERS = 2
+DEFAULT_BACKWARD_DAYS = 90
+DEFAULT_WARROOM_USERS = 5
+DEFAULT_TRANSACTIONS = 35000
+DEFAULT_BOT_CHANNELS = 2
+
+_MAX_INDEXES = 4
+_indexes = {}
+_index_lock = threading.Lock()
+
+# Master data frames are replaced on reload, never edited in place, so the
+# content hash is remembered per frame object (id + weakref guards reuse)
+_version_by_frames = {}
+
+
+def _frame_digest(df):
+    if df is None:
+        return b'none'
+    try:
+        values = pd.util.hash_pandas_object(df, index=True).values.tobytes()
+    except TypeError:
+        values = df.to_json(force_ascii=False).encode('utf-8')
+    return values + "\x1f".join(map(str, df.columns)).encode('utf-8')
+
+
+def pricing_version(pricing_df, addon_df):
+    """Content hash of the pricing and add-on tables"""
+    digest = hashlib.sha1()
+    digest.update(_frame_digest(pricing_df))
+    digest.update(b'\x1e')
+    digest.update(_frame_digest(addon_df))
+    return digest.hexdigest()
+
+
+def _addon_prices(addon_df):
+    """Warroom add-on unit prices, keyed as the budget engine always has"""
+    prices = {}
+    if addon_df is not None and not addon_df.empty:
+        products = addon_df['Product'] if 'Product' in addon_df.columns else pd.Series('', index=addon_df.index)
+        names = addon_df['AddOn_Name'] if 'AddOn_Name' in addon_df.columns else pd.Series('', index=addon_df.index)
+        values = addon_df['Price (THB)'] if 'Price (THB)' in addon_df.columns else pd.Series(0, index=addon_df.index)
+        for product, name, price in zip(products.fillna(''), names.fillna(''), values):
+            key = f"{str(product).strip()}_{str(name).strip()}"
+            if 'User_Limit' in key:
+                key = 'Warroom_User'
+            elif 'Owned_Social_Channel' in key:
+                key = 'Warroom_Channel'
+            prices[key] = price
+    return prices
+
+
+def quoted_initial_fee(value):
+    """Initial fee as quoted totals count it: only plain int / float cells"""
+    return value if value and isinstance(value, (int, float)) else 0
+
+
+def _init_fees(records):
+    """Per-row initial fee under the quoted-total rule, so ranking matches the summary"""
+    fees = np.array([quoted_initial_fee(r.get(INIT_FEE_COL, 0)) for r in records], dtype=float)
+    return np.nan_to_num(fees)
+
+
+class PricingIndex:
+    """
+    Per-product package arrays for constant-time-ish package selection
+
+    Zocial Eye packages are kept in price order so the cheapest package
+    meeting the users / backward-days limits is the first hit of one
+    vectorized mask. Warroom packages are priced exhaustively (package x
+    add-on quantities) as one array operation per batch of scenarios.
+    Rows are returned from prepared copies that carry the same coerced
+    columns calculate_budget_sheets always produced.
+    """
+
+    def __init__(self, pricing_df, addon_df, version=None):
+        self.version = version or pricing_version(pricing_df, addon_df)
+        self.addons = _addon_prices(addon_df)
+        self.channel_price = self.addons.get('Warroom_Channel', DEFAULT_CHANNEL_PRICE)
+        self.user_price = self.addons.get('Warroom_User', DEFAULT_USER_PRICE)
+        self._build_zocial(pricing_df)
+        self._build_warroom(pricing_df)
+
+    def _build_zocial(self, pricing_df):
+        df_z = pricing_df[pricing_df['Product'] == 'Zocial Eye'].copy()
+        if df_z.empty:
+            self.zocial = None
+            return
+        df_z[BACKWARD_COL] = pd.to_numeric(df_z[BACKWARD_COL], errors='coerce').fillna(0)
+        df_z[USERS_COL] = pd.to_numeric(df_z[USERS_COL], errors='coerce').fillna(0)
+        order = np.argsort(df_z[PRICE_COL].to_numpy(), kind='stable')
+        records = [df_z.iloc[i] for i in range(len(df_z))]
+        self.zocial = {
+            'rows': df_z,
+            'records': records,
+            'order': order,
+            'backward': df_z[BACKWARD_COL].to_numpy(dtype=float)[order],
+            'users': df_z[USERS_COL].to_numpy(dtype=float)[order],
+            'package': df_z['Package'].astype(str).to_numpy() if 'Package' in df_z.columns else np.full(len(df_z), 'N/A'),
+            'price': pd.to_numeric(df_z[PRICE_COL], errors='coerce').to_numpy(dtype=float),
+            'init_fee': _init_fees(records),
+        }
+
+    def _build_warroom(self, pricing_df):
+        df_w = pricing_df[pricing_df['Product'] == 'Warroom'].copy()
+        if df_w.empty:
+            self.warroom = None
+            return
+        tx_col = 'Transaction_Limit_PerMonth (Messages)' if 'Transaction_Limit_PerMonth (Messages)' in df_w.columns else 'Message_Limit_PerMonth (Messages)'
+        df_w['Tx_Num'] = pd.to_numeric(df_w[tx_col], errors='coerce').fillna(999999999)
+        df_w['Ch_Num'] = pd.to_numeric(df_w[CHANNEL_COL], errors='coerce').fillna(999)
+        tx = df_w['Tx_Num'].to_numpy(dtype=float)
+        ch = df_w['Ch_Num'].to_numpy(dtype=float)
+
+        unlimited = np.flatnonzero(tx > UNLIMITED_TX)
+        unlimited = unlimited[np.argsort(ch[unlimited], kind='stable')]
+        limited = np.flatnonzero(tx < UNLIMITED_TX)
+        limited = limited[np.argsort(tx[limited], kind='stable')]
+
+        records = [df_w.iloc[i] for i in range(len(df_w))]
+        self.warroom = {
+            'rows': df_w,
+            'records': records,
+            'unlimited': unlimited,
+            'unlimited_ch': ch[unlimited],
+            'limited': limited,
+            'limited_tx': tx[limited],
+            'ch': ch,
+            'tx': tx,
+            'price': pd.to_numeric(df_w[PRICE_COL], errors='coerce').to_numpy(dtype=float),
+            'init_fee': _init_fees(records),
+            'package': df_w['Package'].astype(str).to_numpy() if 'Package' in df_w.columns else np.full(len(df_w), 'N/A'),
+            'users_num': pd.to_numeric(df_w[USERS_COL], errors='coerce').to_numpy(dtype=float),
+            'unlimited_mask': tx > UNLIMITED_TX,
+            'limited_mask': tx < UNLIMITED_TX,
+            'largest_mask': (tx < UNLIMITED_TX) & (tx == tx[limited[-1]]) if len(limited) else np.zeros(len(tx), dtype=bool),
+        }
+
+    def select_zocial(self, users, backward_days):
+        """Cheapest package with enough users and backward days (else the last listed); row position or None"""
+        z = self.zocial
+        if z is None:
+            return None
+        fits = (z['backward'] >= backward_days) & (z['users'] >= users)
+        if fits.any():
+            return int(z['order'][fits.argmax()])
+        return len(z['rows']) - 1
+
+    def select_zocial_many(self, users, backward_days):
+        """select_zocial over arrays of scenarios; positions (-1 when there is no package)"""
+        z = self.zocial
+        users = np.asarray(users, dtype=float)
+        if z is None:
+            return np.full(users.shape, -1)
+        fits = (z['backward'][None, :] >= np.asarray(backward_days, dtype=float)[:, None]) & (z['users'][None, :] >= users[:, None])
+        first = fits.argmax(axis=1)
+        return np.where(fits.any(axis=1), z['order'][first], len(z['rows']) - 1)
+
+    def solve_warroom_many(self, tx, ch, chatbot, users, limit=3):
+        """
+        Cheapest Warroom package + add-on combinations for arrays of scenarios
+
+        Every package is priced with the add-ons it would need (extra channels
+        up to the requested count, extra users up to the requested users) and
+        its initial fee; the `limit` cheapest feasible options are returned,
+        best first. Chatbot or channel needs require an unlimited-transaction
+        package; otherwise a limited package with enough monthly transactions
+        (the largest ones when none is enough).
+
+        Returns (positions, extra_channels, extra_users, first_year_cost),
+        each shaped (scenarios, limit); position -1 / cost inf when there are
+        fewer feasible options.
+        """
+        tx = np.atleast_1d(np.asarray(tx, dtype=float))
+        ch = np.atleast_1d(np.asarray(ch, dtype=float))
+        chatbot = np.atleast_1d(np.asarray(chatbot, dtype=bool))
+        users = np.atleast_1d(np.asarray(users, dtype=float))
+        shape = (len(tx), limit)
+        w = self.warroom
+        if w is None:
+            return np.full(shape, -1), np.zeros(shape), np.zeros(shape), np.full(shape, np.inf)
+
+        wants_channels = (chatbot | (ch > 0))[:, None]
+        target_ch = np.where(np.nan_to_num(ch) != 0, ch, DEFAULT_BOT_CHANNELS)[:, None]
+        target_tx = np.where(np.nan_to_num(tx) != 0, tx, DEFAULT_TRANSACTIONS)[:, None]
+
+        enough_tx = w['limited_mask'][None, :] & (w['tx'][None, :] >= target_tx)
+        enough_tx = np.where(enough_tx.any(axis=1, keepdims=True), enough_tx, w['largest_mask'][None, :])
+        feasible = np.where(wants_channels, w['unlimited_mask'][None, :], enough_tx)
+
+        extra_ch = np.where(wants_channels, np.maximum(target_ch - w['ch'][None, :], 0.0), 0.0)
+        short_users = users[:, None] - w['users_num'][None, :]
+        extra_u = np.where(short_users > 0, short_users, 0.0)
+        cost = w['price'][None, :] + w['init_fee'][None, :] + extra_ch * self.channel_price + extra_u * self.user_price
+        cost = np.where(feasible & ~np.isnan(cost), cost, np.inf)
+
+        # Stable sort keeps listing order between equally priced options
+        order = np.argsort(cost, axis=1, kind='stable')[:, :limit]
+        picked_cost = np.take_along_axis(cost, order, axis=1)
+        found = np.isfinite(picked_cost)
+        pad = limit - order.shape[1]
+        if pad:
+            order = np.pad(order, ((0, 0), (0, pad)))
+            picked_cost = np.pad(picked_cost, ((0, 0), (0, pad)), constant_values=np.inf)
+            found = np.pad(found, ((0, 0), (0, pad)))
+        positions = np.where(found, order, -1)
+        return (
+            positions,
+            np.where(found, np.take_along_axis(extra_ch, order, axis=1), 0.0),
+            np.where(found, np.take_along_axis(extra_u, order, axis=1), 0.0),
+            picked_cost,
+        )
+
+    def solve_warroom(self, tx, ch, chatbot, users, limit=3):
+        """solve_warroom_many for one scenario; [(position, extra channels, extra users)] best first"""
+        positions, extra_ch, extra_u, _ = self.solve_warroom_many(
+            [np.nan if tx is None else tx], [np.nan if ch is None else ch], [bool(chatbot)], [users], limit
+        )
+        return [
+            (int(pos), extra_ch[0, i], extra_u[0, i])
+            for i, pos in enumerate(positions[0]) if pos >= 0
+        ]
+
+    def zocial_row(self, pos):
+        return self.zocial['records'][pos]
+
+    def warroom_row(self, pos):
+        return self.warroom['records'][pos]
+
+
+
+def _known_version(pricing_df, addon_df):
+    key = (id(pricing_df), id(addon_df))
+    entry = _version_by_frames.get(key)
+    if entry is not None:
+        pricing_ref, addon_ref, version = entry
+        if pricing_ref() is pricing_df and (addon_ref() if addon_ref else None) is addon_df:
+            return version
+    version = pricing_version(pricing_df, addon_df)
+    if len(_version_by_frames) >= 4 * _MAX_INDEXES:
+        _version_by_frames.clear()
+    _version_by_frames[key] = (
+        weakref.ref(pricing_df), weakref.ref(addon_df) if addon_df is not None else None, version
+    )
+    return version
+
+
+def get_pricing_index(pricing_df, addon_df):
+    """PricingIndex for this master data, built once per content version"""
+    if pricing_df is None or pricing_df.empty:
+        return None
+    with _index_lock:
+        version = _known_version(pricing_df, addon_df)
+        index = _indexes.get(version)
+        if index is None:
+            index = PricingIndex(pricing_df, addon_df, version)
+            if len(_indexes) >= _MAX_INDEXES:
+                _indexes.pop(next(iter(_indexes)))
+            _indexes[version] = index
+        return index
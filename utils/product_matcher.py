@@ -8,17 +8,36 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import gc
+import threading
 
-def analyze_tor_sentences_full_mode(tor_sentences, spec_df, api_key):
+MODEL_NAME = "paraphrase-multilingual-mpnet-base-v2"
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """Process-wide sentence encoder, loaded once and shared with budget factor search"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = SentenceTransformer(MODEL_NAME)
+        return _encoder
+
+
+def analyze_tor_sentences_full_mode(tor_sentences, spec_df, api_key, return_embeddings=False):
     """
     Main product matching function
     Multi-product matching with score >= 65%
+
+    With return_embeddings=True also returns the TOR sentence embeddings
+    (float32 array, one row per sentence) for reuse by the FR/NFR classifier.
     """
     print("\n" + "="*80)
     print("🎯 PRODUCT MATCHING + FR/NFR CLASSIFICATION")
     print("="*80)
     
-    model_name = "paraphrase-multilingual-mpnet-base-v2"
+    model_name = MODEL_NAME
     
     comparison_results = []
     matched_products = []
@@ -31,7 +50,7 @@ def analyze_tor_sentences_full_mode(tor_sentences, spec_df, api_key):
     # PART 1: PRODUCT MATCHING
     print(f"⏳ Matching Product ({model_name})...", end=" ")
     try:
-        model = SentenceTransformer(model_name)
+        model = get_encoder()
         
         tor_emb = model.encode(tor_sentences, show_progress_bar=False)
         th_emb = model.encode(keywords_th, show_progress_bar=False)
@@ -92,11 +111,14 @@ def analyze_tor_sentences_full_mode(tor_sentences, spec_df, api_key):
         
         print("Done!")
         
-        del model, tor_emb, th_emb, eng_emb
+        tor_emb = np.asarray(tor_emb, dtype=np.float32)
+        del th_emb, eng_emb
         gc.collect()
         
     except Exception as e: 
         print(f"❌ Error: {e}")
+        if return_embeddings:
+            return [], pd.DataFrame(), None
         return [], pd.DataFrame()
     
     # Create DataFrame
@@ -121,4 +143,6 @@ def analyze_tor_sentences_full_mode(tor_sentences, spec_df, api_key):
     # Return unique products
     matched_products = list(set(matched_products))
     
+    if return_embeddings:
+        return matched_products, df_compare, tor_emb
     return matched_products, df_compare
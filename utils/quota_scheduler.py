@@ -0,0 +1,180 @@
+"""
+Shared Gemini Quota Scheduler
+One owner of the API key's request rate for every session (and optionally every process)
+"""
+
+import os
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from utils.rate_limiter import gemini_limiter, DEFAULT_RPM
+
+# Optional cross-process bucket: GEMINI_QUOTA_DB=/path/quota.sqlite3
+QUOTA_DB_PATH = os.environ.get("GEMINI_QUOTA_DB")
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITY_RANK = {INTERACTIVE: 0, BATCH: 1}
+
+_quota_context = contextvars.ContextVar('gemini_quota_context', default=('default', INTERACTIVE))
+
+
+def set_quota_session(session_id, priority=INTERACTIVE):
+    """Tag the current thread's requests with a session (e.g. once per Streamlit run)"""
+    _quota_context.set((session_id, priority))
+
+
+@contextmanager
+def quota_context(session_id=None, priority=None):
+    """Temporarily change session and/or priority for requests made inside the block"""
+    current_session, current_priority = _quota_context.get()
+    token = _quota_context.set((session_id or current_session, priority or current_priority))
+    try:
+        yield
+    finally:
+        _quota_context.reset(token)
+
+
+def current_quota_context():
+    return _quota_context.get()
+
+
+class SQLiteBucket:
+    """
+    Token bucket kept in SQLite so several app processes share one quota
+    Same try_acquire / penalize interface as RateLimiter.
+    """
+
+    def __init__(self, path, rpm=DEFAULT_RPM, burst=None, name='gemini'):
+        self.path = path
+        self.name = name
+        self.rpm = max(1, int(rpm))
+        self.capacity = float(burst if burst is not None else max(1, self.rpm // 6))
+        self._rate = self.rpm / 60.0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL,
+                    updated_at REAL
+                )
+            """)
+        return self._conn
+
+    def _update(self, change):
+        """Run change(tokens) -> (new_tokens, result) in one write transaction"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+                tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self._rate)
+                tokens, result = change(tokens)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, tokens, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def try_acquire(self, tokens=1):
+        def take(available):
+            if available >= tokens:
+                return available - tokens, 0.0
+            return available, (tokens - available) / self._rate
+        return self._update(take)
+
+    def penalize(self, seconds):
+        self._update(lambda available: (min(available, -seconds * self._rate), None))
+
+
+class QuotaScheduler:
+    """
+    Grants request slots from one token bucket in a fair order
+
+    Waiting requests are served interactive before batch, then by
+    per-session virtual time (start-time fair queuing): every request
+    advances its session's clock by one, so a session with a long
+    backlog cannot starve one that has just started. A 429 drains the
+    shared bucket once and slots are then released one by one at the
+    configured rate, instead of every session retrying at the same moment.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._session_clock = {}
+        self._clock = 0.0
+        self._stats = {p: {'granted': 0, 'wait_total': 0.0} for p in PRIORITY_RANK}
+
+    def acquire(self):
+        """Block until this request may be sent; returns seconds waited"""
+        session, priority = _quota_context.get()
+        rank = PRIORITY_RANK.get(priority, PRIORITY_RANK[BATCH])
+        start = time.monotonic()
+
+        with self._cond:
+            vtime = max(self._clock, self._session_clock.get(session, 0.0)) + 1
+            self._session_clock[session] = vtime
+            ticket = (rank, vtime, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+
+            while True:
+                if self._waiting[0] == ticket:
+                    wait = self.bucket.try_acquire()
+                    if wait <= 0:
+                        heapq.heappop(self._waiting)
+                        self._clock = max(self._clock, vtime)
+                        self._prune()
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(timeout=wait)
+                else:
+                    self._cond.wait(timeout=1.0)
+
+            waited = time.monotonic() - start
+            stats = self._stats.setdefault(priority, {'granted': 0, 'wait_total': 0.0})
+            stats['granted'] += 1
+            stats['wait_total'] += waited
+        return waited
+
+    def _prune(self):
+        if len(self._session_clock) > 1000:
+            self._session_clock = {s: v for s, v in self._session_clock.items() if v > self._clock}
+
+    def penalize(self, seconds):
+        """Hold every session back after a rate-limit answer"""
+        self.bucket.penalize(seconds)
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'waiting': len(self._waiting),
+                'by_priority': {
+                    p: {'granted': s['granted'], 'avg_wait': round(s['wait_total'] / s['granted'], 3) if s['granted'] else 0.0}
+                    for p, s in self._stats.items()
+                }
+            }
+
+
+# Process-wide scheduler shared by all Gemini callers
+quota_scheduler = QuotaScheduler(SQLiteBucket(QUOTA_DB_PATH) if QUOTA_DB_PATH else gemini_limiter)
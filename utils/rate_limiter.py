@@ -0,0 +1,60 @@
+"""
+Request Rate Limiting (Token Bucket)
+"""
+
+import os
+import time
+import threading
+
+DEFAULT_RPM = int(os.environ.get("GEMINI_RPM", 60))
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting requests per minute
+
+    Tokens refill continuously at rpm / 60 per second up to `burst`.
+    acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, burst=None):
+        self.rpm = max(1, int(rpm))
+        self.capacity = float(burst if burst is not None else max(1, self.rpm // 6))
+        self._tokens = self.capacity
+        self._rate = self.rpm / 60.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens without waiting; returns seconds to wait if not available (0 = acquired)"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self._rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available; returns total seconds waited"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds):
+        """Drain the bucket so no request is issued for `seconds` (e.g. after a 429)"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self._rate)
+
+
+# Process-wide limiter shared by all Gemini callers
+gemini_limiter = RateLimiter()
@@ -0,0 +1,130 @@
+"""
+Local TOR Sentence Segmenter
+Buffer / bullet / header logic from the AI formatting pre-processing step
+"""
+
+import re
+
+# ===== PRECOMPILED PATTERNS =====
+THAI_CHAR_PATTERN = re.compile(r'[ก-ฮ]')
+THAI_DIGIT_PATTERN = re.compile(r'[๐-๙]')
+
+PAGE_NUM_PATTERN = re.compile(r'^\s*-?\s*(หน้า|Page)?\s*[\d๐-๙]+\s*-?\s*$', re.IGNORECASE)
+
+BULLET_CHARS = r'\-\•\*\‣\⁃\●'
+BULLET_PATTERN = re.compile(r'^(' +
+    r'[\d๐-๙]+(\.[\d๐-๙]+)*\.|' +
+    r'\([\d๐-๙]+\)|' +
+    r'\([a-zA-Z]\)|' +
+    r'[a-zA-Z]\.|' +
+    r'[ก-ฮ]\.|' +
+    r'[' + BULLET_CHARS + r']|' +
+    r'ข้อที่' +
+    r')')
+
+# Quality thresholds for deciding whether AI refinement is worth a call
+LONG_SEGMENT_CHARS = 500
+MAX_SEGMENT_CHARS = 3000
+SHORT_SEGMENT_CHARS = 15
+MAX_LONG_RATIO = 0.15
+MAX_SHORT_RATIO = 0.4
+
+
+def detect_language(text, sample_size=3000):
+    """
+    Detect document language & numeral system from a text sample
+    Returns (is_thai_doc, is_thai_numeral)
+    """
+    sample_text = text[:sample_size]
+    is_thai_doc = len(THAI_CHAR_PATTERN.findall(sample_text)) > 20
+    is_thai_numeral = len(THAI_DIGIT_PATTERN.findall(sample_text)) > 5
+    return is_thai_doc, is_thai_numeral
+
+
+def segment_tor_text(full_text, is_thai_doc=None):
+    """
+    Split raw TOR text into requirement segments
+
+    Thai documents split only on bullets; English documents also split on
+    short capitalised header lines. Continuation lines are joined to the
+    current buffer.
+    """
+    if is_thai_doc is None:
+        is_thai_doc, _ = detect_language(full_text)
+
+    cleaned_lines = []
+    current_buffer = ""
+
+    for line in full_text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if PAGE_NUM_PATTERN.match(line):
+            if len(line) < 10:
+                continue
+
+        should_split = False
+        is_bullet = bool(BULLET_PATTERN.match(line))
+
+        if is_thai_doc:
+            if is_bullet:
+                should_split = True
+        else:
+            is_header = (len(line) < 80) and \
+                        (line[0].isupper()) and \
+                        (not line.endswith('.')) and \
+                        (not line.endswith(',')) and \
+                        (not line.endswith(':')) and \
+                        ("updated information" not in line.lower())
+
+            if is_bullet or (is_header and current_buffer != ""):
+                should_split = True
+
+        if should_split:
+            if current_buffer:
+                cleaned_lines.append(current_buffer)
+            current_buffer = line
+        else:
+            if current_buffer:
+                current_buffer = current_buffer + " " + line
+            else:
+                current_buffer = line
+
+    if current_buffer:
+        cleaned_lines.append(current_buffer)
+
+    return cleaned_lines
+
+
+def segmentation_quality(segments):
+    """
+    Heuristic quality check of local segmentation
+
+    Returns dict with 'poor' flag and the measured ratios. Segmentation is
+    poor when many segments look fused (very long) or broken (very short).
+    """
+    if not segments:
+        return {'poor': True, 'segments': 0, 'long_ratio': 0.0, 'short_ratio': 0.0, 'max_len': 0}
+
+    lengths = [len(s) for s in segments]
+    n = len(lengths)
+    long_ratio = sum(1 for l in lengths if l > LONG_SEGMENT_CHARS) / n
+    short_ratio = sum(1 for l in lengths if l < SHORT_SEGMENT_CHARS) / n
+    max_len = max(lengths)
+
+    poor = long_ratio > MAX_LONG_RATIO or short_ratio > MAX_SHORT_RATIO or max_len > MAX_SEGMENT_CHARS
+
+    return {
+        'poor': poor,
+        'segments': n,
+        'long_ratio': round(long_ratio, 3),
+        'short_ratio': round(short_ratio, 3),
+        'max_len': max_len
+    }
+
+
+def segment_sentences(full_text):
+    """
+    Fast path: segment text into requirement sentences (no AI)
+    """
+    return [seg for seg in segment_tor_text(full_text) if len(seg) > 2]
@@ -0,0 +1,163 @@
+"""
+Shared Google Sheets Client
+One authorized gspread client and spreadsheet handles per process, refreshed ahead of expiry
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from functools import partial
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import gspread
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Refresh the access token in the background once it is this close to expiry
+REFRESH_MARGIN = 600
+
+# (connect, read) seconds per Sheets/Drive request; gspread waits forever by default,
+# which would keep a dropped network from ever reaching the snapshot fallback
+SHEETS_TIMEOUT = (
+    float(os.environ.get("SHEETS_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("SHEETS_READ_TIMEOUT", "30")),
+)
+
+
+def _seconds_left(creds):
+    if not creds.token or creds.expiry is None:
+        return 0.0
+    expiry = creds.expiry if creds.expiry.tzinfo else creds.expiry.replace(tzinfo=timezone.utc)
+    return (expiry - datetime.now(timezone.utc)).total_seconds()
+
+
+class SheetClientPool:
+    """
+    Process-wide gspread client, spreadsheet and worksheet handles
+
+    The client is authorized once per service account and its token is
+    refreshed before it expires (in the background while it is still
+    valid), so sheet calls pay only for their own data transfer. Token
+    refreshes and first opens run outside the pool lock, one at a time
+    (single-flight), so a slow OAuth or Sheets endpoint only holds up the
+    callers that need that token or spreadsheet. Handles are cached per
+    spreadsheet URL and dropped with invalidate() after a failed call.
+    Writes to the same spreadsheet are serialized across sessions with
+    write_lock().
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._creds = None
+        self._creds_key = None
+        self._client = None
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._write_locks = {}
+        self._open_locks = {}
+        self._refreshing = False
+
+    def _refresh(self, creds, margin):
+        """Refresh unless another caller already did while we waited (single-flight)"""
+        with self._refresh_lock:
+            if _seconds_left(creds) > margin:
+                return
+            creds.refresh(partial(Request(), timeout=SHEETS_TIMEOUT[1]))
+            print(f"🔑 Google Sheets token refreshed ({_seconds_left(creds) / 60:.0f} min left)")
+
+    def _background_refresh(self, creds):
+        try:
+            self._refresh(creds, REFRESH_MARGIN)
+        except Exception as e:
+            print(f"⚠️ Background token refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def client(self, creds_info):
+        """Authorized gspread client for this service account"""
+        info = dict(creds_info)
+        key = hashlib.sha1(json.dumps(info, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            if self._client is None or self._creds_key != key:
+                self._creds = Credentials.from_service_account_info(info, scopes=SCOPES)
+                self._client = gspread.authorize(self._creds)
+                self._client.set_timeout(SHEETS_TIMEOUT)
+                self._creds_key = key
+                self._spreadsheets.clear()
+                self._worksheets.clear()
+            creds, client = self._creds, self._client
+
+            left = _seconds_left(creds)
+            if 60 < left <= REFRESH_MARGIN and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, args=(creds,), daemon=True).start()
+
+        # A token about to expire is refreshed outside the pool lock
+        if left <= 60:
+            self._refresh(creds, 60)
+        return client
+
+    def spreadsheet(self, sheet_url, creds_info):
+        """Opened spreadsheet for this URL (open_by_url runs once)"""
+        client = self.client(creds_info)
+        with self._lock:
+            sh = self._spreadsheets.get(sheet_url)
+            open_lock = self._open_locks.setdefault(sheet_url, threading.Lock())
+        if sh is not None:
+            return sh
+        # First open of a URL runs once; concurrent callers wait for its handle
+        with open_lock:
+            with self._lock:
+                sh = self._spreadsheets.get(sheet_url)
+            if sh is None:
+                start = time.perf_counter()
+                sh = client.open_by_url(sheet_url)
+                print(f"✅ Connected to: {sh.title} ({time.perf_counter() - start:.2f}s)")
+                with self._lock:
+                    self._spreadsheets[sheet_url] = sh
+        return sh
+
+    def worksheet(self, sheet_url, creds_info, title):
+        """Worksheet handle by exact title (raises gspread.WorksheetNotFound)"""
+        sh = self.spreadsheet(sheet_url, creds_info)
+        key = (sheet_url, title)
+        with self._lock:
+            ws = self._worksheets.get(key)
+        if ws is None:
+            ws = sh.worksheet(title)
+            with self._lock:
+                self._worksheets[key] = ws
+        return ws
+
+    def invalidate(self, sheet_url=None):
+        """Forget cached handles (of one spreadsheet, or all) after a failure"""
+        with self._lock:
+            if sheet_url is None:
+                self._spreadsheets.clear()
+                self._worksheets.clear()
+                return
+            self._spreadsheets.pop(sheet_url, None)
+            for key in [k for k in self._worksheets if k[0] == sheet_url]:
+                del self._worksheets[key]
+
+    @contextmanager
+    def write_lock(self, sheet_url):
+        """Serialize writes to one spreadsheet across sessions"""
+        with self._lock:
+            lock = self._write_locks.setdefault(sheet_url, threading.Lock())
+        with lock:
+            yield
+
+
+# Process-wide pool shared by every Streamlit session
+sheet_pool = SheetClientPool()
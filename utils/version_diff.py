@@ -0,0 +1,184 @@
+"""
+Incremental Re-analysis for Revised TOR Versions
+Reuse match / classification / reviewer edits for unchanged sentences
+"""
+
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+ANALYSIS_STORE_DIR = os.environ.get(
+    "TOR_ANALYSIS_STORE",
+    os.path.join(os.path.expanduser("~"), ".wisetor", "analyses")
+)
+
+# Columns carried over from the previous version for unchanged sentences
+REUSED_COLUMNS = ['Product_Match', 'Implementation', 'Matched_Keyword', 'Requirement_Type', '📝 Status']
+
+_THAI_TO_ARABIC = str.maketrans('๐๑๒๓๔๕๖๗๘๙', '0123456789')
+
+# Leading clause numbering ("3.2.1", "(ก)", "ข้อที่ 4") shifts when clauses are
+# inserted, so it is ignored when comparing versions
+_LEADING_NUMBER_PATTERN = re.compile(
+    r'^\s*(ข้อที่\s*)?(\(?[\d๐-๙]+(\.[\d๐-๙]+)*\.?\)?|\(?[a-zA-Zก-ฮ][\.\)])\s*'
+)
+
+
+def normalize_sentence(sentence):
+    """Normalize sentence for version comparison"""
+    text = str(sentence).translate(_THAI_TO_ARABIC)
+    text = _LEADING_NUMBER_PATTERN.sub('', text)
+    return re.sub(r'\s+', '', text).lower()
+
+
+def sentence_hash(sentence):
+    """Stable hash of a normalized sentence"""
+    return hashlib.sha1(normalize_sentence(sentence).encode('utf-8')).hexdigest()
+
+
+def _store_path(name):
+    slug = re.sub(r'[^\w\-\.]+', '_', str(name)).strip('_') or 'analysis'
+    return os.path.join(ANALYSIS_STORE_DIR, f"{slug}.json")
+
+
+def save_analysis(name, processed_df):
+    """
+    Persist an analysis (including reviewer edits) for later comparison
+    Saving the same document name again overwrites the previous snapshot
+    """
+    if processed_df is None or processed_df.empty:
+        return None
+
+    cols = ['TOR_Sentence'] + [c for c in REUSED_COLUMNS if c in processed_df.columns]
+    records = processed_df[cols].fillna('').astype(str).to_dict('records')
+
+    os.makedirs(ANALYSIS_STORE_DIR, exist_ok=True)
+    path = _store_path(name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'file_name': name,
+            'saved_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'rows': records
+        }, f, ensure_ascii=False)
+
+    return path
+
+
+def list_saved_analyses():
+    """
+    List stored analyses, newest first
+    Returns list of dicts: {'file_name', 'saved_at', 'rows'}
+    """
+    if not os.path.isdir(ANALYSIS_STORE_DIR):
+        return []
+
+    entries = []
+    for fname in os.listdir(ANALYSIS_STORE_DIR):
+        if not fname.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(ANALYSIS_STORE_DIR, fname), encoding='utf-8') as f:
+                data = json.load(f)
+            entries.append({
+                'file_name': data.get('file_name', fname),
+                'saved_at': data.get('saved_at', ''),
+                'rows': len(data.get('rows', []))
+            })
+        except Exception as e:
+            print(f"⚠️ Skipping unreadable analysis {fname}: {e}")
+
+    return sorted(entries, key=lambda x: x['saved_at'], reverse=True)
+
+
+def load_analysis(name):
+    """Load a stored analysis as DataFrame (None if missing)"""
+    path = _store_path(name)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    return pd.DataFrame(data.get('rows', []))
+
+
+def diff_sentences(new_sentences, prior_df):
+    """
+    Diff new sentence list against a prior analysis
+
+    Returns:
+        reused: dict {new_index: prior row (dict)} for unchanged sentences
+        changed_indices: list of new indices that must be processed
+    """
+    prior_rows = {}
+    if prior_df is not None and not prior_df.empty:
+        for _, row in prior_df.iterrows():
+            prior_rows.setdefault(sentence_hash(row['TOR_Sentence']), []).append(row.to_dict())
+
+    reused = {}
+    changed_indices = []
+
+    for i, sent in enumerate(new_sentences):
+        candidates = prior_rows.get(sentence_hash(sent))
+        if candidates:
+            # Duplicated sentences are consumed in document order
+            reused[i] = candidates.pop(0)
+        else:
+            changed_indices.append(i)
+
+    print(f"🔁 Version diff: {len(reused)} unchanged, {len(changed_indices)} added/changed")
+
+    return reused, changed_indices
+
+
+def merge_incremental_results(new_sentences, reused, changed_df):
+    """
+    Rebuild the full result table in new document order
+
+    Args:
+        reused: output of diff_sentences
+        changed_df: analysis result for the changed sentences, in the same
+                    order as changed_indices; missing rows leave only the sentence
+    """
+    changed_rows = iter(changed_df.to_dict('records')) if changed_df is not None else iter([])
+    merged = []
+
+    for i, sent in enumerate(new_sentences):
+        if i in reused:
+            prior = reused[i]
+            row = {'TOR_Sentence': sent}
+            for col in REUSED_COLUMNS:
+                if col in prior and prior[col] != '':
+                    row[col] = prior[col]
+        else:
+            # Matching may return fewer rows (empty frame on failure): keep the sentence
+            row = dict(next(changed_rows, None) or {})
+            row['TOR_Sentence'] = sent
+        merged.append(row)
+
+    df = pd.DataFrame(merged)
+    if '📝 Status' in df.columns:
+        df['📝 Status'] = df['📝 Status'].fillna('🤖 Auto')
+
+    df.index = range(1, len(df) + 1)
+    df.index.name = 'Index'
+
+    return df
+
+
+def products_from_results(result_df):
+    """Collect unique matched products from a result table"""
+    products = []
+    if result_df is None or result_df.empty or 'Product_Match' not in result_df.columns:
+        return products
+
+    for val in result_df['Product_Match'].dropna().astype(str):
+        for prod in re.split(r'[;,]', val):
+            prod = prod.strip()
+            if prod and prod != 'Non-Compliant':
+                products.append(prod)
+
+    return list(dict.fromkeys(products))